@@ -0,0 +1,550 @@
+"""
+End-to-end sandbox lifecycle benchmark.
+
+Runs full sandbox lifecycles through KubernetesDriver against the fake apiserver (started in a child process so the
+server doesn't compete with the driver for the GIL):
+
+    PrepareSandboxInfra -> N x Deploy -> N x PowerOff -> N x PowerOn -> GetVmDetails -> N x DeleteInstance
+    -> CleanupSandboxInfra
+
+and reports p50/p95/p99 latency per command, kubernetes API calls per command and the peak RSS of the driver process.
+
+Usage (from the kubernetes folder):
+    PYTHONPATH=src:. python -m benchmarks.sandbox_lifecycle --sandboxes 20 --apps 3 --concurrency 5 \
+        --output results.json [--baseline previous-results.json]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+from kubernetes.client.rest import RESTClientObject
+
+from domain.services.vm_details_cache import WATCH_THREAD_PREFIX
+
+COMMANDS = ['PrepareSandboxInfra', 'Deploy', 'PowerOff', 'PowerOn', 'GetVmDetails', 'DeleteInstance',
+            'CleanupSandboxInfra']
+
+KUBERNETES_SERVICE_DEPLOYMENT_PATH = 'Kubernetes.Kubernetes Service'
+UNATTRIBUTED = 'unattributed'
+MAX_REPORTED_ERRORS = 20
+
+
+class BenchmarkOptions(object):
+    def __init__(self, sandboxes=10, apps=3, concurrency=4, replicas=1, wait_for_replicas=120, latency=0,
+                 readiness_delay=0.2, load_balancer_delay=0.2, external_service_type='LoadBalancer'):
+        """
+        :param int sandboxes: number of sandbox lifecycles to run
+        :param int apps: number of apps deployed in every sandbox
+        :param int concurrency: number of sandboxes running at the same time
+        :param int replicas: replicas of every deployed app
+        :param int wait_for_replicas: value of the 'Wait for Replicas' app attribute, used by PowerOn
+        :param float latency: seconds the fake apiserver adds to every request
+        :param float readiness_delay: seconds until a pod becomes ready in the fake apiserver
+        :param float load_balancer_delay: seconds until a LoadBalancer service gets an ingress ip
+        :param str external_service_type: value of the 'External Service Type' cloud provider attribute
+        """
+        self.sandboxes = sandboxes
+        self.apps = apps
+        self.concurrency = concurrency
+        self.replicas = replicas
+        self.wait_for_replicas = wait_for_replicas
+        self.latency = latency
+        self.readiness_delay = readiness_delay
+        self.load_balancer_delay = load_balancer_delay
+        self.external_service_type = external_service_type
+
+
+class ApiCallCounter(object):
+    """
+    Counts the HTTP requests sent by the kubernetes client per driver command.
+    The command is tracked per thread and inherited by the threads a command starts (the concurrent vm details
+    workers), requests sent from other threads, like the namespace watches of the vm details cache that outlive the
+    command that started them, are unattributed.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._original_request = None
+        self._original_thread_start = None
+        self.calls = {}
+
+    def install(self):
+        counter = self
+        original_request = self._original_request = RESTClientObject.request
+        original_thread_start = self._original_thread_start = threading.Thread.start
+
+        def request(rest_client, *args, **kwargs):
+            counter.increment()
+            return original_request(rest_client, *args, **kwargs)
+
+        def start(thread):
+            if not thread.name.startswith(WATCH_THREAD_PREFIX):
+                thread.benchmark_command = counter.get_command()
+            return original_thread_start(thread)
+
+        RESTClientObject.request = request
+        threading.Thread.start = start
+
+    def uninstall(self):
+        if self._original_request:
+            RESTClientObject.request = self._original_request
+            threading.Thread.start = self._original_thread_start
+            self._original_request = None
+            self._original_thread_start = None
+
+    def set_command(self, command_name):
+        self._local.command = command_name
+
+    def get_command(self):
+        """
+        :rtype: str
+        """
+        return getattr(self._local, 'command', None) or getattr(threading.current_thread(), 'benchmark_command', None)
+
+    def increment(self):
+        command_name = self.get_command() or UNATTRIBUTED
+        with self._lock:
+            self.calls[command_name] = self.calls.get(command_name, 0) + 1
+
+
+class CommandStats(object):
+    def __init__(self):
+        self.durations = []
+        self.errors = 0
+
+    def add(self, duration, failed):
+        self.durations.append(duration)
+        if failed:
+            self.errors += 1
+
+
+def percentile(values, percent):
+    """
+    Linear interpolation between the closest ranks
+    :param list[float] values:
+    :param float percent: 0-100
+    :rtype: float
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def get_peak_rss_kb():
+    """
+    :rtype: int
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    return peak_rss / 1024 if sys.platform == 'darwin' else peak_rss
+
+
+def get_shell_version():
+    metadata_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src',
+                                 'drivermetadata.xml')
+    try:
+        return ElementTree.parse(metadata_path).getroot().get('Version')
+    except Exception:
+        return None
+
+
+def _serve_fake_apiserver(options, connection):
+    from tests.fake_apiserver import FakeKubernetesApiServer
+
+    server = FakeKubernetesApiServer(latency=options.latency,
+                                     readiness_delay=options.readiness_delay,
+                                     load_balancer_delay=options.load_balancer_delay).start()
+    try:
+        connection.send(server.url)
+        # block until the parent asks to stop or goes away
+        connection.recv()
+    except EOFError:
+        pass
+    finally:
+        server.stop()
+
+
+class FakeApiServerProcess(object):
+    def __init__(self, options):
+        """
+        :param BenchmarkOptions options:
+        """
+        self.options = options
+        self.url = None
+        self._connection = None
+        self._process = None
+
+    def __enter__(self):
+        self._connection, child_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve_fake_apiserver, args=(self.options, child_connection))
+        self._process.daemon = True
+        self._process.start()
+        self.url = self._connection.recv()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self._connection.send('stop')
+        except (IOError, OSError):
+            pass
+        self._process.join(10)
+        return False
+
+    def write_kubeconfig(self, path):
+        from tests.fake_apiserver import write_kubeconfig
+        return write_kubeconfig(self.url, path)
+
+
+class SandboxLifecycle(object):
+    def __init__(self, driver, options, config_file_path, counter, stats, errors):
+        """
+        :param driver.KubernetesDriver driver:
+        :param BenchmarkOptions options:
+        :param str config_file_path:
+        :param ApiCallCounter counter:
+        :param dict[str, CommandStats] stats:
+        :param list[str] errors:
+        """
+        self.driver = driver
+        self.options = options
+        self.config_file_path = config_file_path
+        self.counter = counter
+        self.stats = stats
+        self.errors = errors
+        self._lock = threading.Lock()
+
+    def run(self, sandbox_index):
+        """
+        :param int sandbox_index:
+        :rtype: bool
+        :return: True if all the commands of the lifecycle succeeded
+        """
+        sandbox_id = str(uuid.uuid4())
+        deployed_apps = []
+        try:
+            self._execute('PrepareSandboxInfra', self.driver.PrepareSandboxInfra,
+                          self._create_context(sandbox_id), self._create_prepare_request(), None)
+
+            for app_index in range(self.options.apps):
+                response = self._execute('Deploy', self.driver.Deploy, self._create_context(sandbox_id),
+                                         self._create_deploy_request('bench-app-{}-{}'.format(sandbox_index, app_index)),
+                                         None)
+                deployed_apps.append(self._create_deployed_app_dict(response))
+
+            for command_name in ('PowerOff', 'PowerOn'):
+                for deployed_app in deployed_apps:
+                    self._execute(command_name, getattr(self.driver, command_name),
+                                  self._create_remote_context(sandbox_id, deployed_app), None)
+
+            self._execute('GetVmDetails', self.driver.GetVmDetails, self._create_context(sandbox_id),
+                          json.dumps({'items': [{'deployedAppJson': app} for app in deployed_apps]}), None)
+
+            while deployed_apps:
+                self._execute('DeleteInstance', self.driver.DeleteInstance,
+                              self._create_remote_context(sandbox_id, deployed_apps[0]), None)
+                deployed_apps.pop(0)
+            return True
+        except Exception:
+            return False
+        finally:
+            try:
+                self._execute('CleanupSandboxInfra', self.driver.CleanupSandboxInfra,
+                              self._create_context(sandbox_id), self._create_cleanup_request())
+            except Exception:
+                pass
+
+    def _execute(self, command_name, command, *args):
+        self.counter.set_command(command_name)
+        start_time = time.time()
+        failed = False
+        try:
+            return command(*args)
+        except Exception:
+            failed = True
+            with self._lock:
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append('{}: {}'.format(command_name, traceback.format_exc()))
+            raise
+        finally:
+            duration = time.time() - start_time
+            self.counter.set_command(None)
+            with self._lock:
+                self.stats[command_name].add(duration, failed)
+
+    # <editor-fold desc="Contexts and requests">
+
+    def _create_resource_context_details(self, name, attributes, app_context=None):
+        from cloudshell.shell.core.driver_context import ResourceContextDetails, AppContext
+        return ResourceContextDetails(id=name, name=name, fullname=name, type='Resource', address='',
+                                      model='Kubernetes', family='Cloud Provider', description='',
+                                      attributes=attributes, app_context=app_context or AppContext('', ''),
+                                      networks_info=None, shell_standard='', shell_standard_version='')
+
+    def _create_cloud_provider_details(self):
+        return self._create_resource_context_details('kubernetes-benchmark', {
+            'Kubernetes.Config File Path': self.config_file_path,
+            'Kubernetes.External Service Type': self.options.external_service_type})
+
+    def _create_connectivity(self):
+        from cloudshell.shell.core.driver_context import ConnectivityContext
+        return ConnectivityContext(server_address='localhost', cloudshell_api_port='8029', quali_api_port='9000',
+                                   admin_auth_token='', cloudshell_version='9.0', cloudshell_api_scheme='http')
+
+    def _create_reservation(self, sandbox_id):
+        from cloudshell.shell.core.driver_context import ReservationContextDetails
+        return ReservationContextDetails(environment_name='benchmark', environment_path='benchmark',
+                                         domain='Global', description='', owner_user='admin', owner_email='',
+                                         reservation_id=sandbox_id)
+
+    def _create_context(self, sandbox_id):
+        from cloudshell.shell.core.driver_context import ResourceCommandContext
+        return ResourceCommandContext(connectivity=self._create_connectivity(),
+                                      resource=self._create_cloud_provider_details(),
+                                      reservation=self._create_reservation(sandbox_id),
+                                      connectors=[])
+
+    def _create_remote_context(self, sandbox_id, deployed_app):
+        from cloudshell.shell.core.driver_context import ResourceRemoteCommandContext, AppContext
+        endpoint = self._create_resource_context_details(deployed_app['name'], {},
+                                                         AppContext('', json.dumps(deployed_app)))
+        return ResourceRemoteCommandContext(connectivity=self._create_connectivity(),
+                                            resource=self._create_cloud_provider_details(),
+                                            remote_reservation=self._create_reservation(sandbox_id),
+                                            remote_endpoints=[endpoint])
+
+    def _create_prepare_request(self):
+        return json.dumps({'driverRequest': {'actions': [
+            {'type': 'prepareCloudInfra', 'actionId': str(uuid.uuid4()),
+             'actionParams': {'type': 'prepareCloudInfraParams', 'cidr': '10.0.0.0/24'}},
+            {'type': 'prepareSubnet', 'actionId': str(uuid.uuid4()),
+             'actionParams': {'type': 'prepareSubnetParams', 'cidr': '10.0.0.0/24', 'alias': 'default'}},
+            {'type': 'createKeys', 'actionId': str(uuid.uuid4())}]}})
+
+    def _create_cleanup_request(self):
+        return json.dumps({'driverRequest': {'actions': [
+            {'type': 'cleanupNetwork', 'actionId': str(uuid.uuid4())}]}})
+
+    def _create_deploy_request(self, app_name):
+        attributes = {
+            'Docker Image Name': 'nginx',
+            'Docker Image Tag': '1.15',
+            'Internal Ports': '80',
+            'External Ports': '8080',
+            'Replicas': str(self.options.replicas),
+            'Wait for Replicas': str(self.options.wait_for_replicas),
+        }
+        return json.dumps({'driverRequest': {'actions': [{
+            'type': 'deployApp',
+            'actionId': str(uuid.uuid4()),
+            'actionParams': {
+                'type': 'deployAppParams',
+                'appName': app_name,
+                'deployment': {
+                    'type': 'deployAppDeploymentInfo',
+                    'deploymentPath': KUBERNETES_SERVICE_DEPLOYMENT_PATH,
+                    'attributes': [{'type': 'attribute',
+                                    'attributeName': '{}.{}'.format(KUBERNETES_SERVICE_DEPLOYMENT_PATH, name),
+                                    'attributeValue': value}
+                                   for name, value in attributes.items()]},
+                'appResource': {'type': 'appResourceInfo', 'attributes': []}}}]}})
+
+    def _create_deployed_app_dict(self, deploy_response):
+        """
+        Builds the deployed app json cloudshell passes to the remote commands out of the Deploy response
+        :param str deploy_response:
+        :rtype: dict
+        """
+        result = json.loads(deploy_response)['driverResponse']['actionResults'][0]
+        if not result['success']:
+            raise ValueError(result['errorMessage'])
+        return {
+            'name': result['vmName'],
+            'vmdetails': {
+                'uid': result['vmUuid'],
+                'vmCustomParams': [{'name': key, 'value': str(value)}
+                                   for key, value in result['deployedAppAdditionalData'].items()]
+            }
+        }
+
+    # </editor-fold>
+
+
+def summarize(stats, counter):
+    """
+    :param dict[str, CommandStats] stats:
+    :param ApiCallCounter counter:
+    :rtype: dict
+    """
+    summary = {}
+    for command_name in COMMANDS:
+        command_stats = stats[command_name]
+        durations_ms = [duration * 1000 for duration in command_stats.durations]
+        count = len(durations_ms)
+        api_calls = counter.calls.get(command_name, 0)
+        summary[command_name] = {
+            'count': count,
+            'errors': command_stats.errors,
+            'p50_ms': percentile(durations_ms, 50),
+            'p95_ms': percentile(durations_ms, 95),
+            'p99_ms': percentile(durations_ms, 99),
+            'mean_ms': sum(durations_ms) / count if count else None,
+            'max_ms': max(durations_ms) if count else None,
+            'api_calls': api_calls,
+            'api_calls_per_command': float(api_calls) / count if count else None,
+        }
+    return summary
+
+
+def run_benchmark(options):
+    """
+    :param BenchmarkOptions options:
+    :rtype: dict
+    """
+    # the driver logs to files, keep them away from the execution server logs folder
+    work_dir = tempfile.mkdtemp(prefix='kubernetes-shell-benchmark-')
+    os.environ.setdefault('LOG_PATH', os.path.join(work_dir, 'logs'))
+
+    from driver import KubernetesDriver
+
+    counter = ApiCallCounter()
+    stats = dict((command_name, CommandStats()) for command_name in COMMANDS)
+    errors = []
+
+    try:
+        with FakeApiServerProcess(options) as server:
+            config_file_path = server.write_kubeconfig(os.path.join(work_dir, 'config'))
+            lifecycle = SandboxLifecycle(KubernetesDriver(), options, config_file_path, counter, stats, errors)
+
+            counter.install()
+            pool = ThreadPool(max(1, options.concurrency))
+            start_time = time.time()
+            try:
+                results = pool.map(lifecycle.run, range(options.sandboxes))
+            finally:
+                duration = time.time() - start_time
+                pool.close()
+                pool.join()
+                counter.uninstall()
+                lifecycle.driver.cleanup()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'started': datetime.utcnow().isoformat() + 'Z',
+        'python': sys.version.split()[0],
+        'shell_version': get_shell_version(),
+        'options': vars(options),
+        'duration_seconds': duration,
+        'sandboxes_per_minute': options.sandboxes * 60.0 / duration if duration else None,
+        'sandboxes_failed': results.count(False),
+        'peak_rss_kb': get_peak_rss_kb(),
+        'commands': summarize(stats, counter),
+        'api_calls_unattributed': counter.calls.get(UNATTRIBUTED, 0),
+        'errors': errors,
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Compares the latency percentiles and api calls of every command with a previous run
+    :param dict results:
+    :param dict baseline:
+    :param float tolerance: allowed relative increase, 0.2 means 20%
+    :rtype: list[str]
+    """
+    regressions = []
+    for command_name, command_results in sorted(results['commands'].items()):
+        baseline_results = baseline.get('commands', {}).get(command_name)
+        if not baseline_results:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'api_calls_per_command'):
+            value, baseline_value = command_results.get(metric), baseline_results.get(metric)
+            if value is None or not baseline_value:
+                continue
+            if value > baseline_value * (1 + tolerance):
+                regressions.append('{} {}: {:.2f} -> {:.2f}'.format(command_name, metric, baseline_value, value))
+
+    baseline_rss = baseline.get('peak_rss_kb')
+    if baseline_rss and results['peak_rss_kb'] > baseline_rss * (1 + tolerance):
+        regressions.append('peak_rss_kb: {} -> {}'.format(baseline_rss, results['peak_rss_kb']))
+    return regressions
+
+
+def format_report(results):
+    lines = ['{:<20} {:>6} {:>6} {:>10} {:>10} {:>10} {:>10}'.format(
+        'command', 'count', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'api calls')]
+    for command_name in COMMANDS:
+        command_results = results['commands'][command_name]
+        lines.append('{:<20} {:>6} {:>6} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+            command_name, command_results['count'], command_results['errors'],
+            command_results['p50_ms'] or 0, command_results['p95_ms'] or 0, command_results['p99_ms'] or 0,
+            command_results['api_calls_per_command'] or 0))
+    lines.append('sandboxes: {} ({} failed) in {:.1f}s, peak rss: {} KB'.format(
+        results['options']['sandboxes'], results['sandboxes_failed'], results['duration_seconds'],
+        results['peak_rss_kb']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Kubernetes shell sandbox lifecycle benchmark')
+    parser.add_argument('--sandboxes', type=int, default=10)
+    parser.add_argument('--apps', type=int, default=3, help='apps deployed in every sandbox')
+    parser.add_argument('--concurrency', type=int, default=4, help='sandboxes running at the same time')
+    parser.add_argument('--replicas', type=int, default=1)
+    parser.add_argument('--wait-for-replicas', type=int, default=120,
+                        help="the 'Wait for Replicas' app attribute, 0 disables the wait in PowerOn")
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every apiserver request')
+    parser.add_argument('--readiness-delay', type=float, default=0.2)
+    parser.add_argument('--load-balancer-delay', type=float, default=0.2)
+    parser.add_argument('--external-service-type', default='LoadBalancer')
+    parser.add_argument('--output', help='path of the json results file')
+    parser.add_argument('--baseline', help='path of a previous json results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative increase over the baseline before reporting a regression')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    options = BenchmarkOptions(sandboxes=args.sandboxes, apps=args.apps, concurrency=args.concurrency,
+                               replicas=args.replicas, wait_for_replicas=args.wait_for_replicas,
+                               latency=args.latency, readiness_delay=args.readiness_delay,
+                               load_balancer_delay=args.load_balancer_delay,
+                               external_service_type=args.external_service_type)
+    results = run_benchmark(options)
+
+    sys.stdout.write(format_report(results) + '\n')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            sys.stdout.write('REGRESSION {}\n'.format(regression))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
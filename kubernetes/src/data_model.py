@@ -1,6 +1,11 @@
+import threading
+
 from cloudshell.shell.core.driver_context import ResourceCommandContext, AutoLoadDetails, AutoLoadAttribute, \
     AutoLoadResource
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+
+# classes of this module by name, collected once on first use
+_datamodel_classes = None
 
 
 class LegacyUtils(object):
@@ -56,7 +61,12 @@ class LegacyUtils(object):
 
     def __attach_attributes_to_resource(self, attributes, curr_relative_addr, resource):
         for attribute in attributes[curr_relative_addr]:
-            setattr(resource, attribute.attribute_name.lower().replace(' ', '_'), attribute.attribute_value)
+            property_name = attribute.attribute_name.lower().replace(' ', '_')
+            if hasattr(type(resource), property_name):
+                setattr(resource, property_name, attribute.attribute_value)
+            else:
+                # the models are slotted, attributes without a property are kept by their full name
+                resource._set_attribute(attribute.attribute_name, attribute.attribute_value)
         del attributes[curr_relative_addr]
 
     def __slice_parent_from_relative_path(self, parent, relative_addr):
@@ -65,22 +75,130 @@ class LegacyUtils(object):
         return relative_addr[len(parent) + 1:] # + 1 because we want to remove the seperator also
 
     def __generate_datamodel_classes_dict(self):
-        return dict(self.__collect_generated_classes())
+        global _datamodel_classes
+        if _datamodel_classes is None:
+            _datamodel_classes = dict(self.__collect_generated_classes())
+        return _datamodel_classes
 
     def __collect_generated_classes(self):
         import sys, inspect
         return inspect.getmembers(sys.modules[__name__], inspect.isclass)
 
 
-class Kubernetes(object):
+class _ResolvedModelsCache(object):
+    def __init__(self, max_size=256):
+        """
+        Resolved resource models by model class, resource name and attributes. Commands of the same resource get the
+        same context attributes so the model is resolved once and every command gets its own copy
+        :param int max_size:
+        """
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, model_cls, name, attributes):
+        """
+        :param type model_cls:
+        :param str name:
+        :param dict attributes:
+        """
+        attributes = dict(attributes)
+        try:
+            key = (model_cls, name, frozenset(attributes.items()))
+        except TypeError:
+            # unhashable attribute values, nothing to memoize by
+            return model_cls._from_attributes(name, attributes)
+
+        with self._lock:
+            model = self._items.pop(key, None)
+            if model is None:
+                model = model_cls._from_attributes(name, attributes)
+            self._items[key] = model
+            if len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+        return model._clone()
+
+
+_resolved_models = _ResolvedModelsCache()
+
+
+class _ResourceModel(object):
+    """
+    Base of the generated models. Every attribute of a model has a slot, the slots are filled in one pass from the
+    class attribute key map whenever the attributes dict is replaced and kept in sync by the property setters
+    """
+    __slots__ = ()
+
+    _ATTRIBUTE_FIELDS = {}
+
+    @property
+    def attributes(self):
+        """
+        :rtype: dict
+        """
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, value):
+        """
+        :type value: dict
+        """
+        value = {} if value is None else value
+        self._attributes = value
+        for key, field in self._ATTRIBUTE_FIELDS.items():
+            setattr(self, field, value.get(key))
+
+    def _set_attribute(self, key, value):
+        self._attributes[key] = value
+        field = self._ATTRIBUTE_FIELDS.get(key)
+        if field:
+            setattr(self, field, value)
+
+    @classmethod
+    def _from_attributes(cls, name, attributes):
+        result = cls(name=name)
+        result.attributes = attributes
+        return result
+
+    def _clone(self):
+        clone = self.__class__.__new__(self.__class__)
+        for slot in self.__slots__:
+            setattr(clone, slot, getattr(self, slot))
+        clone._attributes = dict(self._attributes)
+        clone.resources = dict(self.resources)
+        return clone
+
+
+class Kubernetes(_ResourceModel):
+    __slots__ = ('resources', '_attributes', '_cloudshell_model_name', '_name', '_config_file_path',
+                 '_external_service_type', '_networking_type', '_region', '_networks_in_use', '_vlan_type',
+                 '_profiling', '_namespace_pool_size', '_warm_pool_images', '_warm_pool_size',
+                 '_prepull_images_count', '_check_capacity_on_deploy')
+
+    _ATTRIBUTE_FIELDS = {
+        'Kubernetes.Config File Path': '_config_file_path',
+        'Kubernetes.External Service Type': '_external_service_type',
+        'Kubernetes.Networking type': '_networking_type',
+        'Kubernetes.Region': '_region',
+        'Kubernetes.Networks in use': '_networks_in_use',
+        'Kubernetes.VLAN Type': '_vlan_type',
+        'Kubernetes.Profiling': '_profiling',
+        'Kubernetes.Namespace Pool Size': '_namespace_pool_size',
+        'Kubernetes.Warm Pool Images': '_warm_pool_images',
+        'Kubernetes.Warm Pool Size': '_warm_pool_size',
+        'Kubernetes.Pre-pull Images Count': '_prepull_images_count',
+        'Kubernetes.Check Capacity on Deploy': '_check_capacity_on_deploy',
+    }
+
     def __init__(self, name):
         """
         
         """
-        self.attributes = {}
         self.resources = {}
         self._cloudshell_model_name = 'Kubernetes'
         self._name = name
+        self.attributes = {}
 
     def add_sub_resource(self, relative_path, sub_resource):
         self.resources[relative_path] = sub_resource
@@ -94,10 +212,7 @@ class Kubernetes(object):
         :return:
         :rtype Kubernetes
         """
-        result = Kubernetes(name=context.resource.name)
-        for attr in context.resource.attributes:
-            result.attributes[attr] = context.resource.attributes[attr]
-        return result
+        return _resolved_models.get_or_create(cls, context.resource.name, context.resource.attributes)
 
     def create_autoload_details(self, relative_path=''):
         """
@@ -159,7 +274,7 @@ class Kubernetes(object):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Config File Path'] if 'Kubernetes.Config File Path' in self.attributes else None
+        return self._config_file_path
 
     @config_file_path.setter
     def config_file_path(self, value):
@@ -167,14 +282,14 @@ class Kubernetes(object):
         Path to a standalone kubernetes config file containing all the relevant information for authentication. To get a portable config file run command 'kubectl config view --flatten'
         :type value: str
         """
-        self.attributes['Kubernetes.Config File Path'] = value
+        self._set_attribute('Kubernetes.Config File Path', value)
 
     @property
     def external_service_type(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.External Service Type'] if 'Kubernetes.External Service Type' in self.attributes else None
+        return self._external_service_type
 
     @external_service_type.setter
     def external_service_type(self, value='LoadBalancer'):
@@ -182,14 +297,14 @@ class Kubernetes(object):
         The service type the shell will create for external services. LoadBalander type should be used when the Kuberentes cluster is hosted on a supported public cloud provider like GCP, AWS or Azure. Use NodePort when the cluster is self hosted.
         :type value: str
         """
-        self.attributes['Kubernetes.External Service Type'] = value
+        self._set_attribute('Kubernetes.External Service Type', value)
 
     @property
     def networking_type(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Networking type'] if 'Kubernetes.Networking type' in self.attributes else None
+        return self._networking_type
 
     @networking_type.setter
     def networking_type(self, value):
@@ -197,14 +312,14 @@ class Kubernetes(object):
         networking type that the cloud provider implements- L2 networking (VLANs) or L3 (Subnets)
         :type value: str
         """
-        self.attributes['Kubernetes.Networking type'] = value
+        self._set_attribute('Kubernetes.Networking type', value)
 
     @property
     def region(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Region'] if 'Kubernetes.Region' in self.attributes else None
+        return self._region
 
     @region.setter
     def region(self, value=''):
@@ -212,14 +327,14 @@ class Kubernetes(object):
         The public cloud region to be used by this cloud provider.
         :type value: str
         """
-        self.attributes['Kubernetes.Region'] = value
+        self._set_attribute('Kubernetes.Region', value)
 
     @property
     def networks_in_use(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Networks in use'] if 'Kubernetes.Networks in use' in self.attributes else None
+        return self._networks_in_use
 
     @networks_in_use.setter
     def networks_in_use(self, value=''):
@@ -227,14 +342,14 @@ class Kubernetes(object):
         Reserved network ranges to be excluded when allocated sandbox networks (for cloud providers with L3 networking). The syntax is a comma separated CIDR list. For example "10.0.0.0/24, 10.1.0.0/26"
         :type value: str
         """
-        self.attributes['Kubernetes.Networks in use'] = value
+        self._set_attribute('Kubernetes.Networks in use', value)
 
     @property
     def vlan_type(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.VLAN Type'] if 'Kubernetes.VLAN Type' in self.attributes else None
+        return self._vlan_type
 
     @vlan_type.setter
     def vlan_type(self, value='VLAN'):
@@ -242,7 +357,97 @@ class Kubernetes(object):
         whether to use VLAN or VXLAN (for cloud providers with L2 networking)
         :type value: str
         """
-        self.attributes['Kubernetes.VLAN Type'] = value
+        self._set_attribute('Kubernetes.VLAN Type', value)
+
+    @property
+    def profiling(self):
+        """
+        :rtype: str
+        """
+        return self._profiling
+
+    @profiling.setter
+    def profiling(self, value='Off'):
+        """
+        Profile every driver command and save the profile dumps on the execution server. Use 'CPU and Memory' to also save the top memory allocations (requires python 3).
+        :type value: str
+        """
+        self._set_attribute('Kubernetes.Profiling', value)
+
+    @property
+    def namespace_pool_size(self):
+        """
+        :rtype: int
+        """
+        return self._namespace_pool_size
+
+    @namespace_pool_size.setter
+    def namespace_pool_size(self, value=0):
+        """
+        The number of pre-created namespaces kept for new sandboxes. 0 creates the namespace of a sandbox when it is prepared.
+        :type value: int
+        """
+        self._set_attribute('Kubernetes.Namespace Pool Size', value)
+
+    @property
+    def warm_pool_images(self):
+        """
+        :rtype: str
+        """
+        return self._warm_pool_images
+
+    @warm_pool_images.setter
+    def warm_pool_images(self, value=''):
+        """
+        Comma separated images that are kept pulled on the nodes with warm pods, e.g. 'nginx:1.15, redis'.
+        :type value: str
+        """
+        self._set_attribute('Kubernetes.Warm Pool Images', value)
+
+    @property
+    def warm_pool_size(self):
+        """
+        :rtype: int
+        """
+        return self._warm_pool_size
+
+    @warm_pool_size.setter
+    def warm_pool_size(self, value=0):
+        """
+        The number of warm pods kept for every warm pool image and compute spec. 0 disables the warm pool.
+        :type value: int
+        """
+        self._set_attribute('Kubernetes.Warm Pool Size', value)
+
+    @property
+    def prepull_images_count(self):
+        """
+        :rtype: int
+        """
+        return self._prepull_images_count
+
+    @prepull_images_count.setter
+    def prepull_images_count(self, value=0):
+        """
+        The number of most deployed images a daemon set keeps pulled on every node. 0 disables the pre-pull.
+        :type value: int
+        """
+        self._set_attribute('Kubernetes.Pre-pull Images Count', value)
+
+    @property
+    def check_capacity_on_deploy(self):
+        """
+        :rtype: bool
+        """
+        return self._check_capacity_on_deploy
+
+    @check_capacity_on_deploy.setter
+    def check_capacity_on_deploy(self, value=False):
+        """
+        if set to true a deploy fails right away when the free resources of the nodes can't hold its replicas
+        :type value: bool
+        """
+        self._set_attribute('Kubernetes.Check Capacity on Deploy', value)
 
     @property
     def name(self):
@@ -275,15 +480,41 @@ class Kubernetes(object):
         self._cloudshell_model_name = value
 
 
-class KubernetesService(object):
+class KubernetesService(_ResourceModel):
+    __slots__ = ('resources', '_attributes', '_cloudshell_model_name', '_name', '_docker_image_name',
+                 '_docker_image_tag', '_internal_ports', '_external_ports', '_replicas', '_start_command',
+                 '_environment_variables', '_cpu_request', '_ram_request', '_wait_for_replicas', '_cpu_limit',
+                 '_ram_limit', '_wait_for_ip', '_wait_on_deploy', '_depends_on', '_autoload',
+                 '_pin_image_digest')
+
+    _ATTRIBUTE_FIELDS = {
+        'Kubernetes.Kubernetes Service.Docker Image Name': '_docker_image_name',
+        'Kubernetes.Kubernetes Service.Docker Image Tag': '_docker_image_tag',
+        'Kubernetes.Kubernetes Service.Internal Ports': '_internal_ports',
+        'Kubernetes.Kubernetes Service.External Ports': '_external_ports',
+        'Kubernetes.Kubernetes Service.Replicas': '_replicas',
+        'Kubernetes.Kubernetes Service.Start Command': '_start_command',
+        'Kubernetes.Kubernetes Service.Environment Variables': '_environment_variables',
+        'Kubernetes.Kubernetes Service.CPU Request': '_cpu_request',
+        'Kubernetes.Kubernetes Service.RAM Request': '_ram_request',
+        'Kubernetes.Kubernetes Service.Wait for Replicas': '_wait_for_replicas',
+        'Kubernetes.Kubernetes Service.CPU Limit': '_cpu_limit',
+        'Kubernetes.Kubernetes Service.RAM Limit': '_ram_limit',
+        'Kubernetes.Kubernetes Service.Wait for IP': '_wait_for_ip',
+        'Kubernetes.Kubernetes Service.Wait on Deploy': '_wait_on_deploy',
+        'Kubernetes.Kubernetes Service.Depends On': '_depends_on',
+        'Kubernetes.Kubernetes Service.Autoload': '_autoload',
+        'Kubernetes.Kubernetes Service.Pin Image Digest': '_pin_image_digest',
+    }
+
     def __init__(self, name):
         """
         
         """
-        self.attributes = {}
         self.resources = {}
         self._cloudshell_model_name = 'Kubernetes.Kubernetes Service'
         self._name = name
+        self.attributes = {}
 
     def add_sub_resource(self, relative_path, sub_resource):
         self.resources[relative_path] = sub_resource
@@ -297,10 +528,7 @@ class KubernetesService(object):
         :return:
         :rtype Kubernetes Service
         """
-        result = KubernetesService(name=context.resource.name)
-        for attr in context.resource.attributes:
-            result.attributes[attr] = context.resource.attributes[attr]
-        return result
+        return _resolved_models.get_or_create(cls, context.resource.name, context.resource.attributes)
 
     def create_autoload_details(self, relative_path=''):
         """
@@ -362,7 +590,7 @@ class KubernetesService(object):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Kubernetes Service.Docker Image Name'] if 'Kubernetes.Kubernetes Service.Docker Image Name' in self.attributes else None
+        return self._docker_image_name
 
     @docker_image_name.setter
     def docker_image_name(self, value):
@@ -370,14 +598,14 @@ class KubernetesService(object):
         
         :type value: str
         """
-        self.attributes['Kubernetes.Kubernetes Service.Docker Image Name'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.Docker Image Name', value)
 
     @property
     def docker_image_tag(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Kubernetes Service.Docker Image Tag'] if 'Kubernetes.Kubernetes Service.Docker Image Tag' in self.attributes else None
+        return self._docker_image_tag
 
     @docker_image_tag.setter
     def docker_image_tag(self, value):
@@ -385,14 +613,14 @@ class KubernetesService(object):
         
         :type value: str
         """
-        self.attributes['Kubernetes.Kubernetes Service.Docker Image Tag'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.Docker Image Tag', value)
 
     @property
     def internal_ports(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Kubernetes Service.Internal Ports'] if 'Kubernetes.Kubernetes Service.Internal Ports' in self.attributes else None
+        return self._internal_ports
 
     @internal_ports.setter
     def internal_ports(self, value):
@@ -400,14 +628,14 @@ class KubernetesService(object):
         
         :type value: str
         """
-        self.attributes['Kubernetes.Kubernetes Service.Internal Ports'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.Internal Ports', value)
 
     @property
     def external_ports(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Kubernetes Service.External Ports'] if 'Kubernetes.Kubernetes Service.External Ports' in self.attributes else None
+        return self._external_ports
 
     @external_ports.setter
     def external_ports(self, value):
@@ -415,14 +643,14 @@ class KubernetesService(object):
         
         :type value: str
         """
-        self.attributes['Kubernetes.Kubernetes Service.External Ports'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.External Ports', value)
 
     @property
     def replicas(self):
         """
         :rtype: float
         """
-        return self.attributes['Kubernetes.Kubernetes Service.Replicas'] if 'Kubernetes.Kubernetes Service.Replicas' in self.attributes else None
+        return self._replicas
 
     @replicas.setter
     def replicas(self, value='1'):
@@ -430,14 +658,14 @@ class KubernetesService(object):
         
         :type value: float
         """
-        self.attributes['Kubernetes.Kubernetes Service.Replicas'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.Replicas', value)
 
     @property
     def start_command(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Kubernetes Service.Start Command'] if 'Kubernetes.Kubernetes Service.Start Command' in self.attributes else None
+        return self._start_command
 
     @start_command.setter
     def start_command(self, value):
@@ -445,14 +673,14 @@ class KubernetesService(object):
         
         :type value: str
         """
-        self.attributes['Kubernetes.Kubernetes Service.Start Command'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.Start Command', value)
 
     @property
     def environment_variables(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Kubernetes Service.Environment Variables'] if 'Kubernetes.Kubernetes Service.Environment Variables' in self.attributes else None
+        return self._environment_variables
 
     @environment_variables.setter
     def environment_variables(self, value):
@@ -460,14 +688,14 @@ class KubernetesService(object):
         Comma separated list of 'key=value' environment variables
         :type value: str
         """
-        self.attributes['Kubernetes.Kubernetes Service.Environment Variables'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.Environment Variables', value)
 
     @property
     def cpu_request(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Kubernetes Service.CPU Request'] if 'Kubernetes.Kubernetes Service.CPU Request' in self.attributes else None
+        return self._cpu_request
 
     @cpu_request.setter
     def cpu_request(self, value):
@@ -475,14 +703,14 @@ class KubernetesService(object):
         
         :type value: str
         """
-        self.attributes['Kubernetes.Kubernetes Service.CPU Request'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.CPU Request', value)
 
     @property
     def ram_request(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Kubernetes Service.RAM Request'] if 'Kubernetes.Kubernetes Service.RAM Request' in self.attributes else None
+        return self._ram_request
 
     @ram_request.setter
     def ram_request(self, value):
@@ -490,14 +718,14 @@ class KubernetesService(object):
         
         :type value: str
         """
-        self.attributes['Kubernetes.Kubernetes Service.RAM Request'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.RAM Request', value)
 
     @property
     def wait_for_replicas(self):
         """
         :rtype: float
         """
-        return self.attributes['Kubernetes.Kubernetes Service.Wait for Replicas'] if 'Kubernetes.Kubernetes Service.Wait for Replicas' in self.attributes else None
+        return self._wait_for_replicas
 
     @wait_for_replicas.setter
     def wait_for_replicas(self, value='120'):
@@ -505,14 +733,14 @@ class KubernetesService(object):
         Wait X number of seconds during power on for all replicas to be in ready state. When the value is zero or less the shell will not wait for replicas to be ready.
         :type value: float
         """
-        self.attributes['Kubernetes.Kubernetes Service.Wait for Replicas'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.Wait for Replicas', value)
 
     @property
     def cpu_limit(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Kubernetes Service.CPU Limit'] if 'Kubernetes.Kubernetes Service.CPU Limit' in self.attributes else None
+        return self._cpu_limit
 
     @cpu_limit.setter
     def cpu_limit(self, value):
@@ -520,14 +748,14 @@ class KubernetesService(object):
         
         :type value: str
         """
-        self.attributes['Kubernetes.Kubernetes Service.CPU Limit'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.CPU Limit', value)
 
     @property
     def ram_limit(self):
         """
         :rtype: str
         """
-        return self.attributes['Kubernetes.Kubernetes Service.RAM Limit'] if 'Kubernetes.Kubernetes Service.RAM Limit' in self.attributes else None
+        return self._ram_limit
 
     @ram_limit.setter
     def ram_limit(self, value):
@@ -535,14 +763,14 @@ class KubernetesService(object):
         
         :type value: str
         """
-        self.attributes['Kubernetes.Kubernetes Service.RAM Limit'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.RAM Limit', value)
 
     @property
     def wait_for_ip(self):
         """
         :rtype: bool
         """
-        return self.attributes['Kubernetes.Kubernetes Service.Wait for IP'] if 'Kubernetes.Kubernetes Service.Wait for IP' in self.attributes else None
+        return self._wait_for_ip
 
     @wait_for_ip.setter
     def wait_for_ip(self, value=False):
@@ -550,14 +778,59 @@ class KubernetesService(object):
         if set to false the deployment will not wait for the VM to get an IP address
         :type value: bool
         """
-        self.attributes['Kubernetes.Kubernetes Service.Wait for IP'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.Wait for IP', value)
+
+    @property
+    def wait_on_deploy(self):
+        """
+        :rtype: bool
+        """
+        return self._wait_on_deploy
+
+    @wait_on_deploy.setter
+    def wait_on_deploy(self, value=False):
+        """
+        if set to true the deployment waits for the replicas and the load balancer address before it returns
+        :type value: bool
+        """
+        self._set_attribute('Kubernetes.Kubernetes Service.Wait on Deploy', value)
+
+    @property
+    def depends_on(self):
+        """
+        :rtype: str
+        """
+        return self._depends_on
+
+    @depends_on.setter
+    def depends_on(self, value=''):
+        """
+        comma separated names of the apps of the sandbox that Power On Sandbox powers on before this app
+        :type value: str
+        """
+        self._set_attribute('Kubernetes.Kubernetes Service.Depends On', value)
+
+    @property
+    def pin_image_digest(self):
+        """
+        :rtype: bool
+        """
+        return self._pin_image_digest
+
+    @pin_image_digest.setter
+    def pin_image_digest(self, value=False):
+        """
+        if set to true the image tag is resolved to a digest and the pods pull the image only when it is missing
+        :type value: bool
+        """
+        self._set_attribute('Kubernetes.Kubernetes Service.Pin Image Digest', value)
 
     @property
     def autoload(self):
         """
         :rtype: bool
         """
-        return self.attributes['Kubernetes.Kubernetes Service.Autoload'] if 'Kubernetes.Kubernetes Service.Autoload' in self.attributes else None
+        return self._autoload
 
     @autoload.setter
     def autoload(self, value=True):
@@ -565,7 +838,7 @@ class KubernetesService(object):
         Whether to call the autoload command during Sandbox setup
         :type value: bool
         """
-        self.attributes['Kubernetes.Kubernetes Service.Autoload'] = value
+        self._set_attribute('Kubernetes.Kubernetes Service.Autoload', value)
 
     @property
     def name(self):
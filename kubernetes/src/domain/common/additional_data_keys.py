@@ -2,3 +2,4 @@ class DeployedAppAdditionalDataKeys(object):
     NAMESPACE = 'namespace'
     REPLICAS = 'replicas'
     WAIT_FOR_REPLICAS_TO_BE_READY = 'wait_for_replicas_to_be_ready'
+    WAIT_FOR_IP = 'wait_for_ip'
@@ -0,0 +1,97 @@
+import threading
+from logging import Logger
+
+POWER_ON = 'PowerOn'
+POWER_OFF = 'PowerOff'
+POWER_CYCLE = 'PowerCycle'
+DELETE_INSTANCE = 'DeleteInstance'
+
+# the queued operations that an operation makes redundant, the app ends up in the same state without them
+DEFAULT_SUPERSEDES = {
+    POWER_ON: {POWER_ON},
+    POWER_OFF: {POWER_ON, POWER_OFF, POWER_CYCLE},
+    POWER_CYCLE: {POWER_CYCLE},
+    DELETE_INSTANCE: {POWER_ON, POWER_OFF, POWER_CYCLE, DELETE_INSTANCE},
+}
+
+
+class _Ticket(object):
+    def __init__(self, operation_name):
+        self.operation_name = operation_name
+        self.superseded_by = None
+
+
+class _AppState(object):
+    def __init__(self):
+        self.owner = None
+        self.depth = 0
+        self.queue = []
+
+    def next_ticket(self):
+        for ticket in self.queue:
+            if not ticket.superseded_by:
+                return ticket
+        return None
+
+
+class AppOperationQueue(object):
+    def __init__(self, supersedes=None):
+        """
+        Runs the operations of a deployed app one at a time, so commands on the same app don't race each other's
+        read-modify-write of the deployment. A queued operation is dropped when a later operation makes it redundant,
+        e.g. a queued PowerOn followed by a PowerOff runs only the PowerOff.
+        The queue is reentrant: an operation can run other operations of its app from the same thread.
+        :param dict supersedes: the operation names every operation supersedes, DEFAULT_SUPERSEDES by default
+        """
+        self.supersedes = DEFAULT_SUPERSEDES if supersedes is None else supersedes
+        self._apps = {}
+        self._condition = threading.Condition(threading.Lock())
+
+    def run(self, logger, key, operation_name, function):
+        """
+        :param Logger logger:
+        :param key: hashable key of the app, e.g. the cluster, the namespace and the name of the app
+        :param str operation_name:
+        :param callable function: called without arguments
+        :return: the result of function, None when the operation was superseded by a later one
+        """
+        current_thread = threading.current_thread()
+        with self._condition:
+            app = self._apps.setdefault(key, _AppState())
+            if app.owner is current_thread:
+                app.depth += 1
+            else:
+                ticket = _Ticket(operation_name)
+                superseded = self.supersedes.get(operation_name, ())
+                for queued in app.queue:
+                    if not queued.superseded_by and queued.operation_name in superseded:
+                        queued.superseded_by = operation_name
+                app.queue.append(ticket)
+                self._condition.notify_all()
+
+                while not ticket.superseded_by and (app.owner is not None or app.next_ticket() is not ticket):
+                    self._condition.wait()
+
+                app.queue.remove(ticket)
+                if ticket.superseded_by:
+                    self._release_if_unused(key, app)
+                    logger.info('{} of {} was superseded by a later {}'.format(operation_name, key[-1],
+                                                                               ticket.superseded_by))
+                    return None
+
+                app.owner = current_thread
+                app.depth = 1
+
+        try:
+            return function()
+        finally:
+            with self._condition:
+                app.depth -= 1
+                if not app.depth:
+                    app.owner = None
+                    self._release_if_unused(key, app)
+                    self._condition.notify_all()
+
+    def _release_if_unused(self, key, app):
+        if app.owner is None and not app.queue and self._apps.get(key) is app:
+            del self._apps[key]
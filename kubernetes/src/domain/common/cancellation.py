@@ -0,0 +1,45 @@
+import time
+
+from cloudshell.shell.core.driver_context import CancellationContext
+
+# the longest a wait keeps sleeping after the command was cancelled
+MAX_SLEEP_STEP = 1
+# the longest a watch request of a wait runs before the cancellation and the deadline are checked again
+MAX_WATCH_STEP = 5
+
+
+class OperationCancelledException(Exception):
+    pass
+
+
+def is_cancelled(cancellation_context):
+    """
+    :param CancellationContext cancellation_context: None for commands that can't be cancelled
+    :rtype: bool
+    """
+    return bool(cancellation_context and cancellation_context.is_cancelled)
+
+
+def raise_if_cancelled(cancellation_context, message='Operation was cancelled'):
+    """
+    :param CancellationContext cancellation_context:
+    :param str message:
+    """
+    if is_cancelled(cancellation_context):
+        raise OperationCancelledException(message)
+
+
+def sleep_with_cancellation(seconds, cancellation_context, message='Operation was cancelled'):
+    """
+    Sleeps in steps of at most MAX_SLEEP_STEP seconds and raises as soon as the command is cancelled
+    :param float seconds:
+    :param CancellationContext cancellation_context:
+    :param str message:
+    """
+    end_time = time.time() + seconds
+    while True:
+        raise_if_cancelled(cancellation_context, message)
+        remaining = end_time - time.time()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, MAX_SLEEP_STEP))
@@ -0,0 +1,58 @@
+import sys
+import threading
+
+import six
+from cloudshell.shell.core.driver_context import CancellationContext
+
+from domain.common.cancellation import is_cancelled
+
+
+class LinkedCancellationContext(object):
+    def __init__(self, parent=None):
+        """
+        Cancelled with the command, or once one of the functions that share it failed
+        :param CancellationContext parent: the cancellation context of the command
+        """
+        self.parent = parent
+        self.failed = False
+
+    @property
+    def is_cancelled(self):
+        return self.failed or is_cancelled(self.parent)
+
+
+def run_concurrently(functions, cancellation_context=None, thread_name='concurrent-call'):
+    """
+    Calls every function on its own thread and waits for all of them. When a function fails the others are
+    cancelled through their cancellation context, so a wait doesn't go on for nothing, and the first error is
+    raised once all the functions returned.
+    :param list[callable] functions: called with a LinkedCancellationContext
+    :param CancellationContext cancellation_context:
+    :param str thread_name:
+    :return: the results in the order of the functions
+    :rtype: list
+    """
+    linked_context = LinkedCancellationContext(cancellation_context)
+    results = [None] * len(functions)
+    errors = []
+    lock = threading.Lock()
+
+    def call(index, function):
+        try:
+            results[index] = function(linked_context)
+        except BaseException:
+            with lock:
+                errors.append(sys.exc_info())
+                linked_context.failed = True
+
+    threads = [threading.Thread(target=call, args=(index, function), name=thread_name)
+               for index, function in enumerate(functions)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        six.reraise(*errors[0])
+    return results
@@ -0,0 +1,243 @@
+import json
+from json import encoder as json_encoder
+from operator import attrgetter
+
+import six
+from cloudshell.cp.core.models import DriverResponse, DriverResponseRoot
+
+try:
+    import simplejson
+except ImportError:
+    # optional faster backend
+    simplejson = None
+
+VM_DETAILS_SEPARATORS = (',', ':')
+DEFAULT_SEPARATORS = (', ', ': ')
+
+# the driver responses are plain objects, they are serialized by their attributes
+_get_attributes = attrgetter('__dict__')
+
+_STRING_TYPES = (six.text_type, six.binary_type)
+_INTEGER_TYPES = six.integer_types
+
+
+def _encode_float(value):
+    # same text as the float representation of the stdlib encoder
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return 'Infinity'
+    if value == -float('inf'):
+        return '-Infinity'
+    return repr(value)
+
+
+class _SortedJsonWriter(object):
+    def __init__(self, separators):
+        """
+        Writes json with sorted keys, the C encoder of python 2 doesn't support sort_keys and json.dumps falls back
+        to the pure python encoder for it, which spends most of its time in generators and the sort key lambda.
+        The sorted fields of every class are computed once and reused while its instances have the same attributes.
+        :param tuple separators: (item separator, key separator)
+        """
+        self.item_separator, self.key_separator = separators
+        self._class_fields = {}
+        self._encode_string = json_encoder.encode_basestring_ascii
+
+    def write(self, obj):
+        """
+        :rtype: str
+        """
+        chunks = []
+        self._write(obj, chunks)
+        return ''.join(chunks)
+
+    def _write(self, obj, chunks):
+        obj_type = type(obj)
+        if obj_type in _STRING_TYPES:
+            chunks.append(self._encode_string(obj))
+        elif obj is None:
+            chunks.append('null')
+        elif obj is True:
+            chunks.append('true')
+        elif obj is False:
+            chunks.append('false')
+        elif obj_type in _INTEGER_TYPES:
+            chunks.append(str(obj))
+        elif obj_type is float:
+            chunks.append(_encode_float(obj))
+        elif obj_type is list or obj_type is tuple:
+            self._write_list(obj, chunks)
+        elif obj_type is dict:
+            self._write_fields(self._create_fields(obj), obj, chunks)
+        else:
+            self._write_other(obj, chunks)
+
+    def _write_other(self, obj, chunks):
+        # subclasses of the primitive types and objects, in the same order of checks as the stdlib encoder
+        if isinstance(obj, _STRING_TYPES):
+            chunks.append(self._encode_string(obj))
+        elif isinstance(obj, _INTEGER_TYPES):
+            chunks.append(str(obj))
+        elif isinstance(obj, float):
+            chunks.append(_encode_float(obj))
+        elif isinstance(obj, (list, tuple)):
+            self._write_list(obj, chunks)
+        elif isinstance(obj, dict):
+            self._write_fields(self._create_fields(obj), obj, chunks)
+        else:
+            self._write_object(obj, chunks)
+
+    def _write_list(self, items, chunks):
+        if not items:
+            chunks.append('[]')
+            return
+
+        chunks.append('[')
+        first = True
+        for item in items:
+            if first:
+                first = False
+            else:
+                chunks.append(self.item_separator)
+            self._write(item, chunks)
+        chunks.append(']')
+
+    def _write_object(self, obj, chunks):
+        attributes = _get_attributes(obj)
+        obj_class = type(obj)
+        class_fields = self._class_fields.get(obj_class)
+        # the cached fields are only valid while the instances have the same attribute names
+        if class_fields is None or class_fields[0] != attributes.viewkeys():
+            class_fields = (frozenset(attributes), self._create_fields(attributes))
+            self._class_fields[obj_class] = class_fields
+
+        self._write_fields(class_fields[1], attributes, chunks)
+
+    def _write_fields(self, fields, values, chunks):
+        """
+        :param list[tuple[str, str]] fields: the sorted keys and their encoded prefix
+        :param dict values:
+        :param list[str] chunks:
+        """
+        if not fields:
+            chunks.append('{}')
+            return
+
+        chunks.append('{')
+        first = True
+        for key, prefix in fields:
+            if first:
+                first = False
+            else:
+                chunks.append(self.item_separator)
+            chunks.append(prefix)
+            value = values[key]
+            if type(value) in _STRING_TYPES:
+                chunks.append(self._encode_string(value))
+            else:
+                self._write(value, chunks)
+        chunks.append('}')
+
+    def _create_fields(self, values):
+        """
+        :param dict values:
+        :rtype: list[tuple[str, str]]
+        """
+        return [(key, self._encode_key(key) + self.key_separator) for key in sorted(values)]
+
+    def _encode_key(self, key):
+        if isinstance(key, _STRING_TYPES):
+            return self._encode_string(key)
+        # non string keys are converted the same way the stdlib encoder does
+        if isinstance(key, float):
+            return self._encode_string(_encode_float(key))
+        if key is True:
+            return '"true"'
+        if key is False:
+            return '"false"'
+        if key is None:
+            return '"null"'
+        if isinstance(key, _INTEGER_TYPES):
+            return self._encode_string(str(key))
+        raise TypeError("key {!r} is not a string".format(key))
+
+
+class ResponseJsonEncoder(object):
+    def __init__(self, sort_keys=False, separators=DEFAULT_SEPARATORS, use_simplejson=True):
+        """
+        Produces the same text as json.dumps(obj, default=lambda o: o.__dict__, sort_keys=..., separators=...)
+        :param bool sort_keys:
+        :param tuple separators: (item separator, key separator)
+        :param bool use_simplejson: use simplejson when it is installed, its C encoder supports sort_keys
+        """
+        self.sort_keys = sort_keys
+        self.separators = separators
+        self._encode = self._create_encode_function(use_simplejson and simplejson is not None)
+
+    def encode(self, obj):
+        """
+        :param obj: objects, lists, dicts and primitives
+        :rtype: str
+        """
+        return self._encode(obj)
+
+    def iter_encode_list(self, items):
+        """
+        Encodes the items one at a time as they are produced, the joined chunks are the same as encode(list(items))
+        :param collections.Iterable items:
+        :rtype: collections.Iterable[str]
+        """
+        item_separator = self.separators[0]
+        first = True
+        for item in items:
+            if first:
+                yield '[' + self._encode(item)
+                first = False
+            else:
+                yield item_separator + self._encode(item)
+        yield ']' if not first else '[]'
+
+    def _create_encode_function(self, use_simplejson):
+        if use_simplejson:
+            return simplejson.JSONEncoder(default=_get_attributes,
+                                          sort_keys=self.sort_keys,
+                                          separators=self.separators,
+                                          namedtuple_as_object=False).encode
+
+        if self.sort_keys and not six.PY3:
+            return _SortedJsonWriter(self.separators).write
+
+        # without sorting (and on python 3) the stdlib C encoder is used, it only needs a fast default function
+        return json.JSONEncoder(default=_get_attributes,
+                                sort_keys=self.sort_keys,
+                                separators=self.separators).encode
+
+
+_vm_details_encoder = ResponseJsonEncoder(sort_keys=True, separators=VM_DETAILS_SEPARATORS)
+_driver_response_encoder = ResponseJsonEncoder()
+
+
+def encode_vm_details(vm_details):
+    """
+    :param list vm_details: VmDetailsData list
+    :rtype: str
+    """
+    return _vm_details_encoder.encode(vm_details)
+
+
+def iter_encode_vm_details(vm_details):
+    """
+    :param collections.Iterable[VmDetailsData] vm_details:
+    :rtype: collections.Iterable[str]
+    """
+    return _vm_details_encoder.iter_encode_list(vm_details)
+
+
+def encode_driver_response(driver_response):
+    """
+    Same output as DriverResponse.to_driver_response_json
+    :param DriverResponse driver_response:
+    :rtype: str
+    """
+    return _driver_response_encoder.encode(DriverResponseRoot(driverResponse=driver_response))
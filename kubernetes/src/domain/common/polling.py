@@ -0,0 +1,149 @@
+"""
+Polling helpers of the wait loops.
+
+Many apps of a blueprint are powered on together and wait for their replicas at the same time. With a fixed delay
+their polls stay in lockstep and hit the apiserver in bursts. PollingScheduler hands every wait a backoff that starts
+fast, grows exponentially with jitter and never polls faster than the apiserver answers, and CoalescedLister lets
+the waiters of one namespace share a single list call.
+"""
+import random
+import threading
+import time
+
+DEFAULT_INITIAL_DELAY = 0.5
+DEFAULT_MAX_DELAY = 10
+DEFAULT_MULTIPLIER = 2
+DEFAULT_JITTER = 0.3
+# a waiter doesn't poll more often than every latency_factor times the observed list latency
+DEFAULT_LATENCY_FACTOR = 5
+
+
+class PollingBackoff(object):
+    def __init__(self, scheduler, initial_delay, max_delay):
+        """
+        The delays of one wait loop
+        :param PollingScheduler scheduler:
+        :param float initial_delay:
+        :param float max_delay:
+        """
+        self.scheduler = scheduler
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.attempt = 0
+
+    def next_delay(self):
+        """
+        :return: seconds to sleep before the next poll
+        :rtype: float
+        """
+        scheduler = self.scheduler
+        delay = min(self.max_delay, self.initial_delay * scheduler.multiplier ** self.attempt)
+        self.attempt += 1
+        delay = max(delay, min(self.max_delay, scheduler.latency * scheduler.latency_factor))
+        return delay * scheduler.random.uniform(1 - scheduler.jitter, 1 + scheduler.jitter)
+
+
+class PollingScheduler(object):
+    def __init__(self, initial_delay=DEFAULT_INITIAL_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 multiplier=DEFAULT_MULTIPLIER, jitter=DEFAULT_JITTER, latency_factor=DEFAULT_LATENCY_FACTOR,
+                 random_generator=None):
+        """
+        Shared by all the wait loops of a service, it keeps the moving average of the observed apiserver latency
+        :param float initial_delay: seconds before the second poll
+        :param float max_delay: the longest delay between polls
+        :param float multiplier: growth of the delay after every poll
+        :param float jitter: the delays are spread randomly by this fraction in both directions
+        :param float latency_factor:
+        :param random.Random random_generator:
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.latency_factor = latency_factor
+        self.random = random_generator or random.Random()
+        self.latency = 0.0
+        self._lock = threading.Lock()
+
+    def create_backoff(self, max_delay=None):
+        """
+        :param float max_delay: overrides the max delay of the scheduler for one wait
+        :rtype: PollingBackoff
+        """
+        max_delay = self.max_delay if max_delay is None else max_delay
+        return PollingBackoff(self, min(self.initial_delay, max_delay), max_delay)
+
+    def record_latency(self, seconds):
+        """
+        :param float seconds: the duration of a poll request
+        """
+        with self._lock:
+            # exponentially weighted moving average, recent requests weigh more
+            self.latency = seconds if not self.latency else 0.8 * self.latency + 0.2 * seconds
+
+
+class _CoalescedCall(object):
+    def __init__(self):
+        self.started = time.time()
+        self.completed = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class CoalescedLister(object):
+    def __init__(self, max_age=1.0):
+        """
+        Shares list calls between concurrent waiters of the same key (cluster and namespace).
+        A caller gets the result of a call in flight, or of a call that completed less than max_age seconds ago,
+        as long as the call started after the caller's not_before time, so a waiter never sees a state older than
+        the change it waits for.
+        :param float max_age:
+        """
+        self.max_age = max_age
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def list(self, key, fetch, not_before=0):
+        """
+        :param key: hashable key of the listed objects
+        :param callable fetch: sends the list request, called without arguments
+        :param float not_before: only share calls that started at or after this time
+        :return: the result of fetch, shared with the other callers and must not be modified
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None or call.started < not_before or \
+                    (call.completed is not None and time.time() - call.completed > self.max_age):
+                self._remove_expired_calls()
+                call = _CoalescedCall()
+                self._calls[key] = call
+                leader = True
+            else:
+                leader = False
+
+        if leader:
+            try:
+                call.result = fetch()
+            except Exception as e:
+                call.error = e
+                with self._lock:
+                    # failures are not shared with later callers
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+                raise
+            finally:
+                call.completed = time.time()
+                call.done.set()
+            return call.result
+
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _remove_expired_calls(self):
+        now = time.time()
+        for key, call in list(self._calls.items()):
+            if call.completed is not None and now - call.completed > self.max_age:
+                del self._calls[key]
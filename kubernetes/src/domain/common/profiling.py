@@ -0,0 +1,158 @@
+import cProfile
+import logging
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import tracemalloc
+except ImportError:
+    # tracemalloc is only available on python 3.4+
+    tracemalloc = None
+
+PROFILING_ATTRIBUTE = 'Kubernetes.Profiling'
+PROFILING_ENV_VARIABLE = 'KUBERNETES_SHELL_PROFILING'
+PROFILING_DIR_ENV_VARIABLE = 'KUBERNETES_SHELL_PROFILING_DIR'
+
+
+class ProfilingMode(object):
+    OFF = 'Off'
+    CPU = 'CPU'
+    CPU_AND_MEMORY = 'CPU and Memory'
+
+
+def get_reservation_id(context):
+    """
+    :param context: any command context
+    :rtype: str
+    """
+    reservation = getattr(context, 'reservation', None) or getattr(context, 'remote_reservation', None)
+    if reservation and getattr(reservation, 'reservation_id', None):
+        return reservation.reservation_id
+    return 'no-reservation'
+
+
+class CommandProfiler(object):
+    PROFILE_EXTENSION = '.prof'
+    ALLOCATIONS_EXTENSION = '.allocations.txt'
+
+    def __init__(self, profiles_dir=None, max_profiles=50, top_allocations=25):
+        """
+        :param str profiles_dir: directory for the dumps. defaults to $KUBERNETES_SHELL_PROFILING_DIR or the temp dir
+        :param int max_profiles: number of command dumps to keep, older dumps are deleted
+        :param int top_allocations: number of allocation sites written to the allocations dump
+        """
+        self.profiles_dir = profiles_dir or os.environ.get(PROFILING_DIR_ENV_VARIABLE) or \
+            os.path.join(tempfile.gettempdir(), 'kubernetes-shell-profiles')
+        self.max_profiles = max_profiles
+        self.top_allocations = top_allocations
+        self._logger = logging.getLogger(__name__)
+
+    def get_mode(self, context):
+        """
+        The environment variable overrides the resource attribute so profiling can be switched on for an
+        execution server without touching the resource.
+        :param context: any command context
+        :rtype: str
+        """
+        mode = os.environ.get(PROFILING_ENV_VARIABLE)
+        if not mode:
+            resource = getattr(context, 'resource', None)
+            attributes = getattr(resource, 'attributes', None) or {}
+            mode = attributes.get(PROFILING_ATTRIBUTE)
+
+        if not mode:
+            return ProfilingMode.OFF
+
+        mode = mode.strip().lower()
+        if mode in ('cpu and memory', 'memory', 'all'):
+            return ProfilingMode.CPU_AND_MEMORY
+        if mode in ('cpu', 'true', '1', 'on'):
+            return ProfilingMode.CPU
+        return ProfilingMode.OFF
+
+    @contextmanager
+    def profile(self, command_name, reservation_id, mode):
+        """
+        :param str command_name:
+        :param str reservation_id:
+        :param str mode: one of ProfilingMode
+        """
+        if mode == ProfilingMode.OFF:
+            yield
+            return
+
+        trace_memory = mode == ProfilingMode.CPU_AND_MEMORY and tracemalloc is not None
+        if mode == ProfilingMode.CPU_AND_MEMORY and not trace_memory:
+            self._logger.warning('tracemalloc is not available, profiling {} without allocations'.format(command_name))
+
+        started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot() if trace_memory else None
+            if started_tracing:
+                tracemalloc.stop()
+            self._save_safely(command_name, reservation_id, profiler, snapshot)
+
+    @contextmanager
+    def profile_command(self, command_name, context):
+        """
+        Profiles the block under the profiling mode configured for the command context
+        :param str command_name:
+        :param context: the command context
+        """
+        with self.profile(command_name, get_reservation_id(context), self.get_mode(context)):
+            yield
+
+    def _save_safely(self, command_name, reservation_id, profiler, snapshot):
+        # profiling must never fail the command itself
+        try:
+            if not os.path.isdir(self.profiles_dir):
+                os.makedirs(self.profiles_dir)
+
+            base_path = os.path.join(self.profiles_dir, self._format_dump_name(command_name, reservation_id))
+            profiler.dump_stats(base_path + self.PROFILE_EXTENSION)
+            if snapshot is not None:
+                self._dump_allocations(snapshot, base_path + self.ALLOCATIONS_EXTENSION)
+
+            self._rotate()
+            self._logger.info('Saved {} profile to {}'.format(command_name, base_path + self.PROFILE_EXTENSION))
+        except Exception:
+            self._logger.exception('Failed to save {} profile'.format(command_name))
+
+    def _format_dump_name(self, command_name, reservation_id):
+        safe_reservation_id = re.sub(r'[^A-Za-z0-9_.-]', '_', reservation_id)
+        return '{timestamp}_{pid}_{command}_{reservation_id}'.format(
+            timestamp=datetime.now().strftime('%Y%m%d-%H%M%S-%f'),
+            pid=os.getpid(),
+            command=command_name,
+            reservation_id=safe_reservation_id)
+
+    def _dump_allocations(self, snapshot, path):
+        statistics = snapshot.statistics('lineno')[:self.top_allocations]
+        with open(path, 'w') as f:
+            for stat in statistics:
+                f.write('{}\n'.format(stat))
+
+    def _rotate(self):
+        profiles = [name for name in os.listdir(self.profiles_dir) if name.endswith(self.PROFILE_EXTENSION)]
+        if len(profiles) <= self.max_profiles:
+            return
+
+        # dump names start with a timestamp so the lexical order is the chronological order
+        for name in sorted(profiles)[:len(profiles) - self.max_profiles]:
+            base_path = os.path.join(self.profiles_dir, name[:-len(self.PROFILE_EXTENSION)])
+            for path in (base_path + self.PROFILE_EXTENSION, base_path + self.ALLOCATIONS_EXTENSION):
+                if os.path.exists(path):
+                    os.remove(path)
+
@@ -0,0 +1,65 @@
+import copy
+import sys
+import threading
+
+import six
+
+
+class _Call(object):
+    def __init__(self):
+        self.followers = 0
+        self.snapshot = None
+        self.exc_info = None
+        self.done = threading.Event()
+
+
+class SingleFlight(object):
+    def __init__(self):
+        """
+        Runs one call at a time per key, callers that ask for the same key while the call is in flight wait for it
+        and share its result instead of sending an identical request.
+        The first caller gets the result itself and every other caller gets its own deep copy, so a caller that
+        changes the returned objects (e.g. sets the replicas of a deployment before patching it) doesn't affect
+        the others.
+        """
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+        :param key: hashable key of the call, identical reads must have the same key
+        :param callable function: called without arguments
+        :return: the result of function
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.exc_info is not None:
+                six.reraise(*call.exc_info)
+            return copy.deepcopy(call.snapshot)
+
+        try:
+            result = function()
+        except BaseException:
+            call.exc_info = sys.exc_info()
+            self._finish(key, call)
+            raise
+
+        self._finish(key, call, result)
+        return result
+
+    def _finish(self, key, call, result=None):
+        with self._lock:
+            del self._calls[key]
+            followers = call.followers
+        if followers and call.exc_info is None:
+            # the followers copy a snapshot that the leader never touches
+            call.snapshot = copy.deepcopy(result)
+        call.done.set()
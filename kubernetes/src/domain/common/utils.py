@@ -61,3 +61,27 @@ def get_custom_params_value(custom_params_list, key):
         return param['value']
     else:
         return None
+
+
+def create_custom_params_index(custom_params_list):
+    """
+    Indexes the custom params by name, the first param wins like in get_custom_params_value
+    :param List custom_params_list:
+    :rtype: Dict[str, str]
+    """
+    index = {}
+    for param in custom_params_list:
+        index.setdefault(param['name'], param['value'])
+    return index
+
+
+def truncate_for_log(text, max_length=4096):
+    """
+    Caps long command inputs before they are logged, the bulk requests of large sandboxes can be megabytes long
+    :param str text:
+    :param int max_length:
+    :rtype: str
+    """
+    if text is None or len(text) <= max_length:
+        return text
+    return '{}... ({} more characters)'.format(text[:max_length], len(text) - max_length)
@@ -1,18 +1,24 @@
+from logging import Logger
+
 import data_model
+from domain.services.capacity import ClusterCapacityService
 from domain.services.clients import ApiClientsProvider
 
 
 class AutolaodOperation(object):
 
-    def __init__(self, api_clients_provider):
+    def __init__(self, api_clients_provider, capacity_service=None):
         """
         :param ApiClientsProvider api_clients_provider:
+        :param ClusterCapacityService capacity_service: starts watching the capacity of the cluster
         """
         self.api_clients_provider = api_clients_provider
+        self.capacity_service = capacity_service
 
-    def validate_config(self, cloud_provider_resource):
+    def validate_config(self, cloud_provider_resource, logger=None):
         """
         :param data_model.Kubernetes cloud_provider_resource:
+        :param Logger logger:
         :return:
         """
 
@@ -23,3 +29,11 @@ class AutolaodOperation(object):
         nodes = clients.core_api.list_node(watch=False)
         if not nodes or len(nodes.items) < 1:
             raise ValueError("Cluster '{}' has zero (0) nodes".format(cloud_provider_resource.cluster_name))
+
+        if self.capacity_service and logger and \
+                str(cloud_provider_resource.check_capacity_on_deploy).lower() == 'true':
+            # the snapshot is ready for the first deploy, the check is skipped when the pods can't be listed
+            try:
+                self.capacity_service.get_snapshot(logger, clients)
+            except Exception:
+                logger.warning('Failed to get the capacity of the cluster', exc_info=True)
@@ -1,4 +1,7 @@
 from logging import Logger
+
+from cloudshell.shell.core.driver_context import CancellationContext
+
 from model.clients import KubernetesClients
 from domain.services.deployment import KubernetesDeploymentService
 from domain.services.networking import KubernetesNetworkingService
@@ -13,13 +16,15 @@ class DeleteInstanceOperation(object):
         self.networking_service = networking_service
         self.deployment_service = deployment_service
 
-    def delete_instance(self, logger, clients, kubernetes_name, deployed_app_name, namespace):
+    def delete_instance(self, logger, clients, kubernetes_name, deployed_app_name, namespace,
+                        cancellation_context=None):
         """
         :param srr deployed_app_name:
         :param str namespace:
         :param Logger logger:
         :param KubernetesClients clients:
         :param str kubernetes_name:
+        :param CancellationContext cancellation_context:
         :rtype: None
         """
         self.networking_service.delete_internal_external_set(logger=logger,
@@ -36,6 +41,7 @@ class DeleteInstanceOperation(object):
         self.deployment_service.wait_until_exists(logger=logger,
                                                   clients=clients,
                                                   namespace=namespace,
-                                                  app_name=kubernetes_name)
+                                                  app_name=kubernetes_name,
+                                                  cancellation_context=cancellation_context)
 
         logger.info("Deleted app {} with UID {} from ns/{}".format(deployed_app_name, kubernetes_name, namespace))
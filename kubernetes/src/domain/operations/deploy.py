@@ -4,6 +4,8 @@ from cloudshell.cp.core.models import DeployApp, DeployAppResult
 from cloudshell.shell.core.driver_context import CancellationContext
 
 from domain.common.additional_data_keys import DeployedAppAdditionalDataKeys
+from domain.common.cancellation import raise_if_cancelled
+from domain.common.concurrency import run_concurrently
 from domain.common.utils import convert_to_int_list, create_deployment_model_from_action, \
     convert_app_name_to_valid_kubernetes_name, generate_short_unique_string
 from domain.services.tags import TagsService
@@ -11,27 +13,43 @@ from model.clients import KubernetesClients
 import data_model
 from domain.services.networking import KubernetesNetworkingService
 from domain.services.namespace import KubernetesNamespaceService
+from domain.services.capacity import ClusterCapacityService
 from domain.services.deployment import KubernetesDeploymentService
+from domain.services.image_digest import ImageDigestResolver
+from domain.services.image_prepull import ImagePrePullService
 from domain.services.vm_details import VmDetailsProvider
+from domain.services.warm_pool import WarmPodPool
 from logging import Logger
-from typing import Dict
+from typing import Dict, List
 
 from model.deployment_requests import AppDeploymentRequest, ApplicationImage, AppComputeSpecKubernetes, \
     AppComputeSpecKubernetesResources
 
 
 class DeployOperation(object):
-    def __init__(self, networking_service, namespace_service, deployment_service, vm_details_provider):
+    def __init__(self, networking_service, namespace_service, deployment_service, vm_details_provider,
+                 wait_for_ip_timeout=600, warm_pod_pool=None, image_digest_resolver=None,
+                 capacity_service=None, image_prepull_service=None):
         """
         :param VmDetailsProvider vm_details_provider:
         :param KubernetesNetworkingService networking_service:
         :param KubernetesNamespaceService namespace_service:
         :param KubernetesDeploymentService deployment_service:
+        :param float wait_for_ip_timeout: seconds a deploy with Wait on Deploy waits for the load balancer
+        :param WarmPodPool warm_pod_pool: places the apps of hot images on nodes that already have the image
+        :param ImageDigestResolver image_digest_resolver: pins the images of the apps with Pin Image Digest
+        :param ClusterCapacityService capacity_service: fails the deploys that don't fit in the cluster
+        :param ImagePrePullService image_prepull_service: counts the images of the deployed apps
         """
         self.vm_details_provider = vm_details_provider
         self.networking_service = networking_service
         self.namespace_service = namespace_service
         self.deployment_service = deployment_service
+        self.wait_for_ip_timeout = wait_for_ip_timeout
+        self.warm_pod_pool = warm_pod_pool
+        self.image_digest_resolver = image_digest_resolver
+        self.capacity_service = capacity_service
+        self.image_prepull_service = image_prepull_service
 
     def deploy_app(self, logger, sandbox_id, cloud_provider_resource, deploy_action, clients, cancellation_context):
         """
@@ -49,6 +67,9 @@ class DeployOperation(object):
         kubernetes_app_name = convert_app_name_to_valid_kubernetes_name(deploy_action.actionParams.appName)
         cloudshell_name = self._generate_cloudshell_deployed_app_name(kubernetes_app_name)
 
+        cancelled_message = 'Deployment of app {} was cancelled'.format(deploy_action.actionParams.appName)
+        raise_if_cancelled(cancellation_context, cancelled_message)
+
         namespace_obj = self.namespace_service.get_single_by_id(clients, sandbox_id)
         self._validate_namespace(namespace_obj, sandbox_id)
         namespace = namespace_obj.metadata.name
@@ -58,6 +79,12 @@ class DeployOperation(object):
         internal_ports = convert_to_int_list(deployment_model.internal_ports)
         external_ports = convert_to_int_list(deployment_model.external_ports)
 
+        # checked before anything is created, an app that can't fit fails without a rollback
+        compute_spec = self._get_compute_spec(deployment_model)
+        replicas = self._get_and_validate_replicas_number(deployment_model)
+        if self.capacity_service and self._is_true(cloud_provider_resource.check_capacity_on_deploy):
+            self.capacity_service.check_fits(logger, clients, kubernetes_app_name, compute_spec, replicas)
+
         try:
             created_services = self.networking_service \
                 .create_internal_external_set(namespace=namespace,
@@ -69,16 +96,22 @@ class DeployOperation(object):
                                               clients=clients,
                                               logger=logger)
 
+            # a cancelled deploy goes through the rollback below and frees the command right away
+            raise_if_cancelled(cancellation_context, cancelled_message)
+
             deployment_labels = dict(sandbox_tag)
             for created_service in created_services:
                 deployment_labels.update(created_service.spec.selector)
 
             image = ApplicationImage(deployment_model.docker_image_name,
                                      deployment_model.docker_image_tag)
+            # the tag, a pinned digest would count every push of the tag as another image
+            full_image_name = KubernetesDeploymentService.get_full_image_name(image)
+            if self.image_digest_resolver and self._is_true(deployment_model.pin_image_digest):
+                image.digest = self.image_digest_resolver.resolve(logger, full_image_name)
 
-            compute_spec = self._get_compute_spec(deployment_model)
-            replicas = self._get_and_validate_replicas_number(deployment_model)
             environment_variables = self._get_environment_variables_dict(logger, deployment_model.environment_variables)
+            preferred_node = self._acquire_warm_node(logger, clients, cloud_provider_resource, image, compute_spec)
 
             deployment_request = AppDeploymentRequest(name=kubernetes_app_name,
                                                       image=image,
@@ -87,7 +120,10 @@ class DeployOperation(object):
                                                       compute_spec=compute_spec,
                                                       internal_ports=internal_ports,
                                                       external_ports=external_ports,
-                                                      replicas=replicas)
+                                                      replicas=replicas,
+                                                      wait_for_replicas=int(deployment_model.wait_for_replicas or 0),
+                                                      depends_on=self._get_depends_on(deployment_model.depends_on),
+                                                      preferred_node=preferred_node)
 
             created_deplomyent = self.deployment_service.create_app(logger=logger,
                                                                     clients=clients,
@@ -96,9 +132,23 @@ class DeployOperation(object):
                                                                     labels=deployment_labels,
                                                                     app=deployment_request)
 
+            if self.image_prepull_service:
+                self.image_prepull_service.record_deploy(logger, clients, full_image_name,
+                                                         int(cloud_provider_resource.prepull_images_count or 0))
+
+            raise_if_cancelled(cancellation_context, cancelled_message)
+
+            deployed_app_address = kubernetes_app_name
+            if self._is_true(deployment_model.wait_on_deploy):
+                created_deplomyent, created_services, external_address = self._wait_for_app(
+                    logger, clients, namespace, kubernetes_app_name, deployment_model, created_deplomyent,
+                    created_services, cancellation_context)
+                deployed_app_address = external_address or deployed_app_address
+
             vm_details = self.vm_details_provider.create_vm_details(created_services, created_deplomyent)
 
-            additional_data = self._create_additional_data(namespace, replicas, deployment_model.wait_for_replicas)
+            additional_data = self._create_additional_data(namespace, replicas, deployment_model.wait_for_replicas,
+                                                           deployment_model.wait_for_ip)
 
             # prepare result
             return DeployAppResult(deploy_action.actionId,
@@ -106,7 +156,7 @@ class DeployOperation(object):
                                    vmName=cloudshell_name,
                                    vmDetailsData=vm_details,
                                    deployedAppAdditionalData=additional_data,
-                                   deployedAppAddress=kubernetes_app_name)  # todo - what address to use here?
+                                   deployedAppAddress=deployed_app_address)
         except:
             self._do_rollback_safely(logger=logger,
                                      clients=clients,
@@ -116,6 +166,96 @@ class DeployOperation(object):
             # raise the original exception to log it properly
             raise
 
+    def _wait_for_app(self, logger, clients, namespace, kubernetes_app_name, deployment_model, deployment, services,
+                      cancellation_context):
+        """
+        Waits concurrently for the replicas (Wait for Replicas seconds) and for the load balancer address (with Wait
+        for IP), so the deploy result has the vm details and the address the app ends up with
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str namespace:
+        :param str kubernetes_app_name:
+        :param data_model.KubernetesService deployment_model:
+        :param AppsV1beta1Deployment deployment: the created deployment
+        :param List[V1Service] services: the created services
+        :param CancellationContext cancellation_context:
+        :return: the ready deployment, the services and the load balancer address (None without a load balancer)
+        :rtype: tuple
+        """
+        waits = []
+        wait_for_replicas = int(deployment_model.wait_for_replicas or 0)
+        if wait_for_replicas > 0:
+            waits.append(lambda context: self.deployment_service.watch_until_all_replicas_ready(
+                logger=logger,
+                clients=clients,
+                namespace=namespace,
+                app_name=kubernetes_app_name,
+                deployed_app_name=deployment_model.name,
+                timeout=wait_for_replicas,
+                cancellation_context=context,
+                generation=deployment.metadata.generation))
+
+        has_load_balancer = any(service.spec.type == 'LoadBalancer' for service in services)
+        if has_load_balancer and str(deployment_model.wait_for_ip).lower() != 'false':
+            waits.append(lambda context: self.networking_service.wait_for_external_address(
+                logger=logger,
+                clients=clients,
+                namespace=namespace,
+                app_name=kubernetes_app_name,
+                timeout=self.wait_for_ip_timeout,
+                cancellation_context=context))
+
+        if not waits:
+            return deployment, services, None
+
+        logger.info('Waiting for app {} to be ready'.format(deployment_model.name))
+        results = run_concurrently(waits, cancellation_context, 'deploy-wait-{}'.format(kubernetes_app_name))
+
+        if wait_for_replicas > 0:
+            deployment = results.pop(0)
+        external_address = results.pop(0) if results else None
+        if external_address:
+            # the created services don't have the load balancer status yet
+            services = self.networking_service.get_services_by_app_name(clients, namespace, kubernetes_app_name)
+        return deployment, services, external_address
+
+    def _acquire_warm_node(self, logger, clients, cloud_provider_resource, image, compute_spec):
+        """
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param data_model.Kubernetes cloud_provider_resource:
+        :param ApplicationImage image:
+        :param AppComputeSpecKubernetes compute_spec:
+        :return: the node of a warm pod of the image, None when the app is deployed without the warm pool
+        :rtype: str
+        """
+        if not self.warm_pod_pool:
+            return None
+        return self.warm_pod_pool.acquire_node(logger=logger,
+                                               clients=clients,
+                                               hot_images=cloud_provider_resource.warm_pool_images,
+                                               size=int(cloud_provider_resource.warm_pool_size or 0),
+                                               full_image_name=KubernetesDeploymentService.get_full_image_name(image),
+                                               compute_spec=compute_spec)
+
+    @staticmethod
+    def _get_depends_on(depends_on):
+        """
+        :param str depends_on: comma separated app names
+        :return: the kubernetes names of the apps
+        :rtype: List[str]
+        """
+        return [convert_app_name_to_valid_kubernetes_name(app_name.strip())
+                for app_name in (depends_on or '').split(',') if app_name.strip()]
+
+    @staticmethod
+    def _is_true(value):
+        """
+        :param value: a boolean attribute value
+        :rtype: bool
+        """
+        return str(value).lower() == 'true'
+
     def _generate_cloudshell_deployed_app_name(self, kubernetes_app_name):
         return "{}-{}".format(kubernetes_app_name, generate_short_unique_string())
 
@@ -147,17 +287,19 @@ class DeployOperation(object):
             raise ValueError("The number of replicas for the application must be 1 or greater")
         return replicas
 
-    def _create_additional_data(self, namespace, replicas, wait_for_replicas_to_be_ready):
+    def _create_additional_data(self, namespace, replicas, wait_for_replicas_to_be_ready, wait_for_ip=None):
         """
         :param str namespace:
         :param int replicas:
         :param int wait_for_replicas_to_be_ready
+        :param str wait_for_ip: the Wait for IP attribute, stored as True when it is not set
         :rtype: Dict
         """
         return {
             DeployedAppAdditionalDataKeys.NAMESPACE: namespace,
             DeployedAppAdditionalDataKeys.REPLICAS: replicas,
-            DeployedAppAdditionalDataKeys.WAIT_FOR_REPLICAS_TO_BE_READY: wait_for_replicas_to_be_ready
+            DeployedAppAdditionalDataKeys.WAIT_FOR_REPLICAS_TO_BE_READY: wait_for_replicas_to_be_ready,
+            DeployedAppAdditionalDataKeys.WAIT_FOR_IP: str(wait_for_ip).lower() != 'false'
         }
 
     def _get_environment_variables_dict(self, logger, environment_variables):
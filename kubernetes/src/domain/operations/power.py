@@ -1,5 +1,8 @@
 from logging import Logger
 
+from cloudshell.shell.core.driver_context import CancellationContext
+
+from domain.common.cancellation import sleep_with_cancellation
 from domain.services.deployment import KubernetesDeploymentService
 from model.clients import KubernetesClients
 from model.deployed_app import DeployedAppResource
@@ -13,11 +16,12 @@ class PowerOperation(object):
         """
         self.deployment_service = deployment_service
 
-    def power_on(self, logger, clients, deployed_app):
+    def power_on(self, logger, clients, deployed_app, cancellation_context=None):
         """
         :param Logger logger:
         :param KubernetesClients clients:
         :param DeployedAppResource deployed_app:
+        :param CancellationContext cancellation_context:
         :return:
         """
         deployment = self.deployment_service.get_deployment_by_name(clients,
@@ -45,10 +49,47 @@ class PowerOperation(object):
                 namespace=deployed_app.namespace,
                 app_name=deployed_app.kubernetes_name,
                 deployed_app_name=deployed_app.cloudshell_resource_name,
-                timeout=deployed_app.wait_for_replicas_to_be_ready)
+                timeout=deployed_app.wait_for_replicas_to_be_ready,
+                cancellation_context=cancellation_context)
 
         logger.info("App {} powered on.".format(deployed_app.cloudshell_resource_name))
 
+    def power_cycle(self, logger, clients, deployed_app, delay=0, cancellation_context=None):
+        """
+        Restarts the pods of the app with a rolling restart instead of scaling the deployment down and up, the app
+        keeps serving and the new pods start on nodes that already have the image
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param DeployedAppResource deployed_app:
+        :param float delay: seconds to pause before the restart, like the pause between power off and power on
+        :param CancellationContext cancellation_context:
+        """
+        cancelled_message = 'Power cycle of app {} was cancelled'.format(deployed_app.cloudshell_resource_name)
+        if delay > 0:
+            logger.info('Waiting {} seconds before restarting app {}'.format(delay,
+                                                                            deployed_app.cloudshell_resource_name))
+            sleep_with_cancellation(delay, cancellation_context, cancelled_message)
+
+        deployment = self.deployment_service.restart_app(logger=logger,
+                                                         clients=clients,
+                                                         namespace=deployed_app.namespace,
+                                                         app_name=deployed_app.kubernetes_name)
+
+        if deployment.spec.replicas and deployed_app.wait_for_replicas_to_be_ready > 0:
+            logger.info("Waiting for the rollout of app {} to complete. Timeout set to: {}"
+                        .format(deployed_app.cloudshell_resource_name, str(deployed_app.wait_for_replicas_to_be_ready)))
+            self.deployment_service.wait_until_all_replicas_ready(
+                logger=logger,
+                clients=clients,
+                namespace=deployed_app.namespace,
+                app_name=deployed_app.kubernetes_name,
+                deployed_app_name=deployed_app.cloudshell_resource_name,
+                timeout=deployed_app.wait_for_replicas_to_be_ready,
+                cancellation_context=cancellation_context,
+                generation=deployment.metadata.generation)
+
+        logger.info("App {} power cycled.".format(deployed_app.cloudshell_resource_name))
+
     def power_off(self, logger, clients, deployed_app):
         """
         :param Logger logger:
@@ -15,12 +15,13 @@ class PrepareSandboxInfraOperation(object):
         """
         self.namespace_service = namespace_service
 
-    def prepare(self, logger, sandbox_id, clients, actions):
+    def prepare(self, logger, sandbox_id, clients, actions, namespace_pool_size=0):
         """
         :param Logger logger:
         :param str sandbox_id:
         :param KubernetesClients clients:
         :param List[RequestActionBase] actions:
+        :param int namespace_pool_size: the number of pre-created namespaces to keep, 0 disables the pool
         :return:
         """
 
@@ -38,21 +39,27 @@ class PrepareSandboxInfraOperation(object):
         access_keys_action = single(actions, lambda x: isinstance(x, CreateKeys))
         access_keys_action_results = CreateKeysActionResult(access_keys_action.actionId)
 
-        # generate namespace name for sandbox
-        requested_namespace_name = self.namespace_service.get_namespace_name_for_sandbox(sandbox_id)
-        logger.debug("Creating namespace '{}'".format(requested_namespace_name))
-
         # todo - alexaz - add more labels like 'createdby', 'owner', etc and add annotations
         labels = {TagsService.SANDBOX_ID: sandbox_id}
 
         # check if namesapce already exists
         namespace_obj = self.namespace_service.get_single_by_id(clients, sandbox_id)
+        if not namespace_obj and namespace_pool_size > 0:
+            namespace_obj = self.namespace_service.claim_pooled_namespace(logger, clients, sandbox_id)
+
+        # generate namespace name for sandbox
+        requested_namespace_name = self.namespace_service.get_namespace_name_for_sandbox(sandbox_id)
+
         if not namespace_obj:
+            logger.debug("Creating namespace '{}'".format(requested_namespace_name))
             # create namespace for sandbox
             created_namespace = self.namespace_service.create(clients, requested_namespace_name, labels, None)
             logger.info("Created namespace '{}'".format(created_namespace.metadata.name))
         else:
-            logger.info("Namespace '{}' already exists".format(requested_namespace_name))
+            logger.info("Namespace '{}' already exists".format(namespace_obj.metadata.name))
+
+        if namespace_pool_size > 0:
+            self.namespace_service.top_up_pool(logger, clients, namespace_pool_size)
 
         return [prep_network_action_result, prep_subnet_action_result, access_keys_action_results]
 
@@ -0,0 +1,51 @@
+from logging import Logger
+
+from cloudshell.cp.core.utils import first_or_default
+from cloudshell.shell.core.driver_context import CancellationContext
+
+from domain.services.networking import KubernetesNetworkingService
+from domain.services.tags import TagsService
+from model.clients import KubernetesClients
+from model.deployed_app import DeployedAppResource
+
+
+class RefreshIpOperation(object):
+    def __init__(self, networking_service, wait_for_ip_timeout=600):
+        """
+        :param KubernetesNetworkingService networking_service:
+        :param float wait_for_ip_timeout: seconds to wait for the load balancer of an app with Wait for IP
+        """
+        self.networking_service = networking_service
+        self.wait_for_ip_timeout = wait_for_ip_timeout
+
+    def refresh_ip(self, logger, clients, deployed_app, cancellation_context=None):
+        """
+        The address of an app is the address of its load balancer when it has a LoadBalancer external service.
+        Other apps keep the address they were deployed with, the name of their services
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param DeployedAppResource deployed_app:
+        :param CancellationContext cancellation_context:
+        :return: the address of the load balancer, None when the address of the app doesn't change
+        :rtype: str
+        """
+        services = self.networking_service.get_services_by_app_name(clients=clients,
+                                                                    namespace=deployed_app.namespace,
+                                                                    app_name=deployed_app.kubernetes_name)
+
+        external_service = first_or_default(services, lambda x: x.metadata.labels.get(TagsService.EXTERNAL_SERVICE))
+        if external_service and external_service.spec.type == 'LoadBalancer':
+            address = self.networking_service.get_external_address(external_service)
+            if address or not deployed_app.wait_for_ip:
+                return address
+
+            logger.info('Waiting for the load balancer address of app {}. Timeout set to: {}'
+                        .format(deployed_app.cloudshell_resource_name, self.wait_for_ip_timeout))
+            return self.networking_service.wait_for_external_address(logger=logger,
+                                                                     clients=clients,
+                                                                     namespace=deployed_app.namespace,
+                                                                     app_name=deployed_app.kubernetes_name,
+                                                                     timeout=self.wait_for_ip_timeout,
+                                                                     cancellation_context=cancellation_context)
+
+        return None
@@ -0,0 +1,165 @@
+from logging import Logger
+
+from cloudshell.shell.core.driver_context import CancellationContext
+from kubernetes.client import AppsV1beta1Deployment
+from typing import Dict, List
+
+from domain.common.cancellation import raise_if_cancelled
+from domain.common.concurrency import run_concurrently
+from domain.services.deployment import KubernetesDeploymentService
+from domain.services.namespace import KubernetesNamespaceService
+from domain.services.tags import TagsService
+from model.clients import KubernetesClients
+from model.sandbox_power import AppPowerResult
+
+
+class SandboxPowerOperation(object):
+    def __init__(self, namespace_service, deployment_service):
+        """
+        :param KubernetesNamespaceService namespace_service:
+        :param KubernetesDeploymentService deployment_service:
+        """
+        self.namespace_service = namespace_service
+        self.deployment_service = deployment_service
+
+    def power_on(self, logger, clients, sandbox_id, cancellation_context=None):
+        """
+        Powers on all the apps of the sandbox in waves: an app is scaled back to its replicas once the apps it
+        depends on are ready, the apps of a wave are scaled together and their readiness is followed by one watch.
+        The apps deployed without the replicas annotation are not scaled, the other apps are powered on and the
+        command fails with the results of all the apps.
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str sandbox_id:
+        :param CancellationContext cancellation_context:
+        :rtype: List[AppPowerResult]
+        """
+        namespace, deployments = self._get_sandbox_deployments(clients, sandbox_id)
+        waves = self._get_waves(logger, deployments)
+        label_selector = '{}={}'.format(TagsService.SANDBOX_ID, sandbox_id)
+        cancelled_message = 'Power on of sandbox {} was cancelled'.format(sandbox_id)
+
+        results = []
+        for wave_number, wave in enumerate(waves, 1):
+            raise_if_cancelled(cancellation_context, cancelled_message)
+            logger.info('Powering on wave {} of sandbox {}: {}'.format(wave_number, sandbox_id, ', '.join(wave)))
+
+            scaled_apps = []
+            for name in wave:
+                replicas = self._get_int_annotation(deployments[name], TagsService.REPLICAS)
+                if replicas is None:
+                    logger.error('Replicas of app {} are unknown, it is not powered on'.format(name))
+                else:
+                    scaled_apps.append((name, replicas))
+
+            scaled_deployments = run_concurrently(
+                [lambda context, name=name, replicas=replicas: self.deployment_service.scale_app(
+                    logger, clients, namespace, name, replicas) for name, replicas in scaled_apps],
+                cancellation_context, 'sandbox-power-on')
+
+            apps_to_wait = {}
+            for deployment, (name, replicas) in zip(scaled_deployments, scaled_apps):
+                wait_for_replicas = self._get_int_annotation(deployment, TagsService.WAIT_FOR_REPLICAS) or 0
+                if replicas > 0 and wait_for_replicas > 0:
+                    apps_to_wait[name] = (deployment.metadata.generation, wait_for_replicas)
+
+            ready_times = {}
+            if apps_to_wait:
+                ready_times = self.deployment_service.watch_until_apps_ready(logger=logger,
+                                                                             clients=clients,
+                                                                             namespace=namespace,
+                                                                             label_selector=label_selector,
+                                                                             apps=apps_to_wait,
+                                                                             cancellation_context=cancellation_context)
+
+            replicas_by_name = dict(scaled_apps)
+            for name in wave:
+                if name in replicas_by_name:
+                    results.append(AppPowerResult(name, wave_number, replicas_by_name[name], ready_times.get(name)))
+                else:
+                    results.append(AppPowerResult(name, wave_number,
+                                                  failure='its replicas are unknown, use Power On of the app'))
+
+        failed_apps = [result.name for result in results if result.failure]
+        if failed_apps:
+            raise ValueError('Apps {} of sandbox {} were not powered on:\n{}'
+                             .format(', '.join(failed_apps), sandbox_id, '\n'.join(str(result) for result in results)))
+
+        logger.info('Sandbox {} powered on'.format(sandbox_id))
+        return results
+
+    def power_off(self, logger, clients, sandbox_id, cancellation_context=None):
+        """
+        Scales all the apps of the sandbox to 0 replicas at once, the dependencies only order the start-up
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str sandbox_id:
+        :param CancellationContext cancellation_context:
+        :rtype: List[AppPowerResult]
+        """
+        namespace, deployments = self._get_sandbox_deployments(clients, sandbox_id)
+        names = sorted(deployments)
+        run_concurrently([lambda context, name=name: self.deployment_service.scale_app(logger, clients, namespace,
+                                                                                       name, 0)
+                          for name in names],
+                         cancellation_context, 'sandbox-power-off')
+
+        logger.info('Sandbox {} powered off'.format(sandbox_id))
+        return [AppPowerResult(name, 1, 0) for name in names]
+
+    def _get_sandbox_deployments(self, clients, sandbox_id):
+        """
+        :param KubernetesClients clients:
+        :param str sandbox_id:
+        :return: the namespace of the sandbox and its deployments by name
+        :rtype: tuple
+        """
+        namespace_obj = self.namespace_service.get_single_by_id(clients, sandbox_id)
+        if not namespace_obj:
+            raise ValueError("Namespace for sandbox '{}' not found".format(sandbox_id))
+        namespace = namespace_obj.metadata.name
+
+        label_selector = '{}={}'.format(TagsService.SANDBOX_ID, sandbox_id)
+        deployments = clients.apps_api.list_namespaced_deployment(namespace=namespace,
+                                                                  label_selector=label_selector).items
+        return namespace, {deployment.metadata.name: deployment for deployment in deployments}
+
+    def _get_waves(self, logger, deployments):
+        """
+        Orders the apps by their Depends On annotation, every wave holds the apps whose dependencies are in the
+        previous waves
+        :param Logger logger:
+        :param Dict[str, AppsV1beta1Deployment] deployments:
+        :rtype: List[List[str]]
+        """
+        dependencies = {}
+        for name, deployment in deployments.items():
+            annotation = (deployment.metadata.annotations or {}).get(TagsService.DEPENDS_ON) or ''
+            dependencies[name] = set()
+            for dependency in filter(None, [x.strip() for x in annotation.split(',')]):
+                if dependency in deployments:
+                    dependencies[name].add(dependency)
+                else:
+                    logger.warning('App {} depends on app {} which is not in the sandbox'.format(name, dependency))
+
+        waves = []
+        ordered = set()
+        while len(ordered) < len(dependencies):
+            wave = sorted(name for name, names in dependencies.items()
+                          if name not in ordered and names <= ordered)
+            if not wave:
+                raise ValueError('The dependencies of apps {} form a cycle'
+                                 .format(', '.join(sorted(set(dependencies) - ordered))))
+            waves.append(wave)
+            ordered.update(wave)
+        return waves
+
+    @staticmethod
+    def _get_int_annotation(deployment, key):
+        """
+        :param AppsV1beta1Deployment deployment:
+        :param str key:
+        :rtype: int
+        """
+        value = (deployment.metadata.annotations or {}).get(key)
+        return int(value) if value not in (None, '') else None
@@ -1,52 +1,222 @@
+import threading
+import time
+from collections import OrderedDict
+
 from typing import Dict
 
+from cloudshell.cp.core.models import VmDetailsData
+from cloudshell.shell.core.driver_context import CancellationContext
+
+from domain.common.cancellation import is_cancelled
 from logging import Logger
 from model.clients import KubernetesClients
 from model.deployed_app import DeployedAppResource
 from domain.services.networking import KubernetesNetworkingService
 from domain.services.deployment import KubernetesDeploymentService
 from domain.services.vm_details import VmDetailsProvider
+from domain.services.vm_details_cache import VmDetailsCache
+
+
+class _VmDetailsItem(object):
+    def __init__(self, item):
+        """
+        The state of one requested item, filled by the namespace worker and read by the caller thread
+        :param dict item:
+        """
+        self.item = item
+        self.deployed_app = None
+        self.group = None
+        self.started = None
+        self.result = None
+        self.done = threading.Event()
+
+    @property
+    def app_name(self):
+        try:
+            return self.item['deployedAppJson']['name']
+        except (KeyError, TypeError):
+            return ''
+
+    def set_result(self, result):
+        self.result = result
+        self.done.set()
+
+    def set_error(self, message):
+        self.set_result(VmDetailsData(appName=self.app_name, errorMessage=message))
+
+
+class _NamespaceGroup(object):
+    def __init__(self, namespace):
+        """
+        :param str namespace:
+        """
+        self.namespace = namespace
+        self.items = []
+        # set once an item of the namespace timed out, its worker is still stuck on it
+        self.stalled = False
 
 
 class VmDetialsOperation(object):
-    def __init__(self, networking_service, deployment_service, vm_details_service):
+    def __init__(self, networking_service, deployment_service, vm_details_service, vm_details_cache=None,
+                 max_workers=8, item_timeout=60, poll_interval=0.2):
         """
         :param VmDetailsProvider vm_details_service:
         :param KubernetesNetworkingService networking_service:
         :param KubernetesDeploymentService deployment_service:
+        :param VmDetailsCache vm_details_cache: the vm details are created on every request without it
+        :param int max_workers: the max number of namespaces that are processed concurrently
+        :param float item_timeout: seconds an item may take once its processing started
+        :param float poll_interval: seconds between checks of the cancellation and the deadlines
         """
         self.vm_details_service = vm_details_service
         self.deployment_service = deployment_service
         self.networking_service = networking_service
+        self.vm_details_cache = vm_details_cache
+        self.max_workers = max_workers
+        self.item_timeout = item_timeout
+        self.poll_interval = poll_interval
 
-    def create_vm_details_bulk(self, logger, clients, items):
+    def create_vm_details_bulk(self, logger, clients, items, cancellation_context=None):
         """
 
         :param Logger logger:
         :param KubernetesClients clients:
         :param Dict items:
+        :param CancellationContext cancellation_context:
         :return:
         """
+        return list(self.iter_vm_details(logger, clients, items, cancellation_context))
 
-        logger.info('Creating vm details for {} vms'.format(len(items)))
+    def iter_vm_details(self, logger, clients, items, cancellation_context=None):
+        """
+        Yields the vm details of every item in the request order as soon as it is resolved.
+        The items of different namespaces are resolved concurrently, the items of one namespace one after the other.
+        An item that fails, doesn't finish within item_timeout or is left when the command is cancelled gets vm
+        details with an error message instead of failing the whole response.
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param Dict items:
+        :param CancellationContext cancellation_context:
+        :rtype: collections.Iterable[VmDetailsData]
+        """
+        vm_details_items = [_VmDetailsItem(item) for item in items['items']]
+        logger.info('Creating vm details for {} vms'.format(len(vm_details_items)))
 
-        result = []
-        for item in items['items']:
-            deployed_app = DeployedAppResource(deployed_app_dict=item['deployedAppJson'])
+        groups = self._group_by_namespace(logger, vm_details_items)
+        self._start_workers(logger, clients, groups, cancellation_context)
 
-            services = self.networking_service.get_services_by_app_name(clients=clients,
-                                                                        namespace=deployed_app.namespace,
-                                                                        app_name=deployed_app.kubernetes_name)
+        for vm_details_item in vm_details_items:
+            self._wait_for_item(logger, vm_details_item, cancellation_context)
+            yield vm_details_item.result
+            logger.info('Created vm details for {}'.format(vm_details_item.app_name))
 
-            deployment = self.deployment_service.get_deployment_by_name(clients=clients,
-                                                                        namespace=deployed_app.namespace,
-                                                                        app_name=deployed_app.kubernetes_name)
+    def _group_by_namespace(self, logger, vm_details_items):
+        """
+        :param Logger logger:
+        :param list[_VmDetailsItem] vm_details_items:
+        :rtype: list[_NamespaceGroup]
+        """
+        groups = OrderedDict()
+        for vm_details_item in vm_details_items:
+            try:
+                vm_details_item.deployed_app = DeployedAppResource(
+                    deployed_app_dict=vm_details_item.item['deployedAppJson'])
+                namespace = vm_details_item.deployed_app.namespace
+            except Exception as e:
+                logger.exception("Failed to read the deployed app of '{}'".format(vm_details_item.app_name))
+                vm_details_item.set_error(str(e))
+                continue
 
-            result.append(
-                self.vm_details_service.create_vm_details(services=services,
-                                                          deployment=deployment,
-                                                          deployed_app=deployed_app,
-                                                          deploy_app_name=deployed_app.cloudshell_resource_name))
-            logger.info('Created vm details for {}'.format(deployed_app.cloudshell_resource_name))
+            vm_details_item.group = groups.setdefault(namespace, _NamespaceGroup(namespace))
+            vm_details_item.group.items.append(vm_details_item)
+        return list(groups.values())
 
-        return result
+    def _start_workers(self, logger, clients, groups, cancellation_context):
+        """
+        Every worker takes the next namespace group until none are left, the threads are daemons so a worker that is
+        stuck on a slow request doesn't hold the command
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param list[_NamespaceGroup] groups:
+        :param CancellationContext cancellation_context:
+        """
+        pending_groups = list(reversed(groups))
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                with lock:
+                    if not pending_groups:
+                        return
+                    group = pending_groups.pop()
+                self._process_group(logger, clients, group, cancellation_context)
+
+        for _ in range(min(self.max_workers, len(groups))):
+            worker = threading.Thread(target=work, name='vm-details-worker')
+            worker.daemon = True
+            worker.start()
+
+    def _process_group(self, logger, clients, group, cancellation_context):
+        """
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param _NamespaceGroup group:
+        :param CancellationContext cancellation_context:
+        """
+        for vm_details_item in group.items:
+            if is_cancelled(cancellation_context) or group.stalled:
+                return
+            vm_details_item.started = time.time()
+            try:
+                vm_details_item.set_result(self._create_vm_details(clients, vm_details_item.deployed_app))
+            except Exception as e:
+                logger.exception("Failed to create vm details for '{}'".format(vm_details_item.app_name))
+                vm_details_item.set_error(str(e))
+
+    def _create_vm_details(self, clients, deployed_app):
+        """
+        :param KubernetesClients clients:
+        :param DeployedAppResource deployed_app:
+        :rtype: VmDetailsData
+        """
+        if self.vm_details_cache:
+            vm_details = self.vm_details_cache.get(clients, deployed_app)
+            if vm_details:
+                return vm_details
+
+        services = self.networking_service.get_services_by_app_name(clients=clients,
+                                                                    namespace=deployed_app.namespace,
+                                                                    app_name=deployed_app.kubernetes_name)
+
+        deployment = self.deployment_service.get_deployment_by_name(clients=clients,
+                                                                    namespace=deployed_app.namespace,
+                                                                    app_name=deployed_app.kubernetes_name)
+
+        vm_details = self.vm_details_service.create_vm_details(services=services,
+                                                               deployment=deployment,
+                                                               deployed_app=deployed_app,
+                                                               deploy_app_name=deployed_app.cloudshell_resource_name)
+        if self.vm_details_cache:
+            self.vm_details_cache.put(clients, deployed_app, vm_details, deployment, services)
+        return vm_details
+
+    def _wait_for_item(self, logger, vm_details_item, cancellation_context):
+        """
+        Waits until the item has a result, sets an error result when the item missed its deadline or the command
+        was cancelled
+        :param Logger logger:
+        :param _VmDetailsItem vm_details_item:
+        :param CancellationContext cancellation_context:
+        """
+        group = vm_details_item.group
+        while not vm_details_item.done.wait(self.poll_interval):
+            if is_cancelled(cancellation_context):
+                vm_details_item.set_error('Cancelled before the vm details were created')
+            elif group.stalled and vm_details_item.started is None:
+                vm_details_item.set_error("Skipped, a previous app in namespace '{}' did not respond"
+                                          .format(group.namespace))
+            elif vm_details_item.started is not None and \
+                    time.time() - vm_details_item.started > self.item_timeout:
+                logger.warning("Creating vm details for '{}' timed out".format(vm_details_item.app_name))
+                group.stalled = True
+                vm_details_item.set_error('Timed out after {} seconds'.format(self.item_timeout))
@@ -0,0 +1,355 @@
+import re
+import threading
+import time
+from decimal import Decimal, ROUND_CEILING
+from logging import Logger
+
+from kubernetes import watch
+from kubernetes.client import V1Node, V1Pod
+
+from domain.common.cancellation import MAX_WATCH_STEP
+from model.clients import KubernetesClients
+from model.deployment_requests import AppComputeSpecKubernetes
+
+QUANTITY_PATTERN = re.compile(r'^([+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)'
+                              r'(Ki|Mi|Gi|Ti|Pi|Ei|n|u|m|k|M|G|T|P|E)?$')
+QUANTITY_SUFFIXES = {
+    None: Decimal(1),
+    'n': Decimal('1e-9'), 'u': Decimal('1e-6'), 'm': Decimal('1e-3'),
+    'k': Decimal(10) ** 3, 'M': Decimal(10) ** 6, 'G': Decimal(10) ** 9,
+    'T': Decimal(10) ** 12, 'P': Decimal(10) ** 15, 'E': Decimal(10) ** 18,
+    'Ki': Decimal(2) ** 10, 'Mi': Decimal(2) ** 20, 'Gi': Decimal(2) ** 30,
+    'Ti': Decimal(2) ** 40, 'Pi': Decimal(2) ** 50, 'Ei': Decimal(2) ** 60,
+}
+
+# pods in these phases don't hold their requests anymore
+TERMINAL_POD_PHASES = ('Succeeded', 'Failed')
+ACTIVE_PODS_FIELD_SELECTOR = 'status.phase!=Succeeded,status.phase!=Failed'
+# the apps have no tolerations, so they are never scheduled on nodes with these taints
+BLOCKING_TAINT_EFFECTS = ('NoSchedule', 'NoExecute')
+WATCH_RETRY_DELAY = 5
+
+
+def parse_quantity(quantity):
+    """
+    :param str quantity: a kubernetes quantity, e.g. '500m', '1.5', '512Mi' or '1e3'
+    :rtype: Decimal
+    """
+    match = QUANTITY_PATTERN.match(str(quantity).strip())
+    if not match:
+        raise ValueError("Invalid quantity '{}'".format(quantity))
+    return Decimal(match.group(1)) * QUANTITY_SUFFIXES[match.group(2)]
+
+
+def parse_cpu(quantity):
+    """
+    :param str quantity:
+    :return: millicores
+    :rtype: int
+    """
+    return int((parse_quantity(quantity) * 1000).to_integral_value(ROUND_CEILING)) if quantity else 0
+
+
+def parse_memory(quantity):
+    """
+    :param str quantity:
+    :return: bytes
+    :rtype: int
+    """
+    return int(parse_quantity(quantity).to_integral_value(ROUND_CEILING)) if quantity else 0
+
+
+class ClusterCapacitySnapshot(object):
+    def __init__(self):
+        """
+        The allocatable resources of the schedulable nodes and the requests of the pods that run on them, kept up
+        to date with node and pod events
+        """
+        self._lock = threading.Lock()
+        # node name to its allocatable (millicores, bytes), None for nodes the apps can't be scheduled on
+        self._nodes = {}
+        # pod uid to its node name and requested (millicores, bytes)
+        self._pods = {}
+        self.nodes_synced = False
+        self.pods_synced = False
+        self.last_used = time.time()
+
+    @property
+    def synced(self):
+        return self.nodes_synced and self.pods_synced
+
+    def reset_nodes(self, nodes):
+        """
+        :param list[V1Node] nodes:
+        """
+        with self._lock:
+            self._nodes = {}
+            for node in nodes:
+                self._nodes[node.metadata.name] = self._get_allocatable(node)
+            self.nodes_synced = True
+
+    def reset_pods(self, pods):
+        """
+        :param list[V1Pod] pods:
+        """
+        with self._lock:
+            self._pods = {}
+            for pod in pods:
+                self._apply_pod('ADDED', pod)
+            self.pods_synced = True
+
+    def apply_node(self, event_type, node):
+        """
+        :param str event_type: ADDED, MODIFIED or DELETED
+        :param V1Node node:
+        """
+        with self._lock:
+            if event_type == 'DELETED':
+                self._nodes.pop(node.metadata.name, None)
+            else:
+                self._nodes[node.metadata.name] = self._get_allocatable(node)
+
+    def apply_pod(self, event_type, pod):
+        """
+        :param str event_type: ADDED, MODIFIED or DELETED
+        :param V1Pod pod:
+        """
+        with self._lock:
+            self._apply_pod(event_type, pod)
+
+    def _apply_pod(self, event_type, pod):
+        uid = pod.metadata.uid
+        if event_type == 'DELETED' or not pod.spec.node_name or \
+                (pod.status and pod.status.phase in TERMINAL_POD_PHASES):
+            self._pods.pop(uid, None)
+        else:
+            self._pods[uid] = (pod.spec.node_name,) + self._get_pod_requests(pod)
+
+    def get_free_resources(self):
+        """
+        :return: the schedulable node names to their free (millicores, bytes)
+        :rtype: dict
+        """
+        with self._lock:
+            free = {name: list(allocatable) for name, allocatable in self._nodes.items() if allocatable}
+            for node_name, cpu, memory in self._pods.values():
+                if node_name in free:
+                    free[node_name][0] -= cpu
+                    free[node_name][1] -= memory
+        return {name: tuple(resources) for name, resources in free.items()}
+
+    def count_fitting_replicas(self, cpu, memory):
+        """
+        :param int cpu: millicores requested by a replica
+        :param int memory: bytes requested by a replica
+        :return: how many replicas the free resources of the nodes can hold
+        :rtype: int
+        """
+        fitting = 0
+        for free_cpu, free_memory in self.get_free_resources().values():
+            counts = []
+            if cpu:
+                counts.append(max(0, free_cpu) // cpu)
+            if memory:
+                counts.append(max(0, free_memory) // memory)
+            fitting += min(counts) if counts else 0
+        return fitting
+
+    @staticmethod
+    def _get_allocatable(node):
+        """
+        :param V1Node node:
+        :return: (millicores, bytes), None when the apps can't be scheduled on the node
+        :rtype: tuple
+        """
+        if node.spec and node.spec.unschedulable:
+            return None
+        if node.spec and any(taint.effect in BLOCKING_TAINT_EFFECTS for taint in node.spec.taints or []):
+            return None
+        allocatable = (node.status and node.status.allocatable) or {}
+        return parse_cpu(allocatable.get('cpu')), parse_memory(allocatable.get('memory'))
+
+    @staticmethod
+    def _get_pod_requests(pod):
+        """
+        The scheduler reserves the larger of the sum of the containers and the largest init container
+        :param V1Pod pod:
+        :rtype: tuple
+        """
+        def requests(container):
+            resources = (container.resources and container.resources.requests) or {}
+            return parse_cpu(resources.get('cpu')), parse_memory(resources.get('memory'))
+
+        containers = [requests(container) for container in pod.spec.containers or []]
+        init_containers = [requests(container) for container in pod.spec.init_containers or []]
+        cpu = max([sum(c[0] for c in containers)] + [c[0] for c in init_containers])
+        memory = max([sum(c[1] for c in containers)] + [c[1] for c in init_containers])
+        return cpu, memory
+
+
+class ClusterCapacityService(object):
+    def __init__(self, idle_timeout=600, watch_step=MAX_WATCH_STEP):
+        """
+        Keeps a capacity snapshot per cluster: a list of the nodes and pods, then watches that apply every change,
+        so a deploy checks its compute spec against the free resources without listing the cluster again
+        :param float idle_timeout: seconds without a deploy after which a cluster is no longer watched
+        :param int watch_step: seconds of every watch request, stop waits for the running ones
+        """
+        self.idle_timeout = idle_timeout
+        self.watch_step = watch_step
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        # cluster key to its snapshot
+        self._snapshots = {}
+        # the running watch threads
+        self._threads = set()
+
+    def get_snapshot(self, logger, clients):
+        """
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :rtype: ClusterCapacitySnapshot
+        """
+        key = clients.cluster_key
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot:
+                snapshot.last_used = time.time()
+                return snapshot
+
+        snapshot = ClusterCapacitySnapshot()
+        nodes = clients.core_api.list_node()
+        pods = clients.core_api.list_pod_for_all_namespaces(field_selector=ACTIVE_PODS_FIELD_SELECTOR)
+        snapshot.reset_nodes(nodes.items)
+        snapshot.reset_pods(pods.items)
+
+        with self._lock:
+            if key in self._snapshots:
+                # another command listed the cluster at the same time and already watches it
+                return self._snapshots[key]
+            self._snapshots[key] = snapshot
+
+        self._start_watch(logger, clients, snapshot, 'nodes', clients.core_api.list_node, {},
+                          nodes.metadata.resource_version)
+        self._start_watch(logger, clients, snapshot, 'pods', clients.core_api.list_pod_for_all_namespaces,
+                          {'field_selector': ACTIVE_PODS_FIELD_SELECTOR}, pods.metadata.resource_version)
+        return snapshot
+
+    def check_fits(self, logger, clients, app_name, compute_spec, replicas):
+        """
+        Fails a deploy right away when the free resources of the nodes can't hold its replicas, instead of letting
+        the pods stay Pending until the wait times out
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str app_name:
+        :param AppComputeSpecKubernetes compute_spec:
+        :param int replicas:
+        """
+        if not compute_spec:
+            return
+        # without a request kubernetes uses the limit as the request
+        cpu = parse_cpu(compute_spec.requests.cpu or compute_spec.limits.cpu)
+        memory = parse_memory(compute_spec.requests.ram or compute_spec.limits.ram)
+        if not cpu and not memory:
+            return
+
+        try:
+            snapshot = self.get_snapshot(logger, clients)
+        except Exception:
+            # e.g. no permission to list the pods of all the namespaces, the scheduler still decides
+            logger.warning('Failed to get the capacity of the cluster, skipping the capacity check', exc_info=True)
+            return
+        if not snapshot.synced:
+            logger.info('Capacity snapshot is being refreshed, skipping the capacity check')
+            return
+
+        fitting = snapshot.count_fitting_replicas(cpu, memory)
+        if fitting < replicas:
+            raise ValueError('Not enough free resources in the cluster for app {}: {} of {} replicas requesting '
+                             '{}m cpu and {} bytes of memory fit on the schedulable nodes'
+                             .format(app_name, fitting, replicas, cpu, memory))
+        logger.info('Cluster has room for {} replicas of app {}'.format(fitting, app_name))
+
+    def stop(self):
+        """
+        Ends the watches of all the clusters and waits for their running watch requests
+        """
+        self._stopped.set()
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join()
+
+    def _is_watched(self, key, snapshot):
+        """
+        :return: False once the watches of the snapshot should end, an idle snapshot is dropped
+        :rtype: bool
+        """
+        with self._lock:
+            if self._stopped.is_set() or self._snapshots.get(key) is not snapshot:
+                return False
+            if time.time() - snapshot.last_used > self.idle_timeout:
+                del self._snapshots[key]
+                return False
+            return True
+
+    def _start_watch(self, logger, clients, snapshot, kind, list_function, list_kwargs, resource_version):
+        """
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param ClusterCapacitySnapshot snapshot:
+        :param str kind: nodes or pods
+        :param callable list_function:
+        :param dict list_kwargs:
+        :param str resource_version: the resource version of the list the snapshot was built from
+        """
+        key = clients.cluster_key
+        apply_event = snapshot.apply_node if kind == 'nodes' else snapshot.apply_pod
+        reset = snapshot.reset_nodes if kind == 'nodes' else snapshot.reset_pods
+
+        def mark_synced(synced):
+            if kind == 'nodes':
+                snapshot.nodes_synced = synced
+            else:
+                snapshot.pods_synced = synced
+
+        def watch_changes():
+            current_version = resource_version
+            while self._is_watched(key, snapshot):
+                try:
+                    if current_version is None:
+                        items = list_function(**list_kwargs)
+                        reset(items.items)
+                        current_version = items.metadata.resource_version
+
+                    for event in watch.Watch().stream(list_function, resource_version=current_version,
+                                                      timeout_seconds=self.watch_step, **list_kwargs):
+                        if event['type'] == 'ERROR':
+                            # the resource version expired, list again
+                            current_version = None
+                            mark_synced(False)
+                            break
+                        if self._stopped.is_set():
+                            break
+                        apply_event(event['type'], event['object'])
+                        current_version = event['object'].metadata.resource_version
+                except Exception:
+                    logger.warning('Watch of the {} of the cluster failed'.format(kind), exc_info=True)
+                    current_version = None
+                    mark_synced(False)
+                    self._stopped.wait(WATCH_RETRY_DELAY)
+
+        def run():
+            try:
+                watch_changes()
+            finally:
+                with self._lock:
+                    self._threads.discard(threading.current_thread())
+
+        thread = threading.Thread(target=run, name='capacity-watch-{}'.format(kind))
+        thread.daemon = True
+        with self._lock:
+            if self._stopped.is_set():
+                return
+            self._threads.add(thread)
+        thread.start()
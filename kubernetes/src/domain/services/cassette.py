@@ -0,0 +1,251 @@
+"""
+Record and replay of the kubernetes api traffic.
+
+A cassette is a json lines file, every line is one request/response exchange sent by the kubernetes client.
+RecordingRestClient captures the exchanges of real clients and ReplayRestClient serves them back without a cluster,
+either as fast as possible or with the recorded response times.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+import urllib3
+from kubernetes.client.rest import RESTClientObject, RESTResponse, ApiException
+from six.moves.urllib.parse import urlparse
+
+CASSETTE_DIR_ENV_VARIABLE = 'KUBERNETES_SHELL_CASSETTE_DIR'
+CASSETTE_EXTENSION = '.jsonl'
+
+
+class CassetteMismatchError(ValueError):
+    pass
+
+
+def create_cassette_path(cassette_dir):
+    """
+    :param str cassette_dir:
+    :rtype: str
+    """
+    if not os.path.isdir(cassette_dir):
+        os.makedirs(cassette_dir)
+    # cassette names start with a timestamp so the lexical order is the recording order
+    return os.path.join(cassette_dir, '{timestamp}_{pid}_{unique}{extension}'.format(
+        timestamp=datetime.now().strftime('%Y%m%d-%H%M%S-%f'),
+        pid=os.getpid(),
+        unique=str(uuid.uuid4())[:8],
+        extension=CASSETTE_EXTENSION))
+
+
+def load_cassette(cassette_path):
+    """
+    Loads the exchanges of a cassette file, or of all the cassettes in a folder in recording order
+    :param str cassette_path:
+    :rtype: list[dict]
+    """
+    if os.path.isdir(cassette_path):
+        paths = [os.path.join(cassette_path, name) for name in sorted(os.listdir(cassette_path))
+                 if name.endswith(CASSETTE_EXTENSION)]
+    else:
+        paths = [cassette_path]
+
+    exchanges = []
+    for path in paths:
+        with open(path) as f:
+            exchanges.extend(json.loads(line) for line in f if line.strip())
+    return exchanges
+
+
+def _get_exchange_key(method, url, query_params):
+    """
+    The host is left out so a cassette recorded against one cluster can be replayed with any kubeconfig
+    :rtype: str
+    """
+    query = '&'.join(sorted('{}={}'.format(key, value) for key, value in (query_params or [])))
+    return '{} {}?{}'.format(method.upper(), urlparse(url).path, query)
+
+
+def _to_text(data):
+    if data is None:
+        return None
+    return data.decode('utf8') if isinstance(data, bytes) else data
+
+
+class CassetteWriter(object):
+    def __init__(self, path):
+        """
+        :param str path: the cassette file, exchanges are appended to it
+        """
+        self.path = path
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+
+    def write(self, exchange):
+        """
+        :param dict exchange:
+        """
+        line = json.dumps(exchange, sort_keys=True)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+
+class RecordingRestClient(RESTClientObject):
+    def __init__(self, rest_client, writer):
+        """
+        Sends the requests with the wrapped rest client and writes every exchange to the cassette.
+        The http verb methods are inherited from RESTClientObject and all end up in request().
+        :param RESTClientObject rest_client:
+        :param CassetteWriter writer:
+        """
+        self.rest_client = rest_client
+        self.writer = writer
+
+    def request(self, method, url, query_params=None, headers=None, body=None, post_params=None,
+                _preload_content=True, _request_timeout=None):
+        exchange = {
+            'key': _get_exchange_key(method, url, query_params),
+            'method': method.upper(),
+            'path': urlparse(url).path,
+            'query': [[key, value] for key, value in (query_params or [])],
+            'body': body,
+            'started': time.time() - self.writer.start_time,
+        }
+        start_time = time.time()
+        try:
+            response = self.rest_client.request(method, url, query_params=query_params, headers=headers, body=body,
+                                                post_params=post_params, _preload_content=_preload_content,
+                                                _request_timeout=_request_timeout)
+        except ApiException as e:
+            exchange.update({'duration': time.time() - start_time,
+                             'status': e.status,
+                             'reason': e.reason,
+                             'headers': dict(e.headers or {}),
+                             'data': _to_text(e.body)})
+            self.writer.write(exchange)
+            raise
+
+        exchange.update({'duration': time.time() - start_time,
+                         'status': response.status,
+                         'reason': response.reason,
+                         'headers': dict(response.getheaders() or {})})
+
+        if not _preload_content:
+            # streamed responses (watch) are written once the caller is done reading them
+            return _RecordingStream(response, exchange, self.writer)
+
+        exchange['data'] = _to_text(response.data)
+        self.writer.write(exchange)
+        return response
+
+
+class _RecordingStream(object):
+    def __init__(self, response, exchange, writer):
+        self._response = response
+        self._exchange = exchange
+        self._writer = writer
+        self._start_time = time.time()
+        self._chunks = []
+        self._written = False
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def read_chunked(self, *args, **kwargs):
+        for chunk in self._response.read_chunked(*args, **kwargs):
+            self._chunks.append([time.time() - self._start_time, _to_text(chunk)])
+            yield chunk
+        self._write()
+
+    def close(self):
+        self._write()
+        return self._response.close()
+
+    def _write(self):
+        if self._written:
+            return
+        self._written = True
+        self._exchange['chunks'] = self._chunks
+        self._writer.write(self._exchange)
+
+
+class ReplayRestClient(RESTClientObject):
+    def __init__(self, exchanges, preserve_timing=False):
+        """
+        Serves the recorded exchanges instead of sending requests.
+        Requests are matched by method, path and query, identical requests get the recorded responses in order.
+        :param list[dict] exchanges:
+        :param bool preserve_timing: sleep for the recorded response times (and chunk intervals of streams)
+        """
+        self.preserve_timing = preserve_timing
+        self._exchanges = {}
+        self._lock = threading.Lock()
+        for exchange in exchanges:
+            self._exchanges.setdefault(exchange['key'], deque()).append(exchange)
+
+    @property
+    def remaining(self):
+        """
+        :return: the number of recorded exchanges that were not replayed yet
+        :rtype: int
+        """
+        with self._lock:
+            return sum(len(exchanges) for exchanges in self._exchanges.values())
+
+    def request(self, method, url, query_params=None, headers=None, body=None, post_params=None,
+                _preload_content=True, _request_timeout=None):
+        key = _get_exchange_key(method, url, query_params)
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if not exchanges:
+                raise CassetteMismatchError("No recorded response left for request '{}'".format(key))
+            exchange = exchanges.popleft()
+
+        if self.preserve_timing:
+            time.sleep(exchange['duration'])
+
+        if 'chunks' in exchange:
+            response = _ReplayStream(exchange, self.preserve_timing)
+        else:
+            data = exchange['data']
+            response = RESTResponse(urllib3.HTTPResponse(body=data.encode('utf8') if data is not None else b'',
+                                                         headers=exchange['headers'],
+                                                         status=exchange['status'],
+                                                         reason=exchange['reason'],
+                                                         preload_content=True))
+
+        if not 200 <= exchange['status'] <= 299:
+            raise ApiException(http_resp=response)
+        return response
+
+
+class _ReplayStream(object):
+    def __init__(self, exchange, preserve_timing):
+        self.status = exchange['status']
+        self.reason = exchange['reason']
+        self.headers = exchange['headers']
+        self.data = ''.join(chunk for _, chunk in exchange['chunks'])
+        self._chunks = exchange['chunks']
+        self._preserve_timing = preserve_timing
+
+    def getheaders(self):
+        return self.headers
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def read_chunked(self, *args, **kwargs):
+        start_time = time.time()
+        for offset, chunk in self._chunks:
+            if self._preserve_timing:
+                time.sleep(max(0, offset - (time.time() - start_time)))
+            yield chunk.encode('utf8')
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
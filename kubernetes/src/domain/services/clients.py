@@ -1,7 +1,9 @@
 import os
 from kubernetes import config
-from kubernetes.client import CoreV1Api, AppsV1beta1Api
+from kubernetes.client import ApiClient, CoreV1Api, AppsV1beta1Api, AppsV1Api
 
+from domain.services.cassette import CASSETTE_DIR_ENV_VARIABLE, CassetteWriter, RecordingRestClient, \
+    ReplayRestClient, create_cassette_path, load_cassette
 from model.clients import KubernetesClients
 
 
@@ -18,10 +20,42 @@ class ApiClientsProvider(object):
         # todo - alexaz - Need to add support for urls so that we can download a config file from a central location and
         # todo          - also have the config file password protected.
         api_client = config.new_client_from_config(config_file=kube_clp.config_file_path)
+
+        # recording mode - every command gets its own cassette of the api traffic
+        cassette_dir = os.environ.get(CASSETTE_DIR_ENV_VARIABLE)
+        if cassette_dir:
+            api_client.rest_client = RecordingRestClient(api_client.rest_client,
+                                                         CassetteWriter(create_cassette_path(cassette_dir)))
+
+        core_api = CoreV1Api(api_client=api_client)
+        apps_api = AppsV1beta1Api(api_client=api_client)
+        apps_v1_api = AppsV1Api(api_client=api_client)
+
+        return KubernetesClients(api_client, core_api, apps_api, apps_v1_api)
+
+
+class ReplayApiClientsProvider(object):
+
+    def __init__(self, cassette_path, preserve_timing=False):
+        """
+        Serves the api traffic recorded in a cassette file (or a folder of cassettes) instead of a cluster
+        :param str cassette_path:
+        :param bool preserve_timing: replay with the recorded response times
+        """
+        self.rest_client = ReplayRestClient(load_cassette(cassette_path), preserve_timing)
+
+    def get_api_clients(self, kube_clp):
+        """
+        :param data_model.Kubernetes kube_clp:
+        :rtype: KubernetesClients
+        """
+        api_client = ApiClient()
+        api_client.rest_client = self.rest_client
         core_api = CoreV1Api(api_client=api_client)
         apps_api = AppsV1beta1Api(api_client=api_client)
+        apps_v1_api = AppsV1Api(api_client=api_client)
 
-        return KubernetesClients(api_client, core_api, apps_api)
+        return KubernetesClients(api_client, core_api, apps_api, apps_v1_api)
 
 
 # class ConfigBuilderBase(object):
@@ -1,13 +1,22 @@
 import time
+from datetime import datetime
 from logging import Logger
 from multiprocessing import TimeoutError
 
 from typing import List, Dict
 
+from kubernetes import watch
 from kubernetes.client import V1ObjectMeta, AppsV1beta1Deployment, AppsV1beta1Api, AppsV1beta1DeploymentSpec, \
-    V1PodTemplateSpec, V1PodSpec, V1Container, V1ContainerPort, V1EnvVar, V1DeleteOptions
+    V1PodTemplateSpec, V1PodSpec, V1Container, V1ContainerPort, V1EnvVar, V1DeleteOptions, V1Affinity, \
+    V1NodeAffinity, V1PreferredSchedulingTerm, V1NodeSelectorTerm, V1NodeSelectorRequirement
 from kubernetes.client.rest import ApiException
+from cloudshell.shell.core.driver_context import CancellationContext
 
+from domain.common.cancellation import raise_if_cancelled, sleep_with_cancellation, MAX_WATCH_STEP
+from domain.common.polling import PollingScheduler, CoalescedLister
+from domain.common.single_flight import SingleFlight
+from domain.services.pod_diagnostics import PodDiagnosticsService, PodsDiagnosis
+from domain.services.rollout_status import RolloutStatusEvaluator, RolloutStatus
 from domain.services.tags import TagsService
 from model.deployment_requests import AppComputeSpecKubernetes, AppComputeSpecKubernetesResources, \
     AppDeploymentRequest, ApplicationImage
@@ -15,8 +24,19 @@ from model.clients import KubernetesClients
 
 
 class KubernetesDeploymentService:
-    def __init__(self):
-        pass
+    def __init__(self, pod_diagnostics_service=None, polling_scheduler=None, rollout_status_evaluator=None):
+        """
+        :param PodDiagnosticsService pod_diagnostics_service:
+        :param PollingScheduler polling_scheduler: shared by the wait loops
+        :param RolloutStatusEvaluator rollout_status_evaluator:
+        """
+        self.pod_diagnostics_service = pod_diagnostics_service or PodDiagnosticsService()
+        self.polling_scheduler = polling_scheduler or PollingScheduler()
+        self.rollout_status_evaluator = rollout_status_evaluator or RolloutStatusEvaluator()
+        # concurrent waiters of the same namespace share the list calls of deployments and pods
+        self._namespace_lister = CoalescedLister()
+        # concurrent commands send identical deployment reads
+        self._single_flight = SingleFlight()
 
     def delete_app(self, logger, clients, namespace, app_name_to_delete):
         """
@@ -59,7 +79,11 @@ class KubernetesDeploymentService:
         # self.set_apps_info([name], annotations)
         # self.set_apps_debugging_protocols([app_request], annotations)
 
-        meta = V1ObjectMeta(name=name)
+        deployment_annotations = {TagsService.REPLICAS: str(app.replicas),
+                                  TagsService.WAIT_FOR_REPLICAS: str(app.wait_for_replicas)}
+        if app.depends_on:
+            deployment_annotations[TagsService.DEPENDS_ON] = ','.join(app.depends_on)
+        meta = V1ObjectMeta(name=name, annotations=deployment_annotations)
 
         template_meta = V1ObjectMeta(labels=labels, annotations=annotations)
 
@@ -71,7 +95,7 @@ class KubernetesDeploymentService:
                                                 internal_ports=app.internal_ports,
                                                 external_ports=app.external_ports)
 
-        pod_spec = V1PodSpec(containers=[container])
+        pod_spec = V1PodSpec(containers=[container], affinity=self._prepare_node_affinity(app.preferred_node))
         app_template = V1PodTemplateSpec(metadata=template_meta, spec=pod_spec)
         app_spec = AppsV1beta1DeploymentSpec(replicas=app.replicas, template=app_template)
         deployment = AppsV1beta1Deployment(metadata=meta, spec=app_spec)
@@ -80,9 +104,10 @@ class KubernetesDeploymentService:
         logger.debug("Creating namespaced deployment with the following specs:")
         logger.debug(deployment.to_str())
 
-        return clients.apps_api.create_namespaced_deployment(namespace=namespace,
-                                                             body=deployment,
-                                                             pretty='true')
+        created_deployment = clients.apps_api.create_namespaced_deployment(namespace=namespace,
+                                                                           body=deployment,
+                                                                           pretty='true')
+        return created_deployment
 
     @staticmethod
     def _prepare_app_container(name, image, start_command, environment_variables, compute_spec, internal_ports,
@@ -125,16 +150,19 @@ class KubernetesDeploymentService:
             command = ['/bin/bash', '-c', '--']
             args = [start_command]  # ["while true; do sleep 30; done;"]  # run a task that will never finish
 
-        if image.tag == 'latest' or image.tag == '':
-            full_image_name = image.name
-        else:
-            full_image_name = "{name}:{tag}".format(name=image.name, tag=image.tag)
+        full_image_name = KubernetesDeploymentService.get_full_image_name(image)
+        image_pull_policy = None
+        if image.digest:
+            # a pinned image doesn't change, the nodes that already have it don't pull it again
+            full_image_name = '{}@{}'.format(full_image_name.split('@')[0], image.digest)
+            image_pull_policy = 'IfNotPresent'
 
         if compute_spec:
-            resources = KubernetesDeploymentService._prepare_resource_request(compute_spec)
+            resources = KubernetesDeploymentService.prepare_resource_request(compute_spec)
 
             return V1Container(name=name,
                                image=full_image_name,
+                               image_pull_policy=image_pull_policy,
                                resources=resources,
                                command=command,
                                args=args,
@@ -143,13 +171,37 @@ class KubernetesDeploymentService:
         else:
             return V1Container(name=name,
                                image=full_image_name,
+                               image_pull_policy=image_pull_policy,
                                command=command,
                                args=args,
                                ports=container_ports,
                                env=env_list)
 
     @staticmethod
-    def _prepare_resource_request(compute_spec):
+    def get_full_image_name(image):
+        """
+        :param ApplicationImage image:
+        :rtype: str
+        """
+        if image.tag == 'latest' or image.tag == '':
+            return image.name
+        return "{name}:{tag}".format(name=image.name, tag=image.tag)
+
+    @staticmethod
+    def _prepare_node_affinity(preferred_node):
+        """
+        :param str preferred_node: the hostname label of the node
+        :rtype: V1Affinity
+        """
+        if not preferred_node:
+            return None
+        # the preferred node affinity of older schedulers evaluates only the expressions on the node labels
+        requirement = V1NodeSelectorRequirement(key=TagsService.HOSTNAME_LABEL, operator='In', values=[preferred_node])
+        term = V1PreferredSchedulingTerm(weight=100, preference=V1NodeSelectorTerm(match_expressions=[requirement]))
+        return V1Affinity(node_affinity=V1NodeAffinity(preferred_during_scheduling_ignored_during_execution=[term]))
+
+    @staticmethod
+    def prepare_resource_request(compute_spec):
         resources = {}
 
         if compute_spec.requests.cpu or compute_spec.requests.ram:
@@ -168,70 +220,360 @@ class KubernetesDeploymentService:
 
         return resources if resources else None
 
+    def restart_app(self, logger, clients, namespace, app_name):
+        """
+        Starts a rolling restart of the app by changing an annotation of its pod template, the deployment replaces
+        the pods according to its rolling update strategy and keeps serving while it does
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str namespace:
+        :param str app_name:
+        :return: the patched deployment, its generation is the generation of the restart
+        :rtype: AppsV1beta1Deployment
+        """
+        restarted_at = datetime.utcnow().isoformat() + 'Z'
+        body = {'spec': {'template': {'metadata': {'annotations': {TagsService.RESTARTED_AT: restarted_at}}}}}
+        deployment = clients.apps_api.patch_namespaced_deployment(name=app_name, namespace=namespace, body=body)
+        logger.info('Restarting deploy/{} in ns/{} (generation {})'.format(app_name, namespace,
+                                                                             deployment.metadata.generation))
+        return deployment
+
     def wait_until_all_replicas_ready(self, logger, clients, namespace, app_name, deployed_app_name,
-                                      delay=10, timeout=120):
+                                      delay=None, timeout=120, cancellation_context=None, scale_up_timeout=600,
+                                      generation=None):
         """
+        Waits for the replicas and fails as soon as the pods can't become ready (bad image, crash loop, a node the
+        cluster autoscaler can't add). While the cluster autoscaler adds a node for pending pods the wait is extended
+        up to scale_up_timeout seconds beyond the timeout.
+        The replicas are ready once the rollout completed like 'kubectl rollout status' reports it: the controller
+        observed the latest spec, all the replicas are updated and available and the old replicas are gone.
         :param Logger logger:
         :param KubernetesClients clients:
         :param str namespace:
         :param str app_name:
         :param str deployed_app_name:
-        :param int delay:
+        :param float delay: the longest time between polls, the max delay of the polling scheduler by default
         :param int timeout:
+        :param CancellationContext cancellation_context: interrupts the wait when the command is cancelled
+        :param int scale_up_timeout:
+        :param int generation: the rollout of at least this generation must complete (e.g. the generation of a
+        restart), the latest generation of the deployment by default
         :return:
         """
+        cancelled_message = 'Cancelled while waiting for the replicas of deployed app {} to be ready'\
+            .format(deployed_app_name)
         start_time = time.time()
+        # every poll needs a list call that started after the previous poll of this wait returned
+        not_before = start_time
+        backoff = self.polling_scheduler.create_backoff(delay)
+        extension_logged = False
         while True:
-            deployment = self.get_deployment_by_name(clients, namespace, app_name)
+            raise_if_cancelled(cancellation_context, cancelled_message)
+            deployment = self._get_polled_deployment(clients, namespace, app_name, not_before)
 
             if not deployment:
                 raise ValueError('Something went wrong. Deployment {} not found.')
 
-            # check if all replicas are ready
-            if deployment.spec.replicas == deployment.status.ready_replicas:
+            rollout_status = self._evaluate_rollout(deployed_app_name, deployment, generation)
+            if rollout_status.done:
                 # all replicas are ready - success
                 return
 
-            if time.time() - start_time >= timeout:
-                try:
-                    query_selector = self._prepare_deployment_default_label_selector(app_name)
-                    pods = clients.core_api.list_namespaced_pod(namespace=namespace, label_selector=query_selector).items
-                    logger.error("Deployment dump:")
-                    logger.error(str(deployment))
-                    logger.error("Pods dump:")
-                    logger.error(str(pods))
-                except:
-                    logger.exception("Failed to get more data about pods and deployment for deployed app {}"
-                                     .format(deployed_app_name))
+            diagnosis = self._diagnose_pods_safely(logger, clients, namespace, app_name, not_before)
+            not_before = time.time()
+            if diagnosis.failure:
+                raise ValueError('Replicas of deployed app {} cannot become ready: {}'
+                                 .format(deployed_app_name, diagnosis.failure))
+
+            elapsed = time.time() - start_time
+            if elapsed >= timeout:
+                if diagnosis.scaling_up and elapsed < timeout + scale_up_timeout:
+                    if not extension_logged:
+                        logger.info('Cluster autoscaler is adding nodes for deployed app {}, extending the wait'
+                                    .format(deployed_app_name))
+                        extension_logged = True
+                else:
+                    logger.error('Replicas of deployed app {} are not ready: {}'
+                                 .format(deployed_app_name, diagnosis.summary or 'no pod diagnosis'))
+                    logger.debug('Deployment dump: {}'.format(deployment))
+
+                    message = 'Timeout waiting for {} replicas to be ready for deployed app {} ({} ready)'\
+                        .format(deployment.spec.replicas, deployed_app_name, deployment.status.ready_replicas or 0)
+                    details = diagnosis.summary or rollout_status.message
+                    if details:
+                        message = '{}: {}'.format(message, details)
+                    raise TimeoutError(message)
+
+            sleep_with_cancellation(backoff.next_delay(), cancellation_context, cancelled_message)
+
+    def watch_until_all_replicas_ready(self, logger, clients, namespace, app_name, deployed_app_name, timeout=120,
+                                       cancellation_context=None, generation=None):
+        """
+        Same readiness as wait_until_all_replicas_ready for a single app that waits alone, e.g. right after its
+        deployment: the deployment is watched and the wait returns with the status change that completes the
+        rollout instead of on the next poll. The pods are diagnosed whenever a watch step passes without a change.
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str namespace:
+        :param str app_name:
+        :param str deployed_app_name:
+        :param int timeout:
+        :param CancellationContext cancellation_context:
+        :param int generation: the rollout of at least this generation must complete
+        :return: the rolled out deployment
+        :rtype: AppsV1beta1Deployment
+        """
+        cancelled_message = 'Cancelled while waiting for the replicas of deployed app {} to be ready'\
+            .format(deployed_app_name)
+        field_selector = 'metadata.name={}'.format(app_name)
+        end_time = time.time() + timeout
+        resource_version = None
+        deployment = None
+        diagnosis = PodsDiagnosis()
+
+        while True:
+            raise_if_cancelled(cancellation_context, cancelled_message)
+
+            if resource_version is None:
+                deployment_list = clients.apps_api.list_namespaced_deployment(namespace=namespace,
+                                                                              field_selector=field_selector)
+                if not deployment_list.items:
+                    raise ValueError('Something went wrong. Deployment {} not found.'.format(app_name))
+                deployment = deployment_list.items[0]
+                resource_version = deployment_list.metadata.resource_version
+
+            rollout_status = self._evaluate_rollout(deployed_app_name, deployment, generation)
+            if rollout_status.done:
+                return deployment
+
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                message = 'Timeout waiting for {} replicas to be ready for deployed app {} ({} ready)'\
+                    .format(deployment.spec.replicas, deployed_app_name, deployment.status.ready_replicas or 0)
+                raise TimeoutError('{}: {}'.format(message, diagnosis.summary or rollout_status.message))
+
+            changed = False
+            for event in watch.Watch().stream(clients.apps_api.list_namespaced_deployment,
+                                              namespace=namespace,
+                                              field_selector=field_selector,
+                                              resource_version=resource_version,
+                                              timeout_seconds=max(1, int(min(remaining, MAX_WATCH_STEP)))):
+                if event['type'] == 'ERROR':
+                    # the resource version expired, list again
+                    resource_version = None
+                    break
+                if event['type'] == 'DELETED':
+                    raise ValueError('Deployment {} was deleted in ns/{}'.format(app_name, namespace))
+
+                deployment = event['object']
+                resource_version = deployment.metadata.resource_version
+                changed = True
+                if self._evaluate_rollout(deployed_app_name, deployment, generation).done:
+                    return deployment
+
+            if not changed:
+                diagnosis = self._diagnose_pods_safely(logger, clients, namespace, app_name, time.time())
+                if diagnosis.failure:
+                    raise ValueError('Replicas of deployed app {} cannot become ready: {}'
+                                     .format(deployed_app_name, diagnosis.failure))
+
+    def scale_app(self, logger, clients, namespace, app_name, replicas):
+        """
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str namespace:
+        :param str app_name:
+        :param int replicas:
+        :return: the patched deployment, its generation is the generation of the scale
+        :rtype: AppsV1beta1Deployment
+        """
+        deployment = clients.apps_api.patch_namespaced_deployment(name=app_name,
+                                                                  namespace=namespace,
+                                                                  body={'spec': {'replicas': replicas}})
+        logger.info('Scaled deploy/{} in ns/{} to {} replicas'.format(app_name, namespace, replicas))
+        return deployment
 
-                raise TimeoutError('Timeout waiting for {} replicas to be ready for deployed app {}. '
-                                   'Please look at the logs for more information'
-                                   .format(deployment.status.replicas, deployed_app_name))
+    def watch_until_apps_ready(self, logger, clients, namespace, label_selector, apps, cancellation_context=None):
+        """
+        Waits for the rollout of several apps of a namespace with a single watch of their deployments, instead of a
+        wait loop per app
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str namespace:
+        :param str label_selector: selects the deployments of the apps, e.g. the sandbox label
+        :param Dict[str, tuple] apps: the name of every app to its generation and its timeout in seconds
+        :param CancellationContext cancellation_context:
+        :return: the name of every app to the seconds it took to be ready
+        :rtype: Dict[str, float]
+        """
+        cancelled_message = 'Cancelled while waiting for the replicas of apps {} to be ready'\
+            .format(', '.join(sorted(apps)))
+        start_time = time.time()
+        pending = dict(apps)
+        ready_times = {}
+        resource_version = None
+
+        def evaluate(deployment):
+            name = deployment.metadata.name
+            if name in pending and self._evaluate_rollout(name, deployment, pending[name][0]).done:
+                del pending[name]
+                ready_times[name] = time.time() - start_time
+
+        while pending:
+            raise_if_cancelled(cancellation_context, cancelled_message)
+
+            if resource_version is None:
+                deployment_list = clients.apps_api.list_namespaced_deployment(namespace=namespace,
+                                                                              label_selector=label_selector)
+                missing = set(pending) - set(deployment.metadata.name for deployment in deployment_list.items)
+                if missing:
+                    raise ValueError('Something went wrong. Deployments {} not found.'
+                                     .format(', '.join(sorted(missing))))
+                for deployment in deployment_list.items:
+                    evaluate(deployment)
+                resource_version = deployment_list.metadata.resource_version
+                continue
+
+            elapsed = time.time() - start_time
+            timed_out = sorted(name for name, (_, timeout) in pending.items() if elapsed >= timeout)
+            if timed_out:
+                raise TimeoutError('Timeout waiting for the replicas of apps {} to be ready'
+                                   .format(', '.join(timed_out)))
+
+            remaining = min(timeout for _, timeout in pending.values()) - elapsed
+            changed = False
+            for event in watch.Watch().stream(clients.apps_api.list_namespaced_deployment,
+                                              namespace=namespace,
+                                              label_selector=label_selector,
+                                              resource_version=resource_version,
+                                              timeout_seconds=max(1, int(min(remaining, MAX_WATCH_STEP)))):
+                if event['type'] == 'ERROR':
+                    # the resource version expired, list again
+                    resource_version = None
+                    break
+
+                deployment = event['object']
+                resource_version = deployment.metadata.resource_version
+                if event['type'] == 'DELETED' and deployment.metadata.name in pending:
+                    raise ValueError('Deployment {} was deleted in ns/{}'.format(deployment.metadata.name, namespace))
+                changed = True
+                evaluate(deployment)
+                if not pending:
+                    break
+
+            if pending and not changed:
+                for name in sorted(pending):
+                    diagnosis = self._diagnose_pods_safely(logger, clients, namespace, name, time.time())
+                    if diagnosis.failure:
+                        raise ValueError('Replicas of app {} cannot become ready: {}'.format(name, diagnosis.failure))
+
+        return ready_times
+
+    def _evaluate_rollout(self, deployed_app_name, deployment, generation):
+        """
+        :param str deployed_app_name:
+        :param AppsV1beta1Deployment deployment:
+        :param int generation:
+        :rtype: RolloutStatus
+        """
+        rollout_status = self.rollout_status_evaluator.evaluate(deployment, generation)
+        if rollout_status.failure:
+            raise ValueError('Replicas of deployed app {} cannot become ready: {}'
+                             .format(deployed_app_name, rollout_status.failure))
+        return rollout_status
 
-            time.sleep(delay)
+    def _diagnose_pods_safely(self, logger, clients, namespace, app_name, not_before):
+        """
+        The diagnosis only speeds up failures, the wait goes on without it when the pods or events can't be read
+        :rtype: PodsDiagnosis
+        """
+        try:
+            pods = self._list_polled_objects(clients, 'pods', namespace, not_before)
+            return self.pod_diagnostics_service.diagnose(clients, namespace,
+                                                         self._prepare_deployment_default_label_selector(app_name),
+                                                         pods=self._filter_app_objects(pods, app_name))
+        except Exception:
+            logger.warning('Failed to diagnose the pods of app {} in ns/{}'.format(app_name, namespace),
+                           exc_info=True)
+            return PodsDiagnosis()
+
+    def _get_polled_deployment(self, clients, namespace, app_name, not_before):
+        """
+        Same as get_deployment_by_name but the deployments of the namespace are listed once for all the concurrent
+        waiters
+        :param KubernetesClients clients:
+        :param str namespace:
+        :param str app_name:
+        :param float not_before: list calls that started before are not used
+        :rtype: AppsV1beta1Deployment
+        """
+        deployments = self._list_polled_objects(clients, 'deployments', namespace, not_before)
+        items = self._filter_app_objects(deployments, app_name)
+        if not items:
+            return None
+        if len(items) > 1:
+            raise ValueError("More than a one deployment found with the same app name {}".format(app_name))
+        return items[0]
 
-    def wait_until_exists(self, logger, clients, namespace, app_name, delay=10, timeout=600):
+    def _list_polled_objects(self, clients, kind, namespace, not_before):
+        """
+        :param KubernetesClients clients:
+        :param str kind: 'deployments' or 'pods'
+        :param str namespace:
+        :param float not_before:
+        :rtype: list
+        """
+        if kind == 'deployments':
+            list_method = clients.apps_api.list_namespaced_deployment
+        else:
+            list_method = clients.core_api.list_namespaced_pod
+
+        def fetch():
+            start_time = time.time()
+            items = list_method(namespace=namespace).items
+            self.polling_scheduler.record_latency(time.time() - start_time)
+            return items
+
+        # the lists are shared between the commands that talk to the same cluster
+        key = (clients.cluster_key, kind, namespace)
+        return self._namespace_lister.list(key, fetch, not_before)
+
+    def _filter_app_objects(self, objects, app_name):
+        """
+        :param list objects: deployments or pods
+        :param str app_name:
+        :rtype: list
+        """
+        selector = TagsService.get_default_selector(app_name)
+        return [obj for obj in objects if (obj.metadata.labels or {}).get(selector) == app_name]
+
+    def wait_until_exists(self, logger, clients, namespace, app_name, delay=None, timeout=600,
+                          cancellation_context=None):
         """
         Waits until the deployment called 'app_name' exists in Kubernetes regardless of state
-        :param int delay: the time in seconds between each pull
+        :param float delay: the longest time in seconds between polls, the scheduler max delay by default
         :param int timeout: timeout in seconds until time out exception will raised
         :param Logger logger:
         :param KubernetesClients clients:
         :param str namespace:
         :param str app_name:
+        :param CancellationContext cancellation_context: interrupts the wait when the command is cancelled
         """
-        query_selector = self._prepare_deployment_default_label_selector(app_name)
+        cancelled_message = 'Cancelled while waiting for deployment {} to be deleted'.format(app_name)
 
         start_time = time.time()
+        not_before = start_time
+        backoff = self.polling_scheduler.create_backoff(delay)
 
         while True:
-            result = \
-                clients.apps_api.list_namespaced_deployment(namespace=namespace, label_selector=query_selector).items
-            if not result:
+            raise_if_cancelled(cancellation_context, cancelled_message)
+            deployments = self._list_polled_objects(clients, 'deployments', namespace, not_before)
+            not_before = time.time()
+            if not self._filter_app_objects(deployments, app_name):
                 return
             if time.time() - start_time >= timeout:
                 raise TimeoutError('Timeout: Waiting for deployment {} to be deleted'.format(app_name))
-            time.sleep(delay)
+            sleep_with_cancellation(backoff.next_delay(), cancellation_context, cancelled_message)
 
     def _prepare_deployment_default_label_selector(self, app_name):
         query_selector = "{app_selector}=={app_name}".format(
@@ -262,7 +604,10 @@ class KubernetesDeploymentService:
         :rtype: AppsV1beta1Deployment
         """
         query_selector = self._prepare_deployment_default_label_selector(app_name)
-        items = clients.apps_api.list_namespaced_deployment(namespace=namespace, label_selector=query_selector).items
+        items = self._single_flight.do(
+            (clients.cluster_key, 'list_namespaced_deployment', namespace, query_selector),
+            lambda: clients.apps_api.list_namespaced_deployment(namespace=namespace,
+                                                                label_selector=query_selector).items)
         if not items:
             return None
         if len(items) > 1:
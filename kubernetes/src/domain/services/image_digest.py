@@ -0,0 +1,145 @@
+import json
+import re
+import threading
+import time
+from logging import Logger
+
+import certifi
+import urllib3
+from six.moves.urllib.parse import urlencode
+
+from domain.common.single_flight import SingleFlight
+
+DOCKER_HUB_REGISTRY = 'registry-1.docker.io'
+DEFAULT_DIGEST_TTL = 300
+REGISTRY_TIMEOUT = 10
+
+# manifest lists first, so a multi-arch tag is pinned to the list and every node pulls its own platform
+MANIFEST_MEDIA_TYPES = ', '.join(['application/vnd.docker.distribution.manifest.list.v2+json',
+                                  'application/vnd.oci.image.index.v1+json',
+                                  'application/vnd.docker.distribution.manifest.v2+json',
+                                  'application/vnd.oci.image.manifest.v1+json'])
+
+
+def parse_image_reference(full_image_name):
+    """
+    :param str full_image_name: e.g. 'nginx:1.15' or 'registry.example.com:5000/team/app'
+    :return: the registry host, the repository and the tag
+    :rtype: tuple
+    """
+    name, tag = full_image_name, 'latest'
+    last_component = name.rsplit('/', 1)[-1]
+    if ':' in last_component:
+        name, tag = name.rsplit(':', 1)
+
+    components = name.split('/', 1)
+    if len(components) == 2 and ('.' in components[0] or ':' in components[0] or components[0] == 'localhost'):
+        registry, repository = components
+    else:
+        registry, repository = DOCKER_HUB_REGISTRY, name
+    if registry in ('docker.io', 'index.docker.io'):
+        registry = DOCKER_HUB_REGISTRY
+    if registry == DOCKER_HUB_REGISTRY and '/' not in repository:
+        repository = 'library/' + repository
+    return registry, repository, tag
+
+
+class ImageDigestResolver(object):
+    def __init__(self, ttl=DEFAULT_DIGEST_TTL, http=None):
+        """
+        Resolves image tags to the digests of their manifests with HEAD requests to the registry v2 api, so the
+        apps can be pinned to a digest and pulled only when a node doesn't have the image yet. The digests are
+        cached for ttl seconds, a tag that moved is picked up by the deploys after that.
+        :param float ttl: seconds a resolved digest is used without asking the registry again
+        :param urllib3.PoolManager http: verifies the certificates of the registries by default
+        """
+        self.ttl = ttl
+        # urllib3 1.x doesn't verify certificates unless asked to, a forged manifest would pin any digest
+        self.http = http or urllib3.PoolManager(cert_reqs='CERT_REQUIRED', ca_certs=certifi.where())
+        self._lock = threading.Lock()
+        # full image name to the digest and the time it expires
+        self._cache = {}
+        # concurrent deploys of the same tag send one lookup
+        self._single_flight = SingleFlight()
+
+    def resolve(self, logger, full_image_name):
+        """
+        :param Logger logger:
+        :param str full_image_name: the image of the container, e.g. 'nginx:1.15'
+        :return: the digest, e.g. 'sha256:...', None when the registry didn't return it
+        :rtype: str
+        """
+        if '@' in full_image_name:
+            return full_image_name.split('@', 1)[1]
+
+        with self._lock:
+            cached = self._cache.get(full_image_name)
+            if cached and cached[1] > time.time():
+                return cached[0]
+
+        try:
+            digest = self._single_flight.do(full_image_name, lambda: self._fetch_digest(full_image_name))
+        except Exception:
+            # the app is still deployed with the tag, only the node image cache is missed
+            logger.warning('Failed to resolve the digest of image {}'.format(full_image_name), exc_info=True)
+            return None
+
+        if not digest:
+            logger.warning('Registry returned no digest for image {}'.format(full_image_name))
+            return None
+
+        logger.info('Resolved image {} to {}'.format(full_image_name, digest))
+        with self._lock:
+            self._cache[full_image_name] = (digest, time.time() + self.ttl)
+        return digest
+
+    def _fetch_digest(self, full_image_name):
+        """
+        :param str full_image_name:
+        :rtype: str
+        """
+        registry, repository, tag = parse_image_reference(full_image_name)
+        # plain http is only used for a registry on the execution server itself
+        scheme = 'http' if registry.split(':')[0] in ('localhost', '127.0.0.1') else 'https'
+        url = '{}://{}/v2/{}/manifests/{}'.format(scheme, registry, repository, tag)
+        headers = {'Accept': MANIFEST_MEDIA_TYPES}
+
+        response = self._head(url, headers)
+        if response.status == 401:
+            # registries like docker hub hand out anonymous pull tokens
+            token = self._get_token(response.headers.get('WWW-Authenticate') or '')
+            if token:
+                headers['Authorization'] = 'Bearer {}'.format(token)
+                response = self._head(url, headers)
+
+        if response.status != 200:
+            raise ValueError('Registry returned {} for {}'.format(response.status, url))
+        return response.headers.get('Docker-Content-Digest')
+
+    def _head(self, url, headers):
+        """
+        :param str url:
+        :param dict headers:
+        :rtype: urllib3.HTTPResponse
+        """
+        return self.http.request('HEAD', url, headers=headers, timeout=REGISTRY_TIMEOUT, retries=False)
+
+    def _get_token(self, authenticate_header):
+        """
+        :param str authenticate_header: e.g. Bearer realm="https://auth.docker.io/token",service="registry.docker.io"
+        :return: an anonymous token, None when the registry doesn't use bearer tokens
+        :rtype: str
+        """
+        if not authenticate_header.lower().startswith('bearer '):
+            return None
+        challenge = dict(re.findall(r'(\w+)="([^"]*)"', authenticate_header))
+        realm = challenge.pop('realm', None)
+        if not realm:
+            return None
+
+        response = self.http.request('GET', '{}?{}'.format(realm, urlencode(sorted(challenge.items()))),
+                                     timeout=REGISTRY_TIMEOUT, retries=False)
+        if response.status != 200:
+            return None
+        body = json.loads(response.data.decode('utf8'))
+        return body.get('token') or body.get('access_token')
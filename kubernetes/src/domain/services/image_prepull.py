@@ -0,0 +1,242 @@
+import json
+import threading
+from logging import Logger
+
+from kubernetes.client import V1DaemonSet, V1DaemonSetSpec, V1LabelSelector, V1PodTemplateSpec, V1PodSpec, \
+    V1Container, V1ObjectMeta, V1Namespace, V1Toleration, V1Volume, V1VolumeMount, V1EmptyDirVolumeSource, \
+    V1ConfigMap
+from kubernetes.client.rest import ApiException
+
+from domain.services.tags import TagsService
+from model.clients import KubernetesClients
+
+PREPULL_NAMESPACE = 'cloudshell-image-prepull'
+PREPULL_DAEMON_SET = 'cloudshell-image-prepull'
+IMAGE_COUNTS_CONFIG_MAP = 'cloudshell-image-counts'
+IMAGE_COUNTS_KEY = 'counts'
+# the least deployed images are dropped, a config map holds up to 1MB
+MAX_COUNTED_IMAGES = 500
+CONFLICT_RETRIES = 5
+# a statically linked busybox, its binary runs in any image of the same platform, including distroless ones
+SLEEP_BINARY_IMAGE = 'busybox:1.31'
+SLEEP_BINARY_DIR = '/cloudshell-prepull'
+
+
+def ensure_namespace(clients, namespace):
+    """
+    :param KubernetesClients clients:
+    :param str namespace:
+    """
+    try:
+        clients.core_api.create_namespace(body=V1Namespace(metadata=V1ObjectMeta(name=namespace)))
+    except ApiException as e:
+        if e.status != 409:
+            raise
+
+
+class ImageFrequencyIndex(object):
+    def __init__(self, namespace=PREPULL_NAMESPACE):
+        """
+        Counts the deployments of every image in a config map of the cluster, so the drivers of all the execution
+        servers add to the same counts and the counts survive their restarts
+        :param str namespace: the namespace of the config map
+        """
+        self.namespace = namespace
+
+    def record(self, clients, full_image_name):
+        """
+        Adds a deployment of the image, concurrent records retry on the conflict of the resource version
+        :param KubernetesClients clients:
+        :param str full_image_name:
+        """
+        for _ in range(CONFLICT_RETRIES):
+            config_map = self._read_config_map(clients)
+            counts = self._get_counts(config_map)
+            counts[full_image_name] = counts.get(full_image_name, 0) + 1
+            if len(counts) > MAX_COUNTED_IMAGES:
+                counts = dict(sorted(counts.items(), key=lambda item: -item[1])[:MAX_COUNTED_IMAGES])
+            data = {IMAGE_COUNTS_KEY: json.dumps(counts, sort_keys=True)}
+            try:
+                if config_map:
+                    config_map.data = data
+                    clients.core_api.replace_namespaced_config_map(name=IMAGE_COUNTS_CONFIG_MAP,
+                                                                   namespace=self.namespace, body=config_map)
+                else:
+                    ensure_namespace(clients, self.namespace)
+                    clients.core_api.create_namespaced_config_map(
+                        namespace=self.namespace,
+                        body=V1ConfigMap(metadata=V1ObjectMeta(name=IMAGE_COUNTS_CONFIG_MAP), data=data))
+                return
+            except ApiException as e:
+                if e.status != 409:
+                    raise
+        raise ValueError('Image counts were modified concurrently {} times'.format(CONFLICT_RETRIES))
+
+    def top(self, clients, count):
+        """
+        :param KubernetesClients clients:
+        :param int count:
+        :return: the most deployed images of the cluster, the most deployed first
+        :rtype: list[str]
+        """
+        counts = self._get_counts(self._read_config_map(clients))
+        images = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return [image for image, _ in images[:count]]
+
+    def _read_config_map(self, clients):
+        """
+        :param KubernetesClients clients:
+        :rtype: V1ConfigMap
+        """
+        try:
+            return clients.core_api.read_namespaced_config_map(name=IMAGE_COUNTS_CONFIG_MAP, namespace=self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+
+    @staticmethod
+    def _get_counts(config_map):
+        """
+        :param V1ConfigMap config_map:
+        :rtype: dict
+        """
+        try:
+            return dict(json.loads((config_map.data or {}).get(IMAGE_COUNTS_KEY) or '{}')) if config_map else {}
+        except (ValueError, TypeError):
+            return {}
+
+
+class ImagePrePullService(object):
+    def __init__(self, frequency_index, namespace=PREPULL_NAMESPACE, sleep_binary_image=SLEEP_BINARY_IMAGE):
+        """
+        Keeps the most deployed images pulled on every node with a daemon set. Every image is a container of the
+        daemon set pods that sleeps with a static binary an init container copies in, so images without a shell
+        are pulled too, and an image that fails to pull or to start doesn't hold back the others.
+        :param ImageFrequencyIndex frequency_index:
+        :param str namespace: the namespace of the daemon set
+        :param str sleep_binary_image: the image the init container copies /bin/busybox from
+        """
+        self.frequency_index = frequency_index
+        self.namespace = namespace
+        self.sleep_binary_image = sleep_binary_image
+        self._lock = threading.Lock()
+        # cluster key to the images of its daemon set
+        self._applied_images = {}
+        # cluster key to the lock of its refreshes
+        self._refresh_locks = {}
+
+    def refresh(self, logger, clients, count):
+        """
+        Updates the daemon set when the most deployed images changed
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param int count: the number of images to keep pulled, 0 removes the daemon set this driver created
+        """
+        if count <= 0 and not self._has_applied_images(clients.cluster_key):
+            return
+        images = sorted(self.frequency_index.top(clients, count)) if count > 0 else []
+
+        annotation = ','.join(images)
+        daemon_set = self._read_daemon_set(clients)
+
+        if not images:
+            if daemon_set:
+                clients.apps_v1_api.delete_namespaced_daemon_set(name=PREPULL_DAEMON_SET, namespace=self.namespace,
+                                                                 body={})
+                logger.info('Deleted the image pre-pull daemon set')
+        elif not daemon_set:
+            ensure_namespace(clients, self.namespace)
+            clients.apps_v1_api.create_namespaced_daemon_set(namespace=self.namespace,
+                                                             body=self._prepare_daemon_set(images, annotation))
+            logger.info('Created the image pre-pull daemon set for images {}'.format(annotation))
+        elif (daemon_set.metadata.annotations or {}).get(TagsService.PREPULL_IMAGES) != annotation:
+            body = self._prepare_daemon_set(images, annotation)
+            body.metadata.resource_version = daemon_set.metadata.resource_version
+            clients.apps_v1_api.replace_namespaced_daemon_set(name=PREPULL_DAEMON_SET, namespace=self.namespace,
+                                                              body=body)
+            logger.info('Updated the image pre-pull daemon set to images {}'.format(annotation))
+
+        with self._lock:
+            self._applied_images[clients.cluster_key] = images
+
+    def record_deploy(self, logger, clients, full_image_name, count):
+        """
+        Counts a deploy of the image and refreshes the daemon set on a background thread, so the deploy doesn't
+        wait for the config map and the daemon set
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str full_image_name:
+        :param int count: the number of images to keep pulled, 0 neither counts the image nor refreshes
+        """
+        if count <= 0 and not self._has_applied_images(clients.cluster_key):
+            return
+
+        def record_and_refresh():
+            try:
+                if count > 0:
+                    self.frequency_index.record(clients, full_image_name)
+                # one refresh of a cluster at a time, the next one sees the daemon set of the previous one
+                with self._get_refresh_lock(clients.cluster_key):
+                    self.refresh(logger, clients, count)
+            except Exception:
+                logger.warning('Failed to refresh the image pre-pull daemon set', exc_info=True)
+
+        thread = threading.Thread(target=record_and_refresh, name='image-prepull-refresh')
+        thread.daemon = True
+        thread.start()
+
+    def _get_refresh_lock(self, key):
+        """
+        :param tuple key: the cluster key
+        :rtype: threading.Lock
+        """
+        with self._lock:
+            return self._refresh_locks.setdefault(key, threading.Lock())
+
+    def _has_applied_images(self, key):
+        """
+        :param tuple key: the cluster key
+        :return: True when this driver created a daemon set for the cluster
+        :rtype: bool
+        """
+        with self._lock:
+            return bool(self._applied_images.get(key))
+
+    def _read_daemon_set(self, clients):
+        """
+        :param KubernetesClients clients:
+        :rtype: V1DaemonSet
+        """
+        try:
+            return clients.apps_v1_api.read_namespaced_daemon_set(name=PREPULL_DAEMON_SET, namespace=self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def _prepare_daemon_set(self, images, annotation):
+        """
+        :param list[str] images: sorted, so the pods are replaced only when the images change
+        :param str annotation:
+        :rtype: V1DaemonSet
+        """
+        labels = {TagsService.PREPULL_IMAGES: 'true'}
+        sleep_binary = '{}/busybox'.format(SLEEP_BINARY_DIR)
+        volume_mount = V1VolumeMount(name='sleep-binary', mount_path=SLEEP_BINARY_DIR)
+        init_container = V1Container(name='copy-sleep-binary', image=self.sleep_binary_image,
+                                     command=['cp', '/bin/busybox', sleep_binary],
+                                     volume_mounts=[volume_mount])
+        containers = [V1Container(name='prepull-{}'.format(index), image=image,
+                                  command=[sleep_binary, 'sleep', '2147483647'],
+                                  volume_mounts=[volume_mount])
+                      for index, image in enumerate(images)]
+        pod_spec = V1PodSpec(init_containers=[init_container],
+                             containers=containers,
+                             volumes=[V1Volume(name='sleep-binary', empty_dir=V1EmptyDirVolumeSource())],
+                             # the images are pulled on every node, including tainted ones
+                             tolerations=[V1Toleration(operator='Exists')])
+        template = V1PodTemplateSpec(metadata=V1ObjectMeta(labels=labels), spec=pod_spec)
+        spec = V1DaemonSetSpec(selector=V1LabelSelector(match_labels=labels), template=template)
+        meta = V1ObjectMeta(name=PREPULL_DAEMON_SET, annotations={TagsService.PREPULL_IMAGES: annotation})
+        return V1DaemonSet(metadata=meta, spec=spec)
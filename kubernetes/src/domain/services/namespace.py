@@ -1,16 +1,26 @@
+import threading
+from logging import Logger
+
 from cloudshell.cp.core.utils import first_or_default
 from kubernetes.client import V1Namespace, V1ObjectMeta, V1NamespaceList, V1DeleteOptions
 from kubernetes.client.rest import ApiException
 
+from domain.common.single_flight import SingleFlight
+from domain.common.utils import generate_short_unique_string
 from domain.services.tags import TagsService
 from model.clients import KubernetesClients
 
 
 class KubernetesNamespaceService(object):
     TERMINATING_STATUS = "Terminating"
+    POOL_NAMESPACE_PREFIX = "cloudshell-pool-"
 
     def __init__(self):
-        pass
+        # concurrent commands of a sandbox send identical namespace reads
+        self._single_flight = SingleFlight()
+        # cluster key to the thread that tops up the namespace pool of the cluster
+        self._pool_top_ups = {}
+        self._lock = threading.Lock()
 
     def create(self, clients, name, labels, annotations):
         """
@@ -29,12 +39,98 @@ class KubernetesNamespaceService(object):
 
     def get_namespace_name_for_sandbox(self, sandbox_id):
         """
+        The name of a namespace created for the sandbox, a claimed pooled namespace keeps its name so the namespace
+        of a sandbox is always found by its sandbox id label with get_single_by_id
         :param str sandbox_id:
         :rtype: str
         """
         return "cloudshell-{}".format(sandbox_id)
         # return "default"  # todo - alexaz - change this after implementing PrepreSandboxInfra
 
+    def claim_pooled_namespace(self, logger, clients, sandbox_id):
+        """
+        Labels a free namespace of the pool with the sandbox id. The patch carries the resource version of the
+        namespace, so when two sandboxes claim the same namespace one of them gets a conflict and tries the next one
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str sandbox_id:
+        :return: the claimed namespace, None when the pool is empty
+        :rtype: V1Namespace
+        """
+        free_namespaces = clients.core_api.list_namespace(label_selector=TagsService.NAMESPACE_POOL).items
+        for namespace in free_namespaces:
+            if namespace.status.phase == KubernetesNamespaceService.TERMINATING_STATUS:
+                continue
+
+            claimed_namespace = self._claim_namespace(clients, namespace, {TagsService.SANDBOX_ID: sandbox_id})
+            if not claimed_namespace:
+                continue
+
+            logger.info("Claimed pooled namespace '{}' for sandbox {}".format(claimed_namespace.metadata.name,
+                                                                            sandbox_id))
+            return claimed_namespace
+        return None
+
+    def _claim_namespace(self, clients, namespace, labels):
+        """
+        Removes the pool label of a free namespace, the patch carries its resource version
+        :param KubernetesClients clients:
+        :param V1Namespace namespace:
+        :param dict labels: added to the namespace
+        :return: the claimed namespace, None when another driver claimed or deleted it first
+        :rtype: V1Namespace
+        """
+        labels = dict(labels, **{TagsService.NAMESPACE_POOL: None})
+        body = {'metadata': {'resourceVersion': namespace.metadata.resource_version, 'labels': labels}}
+        try:
+            return clients.core_api.patch_namespace(name=namespace.metadata.name, body=body)
+        except ApiException as e:
+            if e.status in (404, 409):
+                return None
+            raise
+
+    def top_up_pool(self, logger, clients, size):
+        """
+        Creates the missing free namespaces of the pool in the background, the namespaces are ready (admission,
+        default service account) by the time a sandbox claims them. The free namespaces over the size, left when
+        the pool size was lowered or set to 0, are deleted.
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param int size: the number of free namespaces to keep, 0 deletes the pool
+        """
+        key = clients.cluster_key
+        with self._lock:
+            if key in self._pool_top_ups:
+                return
+            thread = threading.Thread(target=self._top_up_pool, args=(logger, clients, size, key),
+                                      name='namespace-pool-top-up')
+            thread.daemon = True
+            self._pool_top_ups[key] = thread
+        thread.start()
+
+    def _top_up_pool(self, logger, clients, size, key):
+        try:
+            free_namespaces = [namespace for namespace in
+                               clients.core_api.list_namespace(label_selector=TagsService.NAMESPACE_POOL).items
+                               if namespace.status.phase != KubernetesNamespaceService.TERMINATING_STATUS]
+            for _ in range(size - len(free_namespaces)):
+                created_namespace = self.create(clients,
+                                                self.POOL_NAMESPACE_PREFIX + generate_short_unique_string(),
+                                                {TagsService.NAMESPACE_POOL: 'true'},
+                                                None)
+                logger.debug("Created pooled namespace '{}'".format(created_namespace.metadata.name))
+            # claimed before the delete, so a namespace a sandbox claims at the same time isn't deleted
+            for namespace in free_namespaces[max(size, 0):]:
+                if self._claim_namespace(clients, namespace, {}):
+                    clients.core_api.delete_namespace(name=namespace.metadata.name,
+                                                      body=V1DeleteOptions(grace_period_seconds=5))
+                    logger.debug("Deleted pooled namespace '{}'".format(namespace.metadata.name))
+        except Exception:
+            logger.warning('Failed to top up the namespace pool', exc_info=True)
+        finally:
+            with self._lock:
+                del self._pool_top_ups[key]
+
     def get_all(self, clients):
         """
         :param KubernetesClients clients:
@@ -46,7 +142,7 @@ class KubernetesNamespaceService(object):
         # if cloud_account_id:
         #     filter_query += ',{tag}={value}'.format(tag=DevboxTags.CLOUD_ACCOUNT_ID, value=cloud_account_id)
 
-        return clients.core_api.list_namespace(label_selector=filter_query)
+        return self._list_namespaces(clients, filter_query)
 
     def get_single_by_id(self, clients, sandbox_id):
         """
@@ -71,7 +167,16 @@ class KubernetesNamespaceService(object):
         :param str filter_query:
         :rtype: V1NamespaceList
         """
-        return clients.core_api.list_namespace(label_selector=filter_query)
+        return self._list_namespaces(clients, filter_query)
+
+    def _list_namespaces(self, clients, label_selector):
+        """
+        :param KubernetesClients clients:
+        :param str label_selector:
+        :rtype: V1NamespaceList
+        """
+        return self._single_flight.do((clients.cluster_key, 'list_namespace', label_selector),
+                                      lambda: clients.core_api.list_namespace(label_selector=label_selector))
 
     def terminate(self, clients, sandbox_id):
         """
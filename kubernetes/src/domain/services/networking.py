@@ -1,17 +1,24 @@
+import time
 from logging import Logger
+from multiprocessing import TimeoutError
 from typing import List
 
+from cloudshell.shell.core.driver_context import CancellationContext
+from kubernetes import watch
 from kubernetes.client import V1ObjectMeta, V1Service, CoreV1Api, V1ServiceSpec, V1ServicePort, V1ServiceList, \
     V1DeleteOptions
 from kubernetes.client.rest import ApiException
 
+from domain.common.cancellation import raise_if_cancelled, MAX_WATCH_STEP
+from domain.common.single_flight import SingleFlight
 from domain.services.tags import TagsService
 from model.clients import KubernetesClients
 
 
 class KubernetesNetworkingService(object):
     def __init__(self):
-        pass
+        # concurrent commands of a sandbox send identical service reads
+        self._single_flight = SingleFlight()
 
     def create_internal_external_set(self, logger, clients, namespace, name, labels, internal_ports, external_ports,
                                      external_service_type):
@@ -63,6 +70,75 @@ class KubernetesNetworkingService(object):
 
         return services
 
+    def wait_for_external_address(self, logger, clients, namespace, app_name, timeout, cancellation_context=None):
+        """
+        Watches the external service of the app until its load balancer has an ingress
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str namespace:
+        :param str app_name:
+        :param float timeout: seconds to wait for the ingress
+        :param CancellationContext cancellation_context:
+        :return: the ip or hostname of the load balancer
+        :rtype: str
+        """
+        service_name = self._format_external_service_name(app_name)
+        field_selector = 'metadata.name={}'.format(service_name)
+        cancelled_message = 'Waiting for the address of app {} was cancelled'.format(app_name)
+        end_time = time.time() + timeout
+        resource_version = None
+
+        while True:
+            raise_if_cancelled(cancellation_context, cancelled_message)
+
+            if resource_version is None:
+                service_list = clients.core_api.list_namespaced_service(namespace=namespace,
+                                                                        field_selector=field_selector)
+                if not service_list.items:
+                    raise ValueError('External service {} not found in ns/{}'.format(service_name, namespace))
+                address = self.get_external_address(service_list.items[0])
+                if address:
+                    return address
+                resource_version = service_list.metadata.resource_version
+                logger.info('Waiting for the load balancer of service {} to get an address'.format(service_name))
+
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                raise TimeoutError('Timeout: the load balancer of service {} did not get an address within {} '
+                                   'seconds'.format(service_name, timeout))
+
+            # the watch request ends with the step timeout even when the service doesn't change
+            for event in watch.Watch().stream(clients.core_api.list_namespaced_service,
+                                              namespace=namespace,
+                                              field_selector=field_selector,
+                                              resource_version=resource_version,
+                                              timeout_seconds=max(1, int(min(remaining, MAX_WATCH_STEP)))):
+                if event['type'] == 'ERROR':
+                    # the resource version expired, list again
+                    resource_version = None
+                    break
+                if event['type'] == 'DELETED':
+                    raise ValueError('External service {} was deleted in ns/{}'.format(service_name, namespace))
+
+                service = event['object']
+                resource_version = service.metadata.resource_version
+                address = self.get_external_address(service)
+                if address:
+                    return address
+
+    @staticmethod
+    def get_external_address(service):
+        """
+        :param V1Service service:
+        :return: the ip or hostname of the first load balancer ingress, None while the load balancer has none
+        :rtype: str
+        """
+        load_balancer = service.status.load_balancer if service.status else None
+        for ingress in (load_balancer.ingress if load_balancer else None) or []:
+            if ingress.ip or ingress.hostname:
+                return ingress.ip or ingress.hostname
+        return None
+
     def _format_external_service_name(self, name):
         return "{}-{}".format(name, TagsService.EXTERNAL_SERVICE_POSTFIX)
 
@@ -147,8 +223,9 @@ class KubernetesNetworkingService(object):
         :rtype: List[V1Service]
         """
         selector_tag = self._get_service_app_name_selector(app_name)
-        return clients.core_api.list_namespaced_service(namespace=namespace,
-                                                        label_selector=selector_tag).items
+        return self._single_flight.do(
+            (clients.cluster_key, 'list_namespaced_service', namespace, selector_tag),
+            lambda: clients.core_api.list_namespaced_service(namespace=namespace, label_selector=selector_tag).items)
 
     def filter_by_label(self, clients, filter_query):
         """
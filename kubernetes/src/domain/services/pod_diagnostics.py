@@ -0,0 +1,156 @@
+from typing import List
+
+from kubernetes.client import V1Pod, V1Event
+
+from model.clients import KubernetesClients
+
+# waiting reasons after which the container doesn't start without a change of the app
+FATAL_CONTAINER_REASONS = ('ImagePullBackOff', 'InvalidImageName', 'CreateContainerConfigError',
+                           'CreateContainerError')
+
+# apps that wait for a dependency crash a few times before they start, the kubelet backs off for 10, 20, 40, 80
+# and 160 seconds, so the 5th restart comes after about 5 minutes of crashes
+CRASH_LOOP_REASON = 'CrashLoopBackOff'
+DEFAULT_CRASH_LOOP_RESTARTS = 5
+
+UNSCHEDULABLE_REASON = 'Unschedulable'
+
+# pod events of the cluster autoscaler
+SCALE_UP_TRIGGERED_REASON = 'TriggeredScaleUp'
+SCALE_UP_NOT_TRIGGERED_REASON = 'NotTriggerScaleUp'
+
+MAX_SUMMARY_REASONS = 3
+
+
+class PodsDiagnosis(object):
+    def __init__(self, failure=None, scaling_up=False, reasons=None):
+        """
+        :param str failure: the cause when the pods can't become ready, None while they still might
+        :param bool scaling_up: pending pods wait for a node the cluster autoscaler is adding
+        :param list[str] reasons: why the pods that are not ready are not ready yet
+        """
+        self.failure = failure
+        self.scaling_up = scaling_up
+        self.reasons = reasons or []
+
+    @property
+    def summary(self):
+        """
+        :rtype: str
+        """
+        if self.failure:
+            return self.failure
+        reasons = self.reasons[:MAX_SUMMARY_REASONS]
+        if len(self.reasons) > MAX_SUMMARY_REASONS:
+            reasons.append('{} more'.format(len(self.reasons) - MAX_SUMMARY_REASONS))
+        return '; '.join(reasons)
+
+
+class PodDiagnosticsService(object):
+    def __init__(self, crash_loop_restarts=DEFAULT_CRASH_LOOP_RESTARTS):
+        """
+        :param int crash_loop_restarts: the restarts after which a container in CrashLoopBackOff is a failure
+        """
+        self.crash_loop_restarts = crash_loop_restarts
+
+    def diagnose(self, clients, namespace, label_selector, pods=None):
+        """
+        Inspects the container states and conditions of the pods, and the autoscaler events of unschedulable pods
+        :param KubernetesClients clients:
+        :param str namespace:
+        :param str label_selector:
+        :param List[V1Pod] pods: the pods of the label selector when the caller already listed them
+        :rtype: PodsDiagnosis
+        """
+        if pods is None:
+            pods = clients.core_api.list_namespaced_pod(namespace=namespace, label_selector=label_selector).items
+
+        reasons = []
+        unschedulable = {}
+        for pod in pods:
+            container_failure = self._get_container_failure(pod)
+            if container_failure:
+                reason, description, restart_count = container_failure
+                if reason in FATAL_CONTAINER_REASONS or \
+                        (reason == CRASH_LOOP_REASON and restart_count >= self.crash_loop_restarts):
+                    return PodsDiagnosis(failure=description, reasons=[description])
+                reasons.append(description)
+                continue
+
+            scheduling_message = self._get_unschedulable_message(pod)
+            if scheduling_message is not None:
+                unschedulable[pod.metadata.name] = scheduling_message
+
+        if not unschedulable:
+            return PodsDiagnosis(reasons=reasons)
+
+        scaling_up = False
+        for pod_name, autoscaler_event in self._get_autoscaler_events(clients, namespace, unschedulable).items():
+            if autoscaler_event.reason == SCALE_UP_NOT_TRIGGERED_REASON:
+                failure = "pod {} is unschedulable ({}) and the cluster autoscaler can't add a node for it: {}"\
+                    .format(pod_name, unschedulable[pod_name], autoscaler_event.message)
+                return PodsDiagnosis(failure=failure, reasons=[failure])
+            scaling_up = True
+
+        reasons.extend('pod {} is unschedulable: {}'.format(pod_name, message)
+                       for pod_name, message in sorted(unschedulable.items()))
+        return PodsDiagnosis(scaling_up=scaling_up, reasons=reasons)
+
+    def _get_container_failure(self, pod):
+        """
+        :param V1Pod pod:
+        :return: the waiting reason, a description and the restart count of the first container that waits for a reason
+        :rtype: tuple[str, str, int]
+        """
+        statuses = (pod.status.init_container_statuses or []) + (pod.status.container_statuses or [])
+        for status in statuses:
+            waiting = status.state.waiting if status.state else None
+            if not waiting or not waiting.reason or waiting.reason in ('ContainerCreating', 'PodInitializing'):
+                continue
+            description = 'container {} of pod {}: {}'.format(status.name, pod.metadata.name, waiting.reason)
+            if waiting.message:
+                description = '{}: {}'.format(description, waiting.message)
+            if waiting.reason == CRASH_LOOP_REASON:
+                description = '{} (restarted {} times)'.format(description, status.restart_count or 0)
+            return waiting.reason, description, status.restart_count or 0
+        return None
+
+    def _get_unschedulable_message(self, pod):
+        """
+        :param V1Pod pod:
+        :return: the scheduler message when the pod is unschedulable, None otherwise
+        :rtype: str
+        """
+        for condition in pod.status.conditions or []:
+            if condition.type == 'PodScheduled' and condition.status == 'False' and \
+                    condition.reason == UNSCHEDULABLE_REASON:
+                return condition.message or UNSCHEDULABLE_REASON
+        return None
+
+    def _get_autoscaler_events(self, clients, namespace, pod_names):
+        """
+        :param KubernetesClients clients:
+        :param str namespace:
+        :param collections.Iterable[str] pod_names:
+        :return: the latest autoscaler event of every pod that has one
+        :rtype: dict[str, V1Event]
+        """
+        events = clients.core_api.list_namespaced_event(namespace=namespace,
+                                                        field_selector='involvedObject.kind=Pod').items
+        latest_events = {}
+        for event in events:
+            if event.reason not in (SCALE_UP_TRIGGERED_REASON, SCALE_UP_NOT_TRIGGERED_REASON):
+                continue
+            pod_name = event.involved_object.name
+            if pod_name not in pod_names:
+                continue
+            latest_event = latest_events.get(pod_name)
+            if latest_event is None or self._get_event_time(event) >= self._get_event_time(latest_event):
+                latest_events[pod_name] = event
+        return latest_events
+
+    def _get_event_time(self, event):
+        """
+        :param V1Event event:
+        """
+        return event.last_timestamp or event.first_timestamp or event.metadata.creation_timestamp
@@ -0,0 +1,60 @@
+from kubernetes.client import AppsV1beta1Deployment
+
+PROGRESSING_CONDITION = 'Progressing'
+PROGRESS_DEADLINE_EXCEEDED_REASON = 'ProgressDeadlineExceeded'
+
+
+class RolloutStatus(object):
+    def __init__(self, done, message='', failure=None):
+        """
+        :param bool done: the rollout completed, all the replicas run the latest spec and are available
+        :param str message: what the rollout still waits for
+        :param str failure: the cause when the rollout can't complete
+        """
+        self.done = done
+        self.message = message
+        self.failure = failure
+
+
+class RolloutStatusEvaluator(object):
+    def __init__(self):
+        """
+        Evaluates deployments like 'kubectl rollout status'. Counting ready replicas is not enough: right after a
+        change of the spec the status still describes the previous replica set, and during a rolling update the
+        ready count includes the old pods.
+        """
+        pass
+
+    def evaluate(self, deployment, generation=None):
+        """
+        :param AppsV1beta1Deployment deployment:
+        :param int generation: the rollout of at least this generation must complete, the generation of the
+        deployment by default
+        :rtype: RolloutStatus
+        """
+        generation = max(generation or 0, deployment.metadata.generation or 0)
+        status = deployment.status
+        if (status.observed_generation or 0) < generation:
+            return RolloutStatus(False, 'waiting for the deployment spec update to be observed')
+
+        for condition in status.conditions or []:
+            if condition.type == PROGRESSING_CONDITION and condition.reason == PROGRESS_DEADLINE_EXCEEDED_REASON:
+                return RolloutStatus(False, failure='the rollout exceeded its progress deadline: {}'
+                                     .format(condition.message or condition.reason))
+
+        replicas = deployment.spec.replicas if deployment.spec.replicas is not None else 1
+        updated_replicas = status.updated_replicas or 0
+        if updated_replicas < replicas:
+            return RolloutStatus(False, '{} out of {} new replicas have been updated'
+                                 .format(updated_replicas, replicas))
+
+        old_replicas = (status.replicas or 0) - updated_replicas
+        if old_replicas > 0:
+            return RolloutStatus(False, '{} old replicas are pending termination'.format(old_replicas))
+
+        available_replicas = status.available_replicas or 0
+        if available_replicas < updated_replicas:
+            return RolloutStatus(False, '{} of {} updated replicas are available'
+                                 .format(available_replicas, updated_replicas))
+
+        return RolloutStatus(True)
@@ -10,6 +10,8 @@ def get_provider_tag_name(tag_name):
 
 class TagsService(object):
     SANDBOX_ID = get_provider_tag_name('sandbox-id')
+    # label of the pre-created namespaces that are not claimed by a sandbox yet
+    NAMESPACE_POOL = get_provider_tag_name('namespace-pool')
 
     INTERNAL_PORT_PREFIX = 'pi'
     EXTERNAL_PORT_PREFIX = 'pe'
@@ -20,6 +22,27 @@ class TagsService(object):
     SERVICE_APP_NAME = get_provider_tag_name("service-app-name")
     EXTERNAL_SERVICE_POSTFIX = 'external'
 
+    # NODES
+    # set by the kubelet, usually but not always the name of the node
+    HOSTNAME_LABEL = 'kubernetes.io/hostname'
+
+    # PODS
+    # label of the warm pods that are not claimed yet, the value identifies their image and compute spec
+    WARM_POOL_KEY = get_provider_tag_name('warm-pool-key')
+
+    # DAEMON SETS
+    # the images the pre-pull daemon set keeps pulled, also labels its pods
+    PREPULL_IMAGES = get_provider_tag_name('prepull-images')
+
+    # DEPLOYMENTS
+    # deployment annotations read by the sandbox power commands, which don't get the deployed app resources
+    REPLICAS = get_provider_tag_name('replicas')
+    WAIT_FOR_REPLICAS = get_provider_tag_name('wait-for-replicas')
+    # comma separated names of the apps of the sandbox that must be ready before the app is powered on
+    DEPENDS_ON = get_provider_tag_name('depends-on')
+    # pod template annotation, changing it makes the deployment replace its pods
+    RESTARTED_AT = get_provider_tag_name('restarted-at')
+
     @staticmethod
     def get_default_selector(app_name):
         """
@@ -0,0 +1,290 @@
+"""
+Cache of the vm details of deployed apps.
+
+GetVmDetails is sent for every refresh of the sandbox UI, mostly when nothing changed in the sandbox. The cache keeps
+the vm details of every deployed app together with the resource versions of the deployment and services they were
+created from. A watcher per namespace follows the resource versions of the deployments and services, an entry is
+valid while the watched versions of its app are the versions it was created from, so refreshes of an idle sandbox
+don't send any request. Without a running watcher (watching disabled, or the watch failing) entries expire after
+a TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from cloudshell.cp.core.models import VmDetailsData
+from kubernetes import watch
+from kubernetes.client import AppsV1beta1Deployment, V1Service
+
+from domain.services.tags import TagsService
+from model.clients import KubernetesClients
+from model.deployed_app import DeployedAppResource
+
+DEPLOYMENTS = 'deployments'
+SERVICES = 'services'
+
+WATCH_THREAD_PREFIX = 'vm-details-watch'
+
+
+class _NamespaceWatcher(object):
+    def __init__(self, clients, namespace, idle_timeout, watch_timeout, retry_delay):
+        """
+        Follows the resource versions of the deployments and services of a namespace with list and watch, one
+        thread per kind. The threads end once the watcher wasn't used for idle_timeout seconds.
+        :param KubernetesClients clients:
+        :param str namespace:
+        :param float idle_timeout:
+        :param int watch_timeout:
+        :param float retry_delay:
+        """
+        self.clients = clients
+        self.namespace = namespace
+        self.idle_timeout = idle_timeout
+        self.watch_timeout = watch_timeout
+        self.retry_delay = retry_delay
+        self.last_used = time.time()
+        self._synced = {DEPLOYMENTS: False, SERVICES: False}
+        self._running = 0
+        # kind -> object name -> (resource version, labels)
+        self._objects = {DEPLOYMENTS: {}, SERVICES: {}}
+        self._threads = []
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self):
+        with self._lock:
+            return self._running > 0
+
+    def start(self):
+        list_methods = {DEPLOYMENTS: self.clients.apps_api.list_namespaced_deployment,
+                        SERVICES: self.clients.core_api.list_namespaced_service}
+        for kind, list_method in list_methods.items():
+            thread = threading.Thread(target=self._run, args=(kind, list_method),
+                                      name='{}-{}-{}'.format(WATCH_THREAD_PREFIX, self.namespace, kind))
+            thread.daemon = True
+            with self._lock:
+                self._running += 1
+            self._threads.append(thread)
+            thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        :param float timeout: seconds to wait for the threads, they are not waited for without it. A thread in a
+        watch request ends with the request.
+        """
+        self._stopped.set()
+        if timeout is None:
+            return
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def get_versions(self, app_name):
+        """
+        :param str app_name:
+        :return: the watched versions of the app objects, None while the watcher isn't in sync with the cluster
+        :rtype: frozenset
+        """
+        with self._lock:
+            self.last_used = time.time()
+            if not all(self._synced.values()):
+                return None
+            return frozenset((kind, name, version)
+                             for kind, objects in self._objects.items()
+                             for name, (version, labels) in objects.items()
+                             if _belongs_to_app(kind, labels, app_name))
+
+    def _is_idle(self):
+        if self._stopped.is_set():
+            return True
+        with self._lock:
+            return time.time() - self.last_used > self.idle_timeout
+
+    def _run(self, kind, list_method):
+        try:
+            while not self._is_idle():
+                try:
+                    self._list_and_watch(kind, list_method)
+                except Exception:
+                    # the versions are unknown until the next successful list, the entries fall back to the TTL
+                    with self._lock:
+                        self._synced[kind] = False
+                    self._stopped.wait(self.retry_delay)
+        finally:
+            with self._lock:
+                self._synced[kind] = False
+                self._running -= 1
+
+    def _list_and_watch(self, kind, list_method):
+        object_list = list_method(namespace=self.namespace)
+        with self._lock:
+            self._objects[kind] = dict((obj.metadata.name, (obj.metadata.resource_version, obj.metadata.labels or {}))
+                                       for obj in object_list.items)
+            self._synced[kind] = True
+
+        resource_version = object_list.metadata.resource_version
+        while not self._is_idle():
+            for event in watch.Watch().stream(list_method, namespace=self.namespace,
+                                              resource_version=resource_version,
+                                              timeout_seconds=self.watch_timeout):
+                if event['type'] == 'ERROR':
+                    # the resource version is too old, list again
+                    raise ValueError('Watch of {} in ns/{} failed'.format(kind, self.namespace))
+
+                obj = event['object']
+                resource_version = obj.metadata.resource_version
+                with self._lock:
+                    if event['type'] == 'DELETED':
+                        self._objects[kind].pop(obj.metadata.name, None)
+                    else:
+                        self._objects[kind][obj.metadata.name] = (resource_version, obj.metadata.labels or {})
+
+                if self._is_idle():
+                    return
+
+
+def _belongs_to_app(kind, labels, app_name):
+    """
+    Matches the label selectors the vm details are read with
+    :param str kind:
+    :param dict labels:
+    :param str app_name:
+    :rtype: bool
+    """
+    if kind == DEPLOYMENTS:
+        return labels.get(TagsService.get_default_selector(app_name)) == app_name
+    return labels.get(TagsService.SERVICE_APP_NAME) == app_name
+
+
+def get_app_versions(deployment, services):
+    """
+    :param AppsV1beta1Deployment deployment:
+    :param list[V1Service] services:
+    :return: the resource versions the vm details of an app are created from
+    :rtype: frozenset
+    """
+    versions = [(SERVICES, service.metadata.name, service.metadata.resource_version) for service in services or []]
+    if deployment:
+        versions.append((DEPLOYMENTS, deployment.metadata.name, deployment.metadata.resource_version))
+    return frozenset(versions)
+
+
+class _CacheEntry(object):
+    __slots__ = ('vm_details', 'versions', 'inputs', 'created')
+
+    def __init__(self, vm_details, versions, inputs):
+        self.vm_details = vm_details
+        self.versions = versions
+        self.inputs = inputs
+        self.created = time.time()
+
+
+class VmDetailsCache(object):
+    def __init__(self, use_watch=True, ttl=30, max_size=4096, idle_timeout=600, watch_timeout=300, retry_delay=5):
+        """
+        :param bool use_watch: watch the namespaces of the cached apps, entries only expire by the TTL without it
+        :param float ttl: seconds an entry is valid when its namespace isn't watched
+        :param int max_size: the least recently used entries are dropped above it
+        :param float idle_timeout: seconds after which the watcher of a namespace without lookups stops
+        :param int watch_timeout: timeout of every watch request
+        :param float retry_delay: seconds between attempts of a failing watch
+        """
+        self.use_watch = use_watch
+        self.ttl = ttl
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.watch_timeout = watch_timeout
+        self.retry_delay = retry_delay
+        self._entries = OrderedDict()
+        self._watchers = {}
+        self._lock = threading.Lock()
+
+    def get(self, clients, deployed_app):
+        """
+        :param KubernetesClients clients:
+        :param DeployedAppResource deployed_app:
+        :return: the cached vm details, None when they have to be created
+        :rtype: VmDetailsData
+        """
+        key = self._get_key(clients, deployed_app)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._entries[key] = entry
+
+        if entry.inputs != self._get_inputs(deployed_app):
+            return None
+
+        watcher = self._get_watcher(clients, deployed_app.namespace)
+        versions = watcher.get_versions(deployed_app.kubernetes_name) if watcher else None
+        if versions is not None:
+            valid = versions == entry.versions
+        else:
+            valid = time.time() - entry.created < self.ttl
+
+        return entry.vm_details if valid else None
+
+    def put(self, clients, deployed_app, vm_details, deployment, services):
+        """
+        :param KubernetesClients clients:
+        :param DeployedAppResource deployed_app:
+        :param VmDetailsData vm_details:
+        :param AppsV1beta1Deployment deployment: the deployment the vm details were created from
+        :param list[V1Service] services: the services the vm details were created from
+        """
+        if vm_details.errorMessage:
+            return
+
+        key = self._get_key(clients, deployed_app)
+        entry = _CacheEntry(vm_details, get_app_versions(deployment, services), self._get_inputs(deployed_app))
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        # the watch starts with the first cached app of a namespace, the next refresh can already use it
+        self._get_watcher(clients, deployed_app.namespace)
+
+    def close(self, timeout=None):
+        """
+        Stops the watchers and drops the entries
+        :param float timeout: seconds to wait for every watcher, they are not waited for without it
+        """
+        with self._lock:
+            watchers = list(self._watchers.values())
+            self._watchers.clear()
+            self._entries.clear()
+        for watcher in watchers:
+            watcher.stop(timeout)
+
+    def _get_watcher(self, clients, namespace):
+        """
+        :param KubernetesClients clients:
+        :param str namespace:
+        :rtype: _NamespaceWatcher
+        """
+        if not self.use_watch:
+            return None
+
+        key = (clients.cluster_key, namespace)
+        with self._lock:
+            watcher = self._watchers.get(key)
+            if watcher is None or not watcher.alive:
+                watcher = _NamespaceWatcher(clients, namespace, self.idle_timeout, self.watch_timeout,
+                                            self.retry_delay).start()
+                self._watchers[key] = watcher
+        return watcher
+
+    def _get_key(self, clients, deployed_app):
+        return clients.cluster_key, deployed_app.namespace, deployed_app.kubernetes_name
+
+    def _get_inputs(self, deployed_app):
+        """
+        The vm details depend on these deployed app values besides the kubernetes objects
+        :param DeployedAppResource deployed_app:
+        :rtype: tuple
+        """
+        return deployed_app.cloudshell_resource_name, deployed_app.replicas
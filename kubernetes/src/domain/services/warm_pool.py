@@ -0,0 +1,250 @@
+import hashlib
+import json
+import threading
+from logging import Logger
+
+from kubernetes.client import V1Pod, V1ObjectMeta, V1PodSpec, V1Container, V1DeleteOptions, V1Namespace
+from kubernetes.client.rest import ApiException
+
+from domain.common.utils import generate_short_unique_string
+from domain.services.deployment import KubernetesDeploymentService
+from domain.services.tags import TagsService
+from model.clients import KubernetesClients
+from model.deployment_requests import AppComputeSpecKubernetes
+
+WARM_POOL_NAMESPACE = 'cloudshell-warm-pool'
+PAUSE_IMAGE = 'registry.k8s.io/pause:3.1'
+
+
+class WarmPoolMetrics(object):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        """
+        :rtype: float
+        """
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+
+class WarmPodPool(object):
+    def __init__(self, namespace=WARM_POOL_NAMESPACE, pause_image=PAUSE_IMAGE):
+        """
+        Keeps idle pods of the hot images on the nodes of the cluster. A warm pod pulls the image with an init
+        container and holds the compute spec of the app with a pause container. A deploy of a hot image claims a
+        matching warm pod, deletes it to free its resources and schedules the app on its node, where the image is
+        already pulled. Pods can't move to the namespace of a sandbox, so the app still gets its own pods.
+        :param str namespace: the namespace of the warm pods
+        :param str pause_image: the image of the container that holds the resources
+        """
+        self.namespace = namespace
+        self.pause_image = pause_image
+        self.metrics = WarmPoolMetrics()
+        self._lock = threading.Lock()
+        # (cluster key, pool key) to the thread that tops up the pool
+        self._top_ups = {}
+
+    @staticmethod
+    def parse_hot_images(hot_images):
+        """
+        :param str hot_images: comma separated images, e.g. 'nginx:1.15, redis'
+        :return: the full names of the images, like the containers of the apps name them
+        :rtype: set
+        """
+        full_image_names = set()
+        for image in (hot_images or '').split(','):
+            image = image.strip()
+            if image.endswith(':latest'):
+                image = image[:-len(':latest')]
+            if image:
+                full_image_names.add(image)
+        return full_image_names
+
+    @staticmethod
+    def get_pool_key(full_image_name, compute_spec):
+        """
+        :param str full_image_name:
+        :param AppComputeSpecKubernetes compute_spec:
+        :return: a label value that identifies the image and the compute spec
+        :rtype: str
+        """
+        resources = KubernetesDeploymentService.prepare_resource_request(compute_spec) if compute_spec else None
+        key = json.dumps([full_image_name, resources], sort_keys=True)
+        return hashlib.sha1(key.encode('utf8')).hexdigest()[:16]
+
+    def acquire_node(self, logger, clients, hot_images, size, full_image_name, compute_spec):
+        """
+        Claims a warm pod for a deploy and tops up the pool of the image in the background
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str hot_images: the Warm Pool Images attribute
+        :param int size: the number of warm pods to keep for every image and compute spec
+        :param str full_image_name:
+        :param AppComputeSpecKubernetes compute_spec:
+        :return: the hostname label of the node of the claimed warm pod, None when the image is not hot or no warm
+        pod is ready
+        :rtype: str
+        """
+        if size <= 0 or full_image_name not in self.parse_hot_images(hot_images):
+            return None
+
+        pool_key = self.get_pool_key(full_image_name, compute_spec)
+        node_name = self._claim(clients, pool_key)
+        node_hostname = self._get_node_hostname(logger, clients, node_name) if node_name else None
+        with self._lock:
+            if node_name:
+                self.metrics.hits += 1
+            else:
+                self.metrics.misses += 1
+            logger.info('Warm pool {} for image {} (hits {}, misses {})'.format('hit' if node_name else 'miss',
+                                                                               full_image_name, self.metrics.hits,
+                                                                               self.metrics.misses))
+
+        resources = KubernetesDeploymentService.prepare_resource_request(compute_spec) if compute_spec else None
+        self._top_up(logger, clients, pool_key, size, full_image_name, resources)
+        return node_hostname
+
+    def warm_up(self, logger, clients, hot_images, size):
+        """
+        Tops up the pools of the hot images before they are deployed, e.g. when a sandbox is prepared, so the first
+        deploy of an image doesn't miss. Apps without a compute spec get a pool of every hot image, and the pools of
+        other compute specs are found by their existing warm pods.
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str hot_images: the Warm Pool Images attribute
+        :param int size: the number of warm pods to keep for every image and compute spec
+        """
+        full_image_names = self.parse_hot_images(hot_images)
+        if size <= 0 or not full_image_names:
+            return
+
+        # pool key to the image and the resources of its warm pods
+        pools = {self.get_pool_key(full_image_name, None): (full_image_name, None)
+                 for full_image_name in full_image_names}
+        try:
+            pods = clients.core_api.list_namespaced_pod(namespace=self.namespace,
+                                                        label_selector=TagsService.WARM_POOL_KEY).items
+        except Exception:
+            logger.warning('Failed to list the warm pods', exc_info=True)
+            pods = []
+        for pod in pods:
+            full_image_name = pod.spec.init_containers[0].image if pod.spec.init_containers else None
+            if full_image_name in full_image_names:
+                requirements = pod.spec.containers[0].resources
+                resources = {key: value for key, value in (('requests', requirements and requirements.requests),
+                                                           ('limits', requirements and requirements.limits)) if value}
+                pools[pod.metadata.labels[TagsService.WARM_POOL_KEY]] = (full_image_name, resources or None)
+
+        for pool_key, (full_image_name, resources) in pools.items():
+            self._top_up(logger, clients, pool_key, size, full_image_name, resources)
+
+    @staticmethod
+    def _get_node_hostname(logger, clients, node_name):
+        """
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param str node_name:
+        :return: the hostname label of the node, which the node affinity of the app is matched against
+        :rtype: str
+        """
+        try:
+            node = clients.core_api.read_node(name=node_name)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            return None
+        hostname = (node.metadata.labels or {}).get(TagsService.HOSTNAME_LABEL)
+        if not hostname:
+            logger.warning('Node {} has no {} label, the app is not placed on it'.format(node_name,
+                                                                                         TagsService.HOSTNAME_LABEL))
+        return hostname
+
+    def _claim(self, clients, pool_key):
+        """
+        :param KubernetesClients clients:
+        :param str pool_key:
+        :return: the node of the claimed warm pod
+        :rtype: str
+        """
+        label_selector = '{}={}'.format(TagsService.WARM_POOL_KEY, pool_key)
+        pods = clients.core_api.list_namespaced_pod(namespace=self.namespace, label_selector=label_selector).items
+        for pod in pods:
+            if pod.status.phase != 'Running' or not pod.spec.node_name or pod.metadata.deletion_timestamp:
+                continue
+
+            # the resource version makes concurrent deploys claim different pods
+            body = {'metadata': {'resourceVersion': pod.metadata.resource_version,
+                                 'labels': {TagsService.WARM_POOL_KEY: None}}}
+            try:
+                clients.core_api.patch_namespaced_pod(name=pod.metadata.name, namespace=self.namespace, body=body)
+            except ApiException as e:
+                if e.status in (404, 409):
+                    continue
+                raise
+
+            # the app takes the place of the warm pod on its node
+            try:
+                clients.core_api.delete_namespaced_pod(name=pod.metadata.name, namespace=self.namespace,
+                                                       body=V1DeleteOptions(grace_period_seconds=0))
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+            return pod.spec.node_name
+        return None
+
+    def _top_up(self, logger, clients, pool_key, size, full_image_name, resources):
+        key = (clients.cluster_key, pool_key)
+        with self._lock:
+            if key in self._top_ups:
+                return
+            thread = threading.Thread(target=self._top_up_pool,
+                                      args=(logger, clients, pool_key, size, full_image_name, resources, key),
+                                      name='warm-pool-top-up')
+            thread.daemon = True
+            self._top_ups[key] = thread
+        thread.start()
+
+    def _top_up_pool(self, logger, clients, pool_key, size, full_image_name, resources, key):
+        try:
+            self._ensure_namespace(clients)
+            label_selector = '{}={}'.format(TagsService.WARM_POOL_KEY, pool_key)
+            # failed warm pods are counted too, an image that can't be warmed shouldn't get new pods on every deploy
+            warm_pods = [pod for pod in clients.core_api.list_namespaced_pod(namespace=self.namespace,
+                                                                             label_selector=label_selector).items
+                         if not pod.metadata.deletion_timestamp]
+            for _ in range(size - len(warm_pods)):
+                clients.core_api.create_namespaced_pod(namespace=self.namespace,
+                                                       body=self._prepare_warm_pod(pool_key, full_image_name,
+                                                                                   resources))
+        except Exception:
+            logger.warning('Failed to top up the warm pool of image {}'.format(full_image_name), exc_info=True)
+        finally:
+            with self._lock:
+                del self._top_ups[key]
+
+    def _ensure_namespace(self, clients):
+        """
+        :param KubernetesClients clients:
+        """
+        try:
+            clients.core_api.create_namespace(body=V1Namespace(metadata=V1ObjectMeta(name=self.namespace)))
+        except ApiException as e:
+            if e.status != 409:
+                raise
+
+    def _prepare_warm_pod(self, pool_key, full_image_name, resources):
+        """
+        :param str pool_key:
+        :param str full_image_name:
+        :param dict resources: the requests and limits of the apps, the pause container holds them
+        :rtype: V1Pod
+        """
+        # the init container only pulls the image, the hot images must have a shell
+        pull_container = V1Container(name='pull', image=full_image_name, command=['/bin/sh', '-c', 'true'])
+        pause_container = V1Container(name='pause', image=self.pause_image, resources=resources)
+        meta = V1ObjectMeta(name='warm-{}-{}'.format(pool_key[:8], generate_short_unique_string()),
+                            labels={TagsService.WARM_POOL_KEY: pool_key})
+        return V1Pod(metadata=meta, spec=V1PodSpec(init_containers=[pull_container], containers=[pause_container]))
@@ -1,4 +1,5 @@
 import json
+from logging import Logger
 
 from cloudshell.core.context.error_handling_context import ErrorHandlingContext
 from cloudshell.cp.core import DriverRequestParser
@@ -10,18 +11,33 @@ from cloudshell.shell.core.resource_driver_interface import ResourceDriverInterf
 from cloudshell.shell.core.session.logging_session import LoggingSessionContext
 
 import data_model
+from domain.common.app_operation_queue import AppOperationQueue, POWER_ON, POWER_OFF, POWER_CYCLE, DELETE_INSTANCE
+from domain.common.json_encoder import encode_driver_response, iter_encode_vm_details
+from domain.common.polling import PollingScheduler
+from domain.common.profiling import CommandProfiler
+from domain.common.utils import truncate_for_log
 from domain.operations.autoload import AutolaodOperation
 from domain.operations.cleanup import CleanupSandboxInfraOperation
 from domain.operations.delete import DeleteInstanceOperation
 from domain.operations.deploy import DeployOperation
 from domain.operations.power import PowerOperation
 from domain.operations.prepare import PrepareSandboxInfraOperation
+from domain.operations.refresh_ip import RefreshIpOperation
+from domain.operations.sandbox_power import SandboxPowerOperation
 from domain.operations.vm_details import VmDetialsOperation
 from domain.services.clients import ApiClientsProvider
 from domain.services.deployment import KubernetesDeploymentService
+from domain.services.capacity import ClusterCapacityService
+from domain.services.image_digest import ImageDigestResolver
+from domain.services.image_prepull import ImageFrequencyIndex, ImagePrePullService
 from domain.services.namespace import KubernetesNamespaceService
 from domain.services.networking import KubernetesNetworkingService
+from domain.services.pod_diagnostics import PodDiagnosticsService
+from domain.services.rollout_status import RolloutStatusEvaluator
 from domain.services.vm_details import VmDetailsProvider
+from domain.services.vm_details_cache import VmDetailsCache
+from domain.services.warm_pool import WarmPodPool
+from model.clients import KubernetesClients
 from model.deployed_app import DeployedAppResource
 
 
@@ -32,27 +48,46 @@ class KubernetesDriver(ResourceDriverInterface):
         ctor must be without arguments, it is created with reflection at run time
         """
         self.request_parser = DriverRequestParser()
+        self.command_profiler = CommandProfiler()
 
         # services
         self.api_clients_provider = ApiClientsProvider()
         self.networking_service = KubernetesNetworkingService()
         self.namespace_service = KubernetesNamespaceService()
-        self.deployment_service = KubernetesDeploymentService()
+        self.pod_diagnostics_service = PodDiagnosticsService()
+        self.polling_scheduler = PollingScheduler()
+        self.rollout_status_evaluator = RolloutStatusEvaluator()
+        self.deployment_service = KubernetesDeploymentService(self.pod_diagnostics_service, self.polling_scheduler,
+                                                              self.rollout_status_evaluator)
+        self.image_prepull_service = ImagePrePullService(ImageFrequencyIndex())
         self.vm_details_provider = VmDetailsProvider()
+        self.vm_details_cache = VmDetailsCache()
+        self.warm_pod_pool = WarmPodPool()
+        self.image_digest_resolver = ImageDigestResolver()
+        self.capacity_service = ClusterCapacityService()
+        # the commands of a deployed app run one at a time, redundant queued commands are dropped
+        self.app_operation_queue = AppOperationQueue()
 
         # operations
-        self.autoload_operation = AutolaodOperation(api_clients_provider=self.api_clients_provider)
+        self.autoload_operation = AutolaodOperation(api_clients_provider=self.api_clients_provider,
+                                                    capacity_service=self.capacity_service)
         self.deploy_operation = DeployOperation(self.networking_service,
                                                 self.namespace_service,
                                                 self.deployment_service,
-                                                self.vm_details_provider)
+                                                self.vm_details_provider,
+                                                warm_pod_pool=self.warm_pod_pool,
+                                                image_digest_resolver=self.image_digest_resolver,
+                                                capacity_service=self.capacity_service,
+                                                image_prepull_service=self.image_prepull_service)
         self.prepare_operation = PrepareSandboxInfraOperation(self.namespace_service)
         self.cleanup_operation = CleanupSandboxInfraOperation(self.namespace_service)
         self.delete_instance_operation = DeleteInstanceOperation(self.networking_service,
                                                                  self.deployment_service)
         self.power_operation = PowerOperation(self.deployment_service)
+        self.sandbox_power_operation = SandboxPowerOperation(self.namespace_service, self.deployment_service)
+        self.refresh_ip_operation = RefreshIpOperation(self.networking_service)
         self.vm_details_operation = VmDetialsOperation(self.networking_service, self.deployment_service,
-                                                       self.vm_details_provider)
+                                                       self.vm_details_provider, self.vm_details_cache)
 
     def initialize(self, context):
         """
@@ -71,9 +106,25 @@ class KubernetesDriver(ResourceDriverInterface):
         :return Attribute and sub-resource information for the Shell resource you can return an AutoLoadDetails object
         :rtype: AutoLoadDetails
         """
-        with LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+        with self.command_profiler.profile_command('get_inventory', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
             cloud_provider_resource = data_model.Kubernetes.create_from_context(context)
-            self.autoload_operation.validate_config(cloud_provider_resource)
+            self.autoload_operation.validate_config(cloud_provider_resource, logger)
+
+            clients = self.api_clients_provider.get_api_clients(cloud_provider_resource)
+
+            # a lowered pool size deletes the extra namespaces, prepare only tops up an enabled pool
+            self.namespace_service.top_up_pool(logger, clients, int(cloud_provider_resource.namespace_pool_size or 0))
+
+            # the pre-pull only speeds up deploys, a cluster without daemon set permissions is still valid
+            try:
+                self.image_prepull_service.refresh(logger, clients,
+                                                   int(cloud_provider_resource.prepull_images_count or 0))
+            except Exception:
+                logger.warning('Failed to refresh the image pre-pull daemon set', exc_info=True)
+
+            self.warm_pod_pool.warm_up(logger, clients, cloud_provider_resource.warm_pool_images,
+                                       int(cloud_provider_resource.warm_pool_size or 0))
 
         return AutoLoadDetails([], [])
 
@@ -90,7 +141,8 @@ class KubernetesDriver(ResourceDriverInterface):
         :return:
         :rtype: str
         """
-        with LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+        with self.command_profiler.profile_command('Deploy', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
             # parse the json strings into action objects
             actions = self.request_parser.convert_driver_request_to_actions(request)
 
@@ -111,34 +163,85 @@ class KubernetesDriver(ResourceDriverInterface):
                                                              clients,
                                                              cancellation_context)
 
-            return DriverResponse([deploy_result]).to_driver_response_json()
+            return encode_driver_response(DriverResponse([deploy_result]))
 
     def PowerOn(self, context, ports):
         """
         Will power on the compute resource
         :param ResourceRemoteCommandContext context:
         """
-        with LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+        with self.command_profiler.profile_command('PowerOn', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
             cloud_provider_resource = data_model.Kubernetes.create_from_context(context)
             clients = self.api_clients_provider.get_api_clients(cloud_provider_resource)
             deployed_app = DeployedAppResource(context.remote_endpoints[0])
 
-            self.power_operation.power_on(logger, clients, deployed_app)
+            self._run_app_operation(logger, clients, deployed_app, POWER_ON,
+                                    lambda: self.power_operation.power_on(logger, clients, deployed_app))
 
     def PowerOff(self, context, ports):
         """
         Will power off the compute resource
         :param ResourceRemoteCommandContext context:
         """
-        with LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+        with self.command_profiler.profile_command('PowerOff', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
             cloud_provider_resource = data_model.Kubernetes.create_from_context(context)
             clients = self.api_clients_provider.get_api_clients(cloud_provider_resource)
             deployed_app = DeployedAppResource(context.remote_endpoints[0])
 
-            self.power_operation.power_off(logger, clients, deployed_app)
+            self._run_app_operation(logger, clients, deployed_app, POWER_OFF,
+                                    lambda: self.power_operation.power_off(logger, clients, deployed_app))
 
     def PowerCycle(self, context, ports, delay):
-        pass
+        """
+        Will restart the pods of the compute resource with a rolling restart
+        :param ResourceRemoteCommandContext context:
+        :param ports:
+        :param delay: seconds to pause before the restart
+        """
+        with self.command_profiler.profile_command('PowerCycle', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+            cloud_provider_resource = data_model.Kubernetes.create_from_context(context)
+            clients = self.api_clients_provider.get_api_clients(cloud_provider_resource)
+            deployed_app = DeployedAppResource(context.remote_endpoints[0])
+
+            self._run_app_operation(logger, clients, deployed_app, POWER_CYCLE,
+                                    lambda: self.power_operation.power_cycle(logger, clients, deployed_app,
+                                                                             float(delay or 0)))
+
+    def PowerOnSandbox(self, context, cancellation_context):
+        """
+        Will power on all the apps of the sandbox, in the order of their Depends On attribute
+        :param ResourceCommandContext context:
+        :param CancellationContext cancellation_context:
+        :return: the power on time of every app
+        :rtype: str
+        """
+        with self.command_profiler.profile_command('PowerOnSandbox', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+            cloud_provider_resource = data_model.Kubernetes.create_from_context(context)
+            clients = self.api_clients_provider.get_api_clients(cloud_provider_resource)
+
+            results = self.sandbox_power_operation.power_on(logger, clients, context.reservation.reservation_id,
+                                                            cancellation_context)
+            return '\n'.join(str(result) for result in results)
+
+    def PowerOffSandbox(self, context, cancellation_context):
+        """
+        Will power off all the apps of the sandbox
+        :param ResourceCommandContext context:
+        :param CancellationContext cancellation_context:
+        :rtype: str
+        """
+        with self.command_profiler.profile_command('PowerOffSandbox', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+            cloud_provider_resource = data_model.Kubernetes.create_from_context(context)
+            clients = self.api_clients_provider.get_api_clients(cloud_provider_resource)
+
+            results = self.sandbox_power_operation.power_off(logger, clients, context.reservation.reservation_id,
+                                                             cancellation_context)
+            return '\n'.join(str(result) for result in results)
 
     def DeleteInstance(self, context, ports):
         """
@@ -146,16 +249,30 @@ class KubernetesDriver(ResourceDriverInterface):
         :param ResourceRemoteCommandContext context:
         :param ports:
         """
-        with LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+        with self.command_profiler.profile_command('DeleteInstance', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
             cloud_provider_resource = data_model.Kubernetes.create_from_context(context)
             clients = self.api_clients_provider.get_api_clients(cloud_provider_resource)
             deployed_app = DeployedAppResource(context.remote_endpoints[0])
 
-            self.delete_instance_operation.delete_instance(logger=logger,
-                                                           clients=clients,
-                                                           kubernetes_name=deployed_app.kubernetes_name,
-                                                           deployed_app_name=deployed_app.cloudshell_resource_name,
-                                                           namespace=deployed_app.namespace)
+            self._run_app_operation(logger, clients, deployed_app, DELETE_INSTANCE,
+                                    lambda: self.delete_instance_operation.delete_instance(
+                                        logger=logger,
+                                        clients=clients,
+                                        kubernetes_name=deployed_app.kubernetes_name,
+                                        deployed_app_name=deployed_app.cloudshell_resource_name,
+                                        namespace=deployed_app.namespace))
+
+    def _run_app_operation(self, logger, clients, deployed_app, operation_name, function):
+        """
+        :param Logger logger:
+        :param KubernetesClients clients:
+        :param DeployedAppResource deployed_app:
+        :param str operation_name:
+        :param callable function:
+        """
+        key = (clients.cluster_key, deployed_app.namespace, deployed_app.kubernetes_name)
+        return self.app_operation_queue.run(logger, key, operation_name, function)
 
     def GetVmDetails(self, context, requests, cancellation_context):
         """
@@ -165,21 +282,21 @@ class KubernetesDriver(ResourceDriverInterface):
         :param CancellationContext cancellation_context:
         :return:
         """
-        with LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+        with self.command_profiler.profile_command('GetVmDetails', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
             logger.info('GetVmDetails_context:')
             logger.info(context)
             logger.info('GetVmDetails_requests')
-            logger.info(requests)
+            logger.info(truncate_for_log(requests))
 
             cloud_provider_resource = data_model.Kubernetes.create_from_context(context)
             clients = self.api_clients_provider.get_api_clients(cloud_provider_resource)
             items_json = json.loads(requests)
 
-            result = self.vm_details_operation.create_vm_details_bulk(logger, clients, items_json)
+            vm_details = self.vm_details_operation.iter_vm_details(logger, clients, items_json, cancellation_context)
 
-            result_json = json.dumps(result, default=lambda o: o.__dict__, sort_keys=True, separators=(',', ':'))
-
-            return result_json
+            # every vm details object is encoded as soon as it is created and isn't kept after that
+            return ''.join(iter_encode_vm_details(vm_details))
 
     def remote_refresh_ip(self, context, ports, cancellation_context):
         """
@@ -189,7 +306,23 @@ class KubernetesDriver(ResourceDriverInterface):
         :param CancellationContext cancellation_context:
         :return:
         """
-        pass
+        with self.command_profiler.profile_command('remote_refresh_ip', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+            cloud_provider_resource = data_model.Kubernetes.create_from_context(context)
+            clients = self.api_clients_provider.get_api_clients(cloud_provider_resource)
+            resource = context.remote_endpoints[0]
+            deployed_app = DeployedAppResource(resource)
+
+            address = self.refresh_ip_operation.refresh_ip(logger, clients, deployed_app, cancellation_context)
+            if not address or address == resource.address:
+                logger.info('Address of app {} is up to date'.format(deployed_app.cloudshell_resource_name))
+                return
+
+            # the automation api is only needed by this command
+            from cloudshell.shell.core.session.cloudshell_session import CloudShellSessionContext
+            with CloudShellSessionContext(context) as api:
+                api.UpdateResourceAddress(resource.fullname, address)
+            logger.info('Address of app {} set to {}'.format(deployed_app.cloudshell_resource_name, address))
 
     # </editor-fold>
 
@@ -221,7 +354,8 @@ class KubernetesDriver(ResourceDriverInterface):
         :return:
         :rtype: str
         """
-        with LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+        with self.command_profiler.profile_command('PrepareSandboxInfra', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
             actions = self.request_parser.convert_driver_request_to_actions(request)
 
             cloud_provider_resource = data_model.Kubernetes.create_from_context(context)
@@ -230,9 +364,14 @@ class KubernetesDriver(ResourceDriverInterface):
             action_results = self.prepare_operation.prepare(logger,
                                                             context.reservation.reservation_id,
                                                             clients,
-                                                            actions)
+                                                            actions,
+                                                            int(cloud_provider_resource.namespace_pool_size or 0))
 
-            return DriverResponse(action_results).to_driver_response_json()
+            # the first deploy of a hot image in the sandbox finds a warm pod
+            self.warm_pod_pool.warm_up(logger, clients, cloud_provider_resource.warm_pool_images,
+                                       int(cloud_provider_resource.warm_pool_size or 0))
+
+            return encode_driver_response(DriverResponse(action_results))
 
     def CleanupSandboxInfra(self, context, request):
         """
@@ -242,7 +381,8 @@ class KubernetesDriver(ResourceDriverInterface):
         :return:
         :rtype: str
         """
-        with LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
+        with self.command_profiler.profile_command('CleanupSandboxInfra', context), \
+                LoggingSessionContext(context) as logger, ErrorHandlingContext(logger):
             actions = self.request_parser.convert_driver_request_to_actions(request)
             cleanup_action = single(actions, lambda x: isinstance(x, CleanupNetwork))
 
@@ -254,7 +394,7 @@ class KubernetesDriver(ResourceDriverInterface):
                                                            context.reservation.reservation_id,
                                                            cleanup_action)
 
-            return DriverResponse([action_result]).to_driver_response_json()
+            return encode_driver_response(DriverResponse([action_result]))
 
     # </editor-fold>
 
@@ -277,4 +417,5 @@ class KubernetesDriver(ResourceDriverInterface):
         Destroy the driver session, this function is called everytime a driver instance is destroyed
         This is a good place to close any open sessions, finish writing to log files, etc.
         """
-        pass
+        self.vm_details_cache.close()
+        self.capacity_service.stop()
@@ -1,14 +1,26 @@
-from kubernetes.client import ApiClient, CoreV1Api, AppsV1beta1Api
+from kubernetes.client import ApiClient, CoreV1Api, AppsV1beta1Api, AppsV1Api
 
 
 class KubernetesClients(object):
 
-    def __init__(self, api_client, core_api, apps_api):
+    def __init__(self, api_client, core_api, apps_api, apps_v1_api=None):
         """
         :param AppsV1beta1Api apps_api:
         :param ApiClient api_client:
         :param CoreV1Api core_api:
+        :param AppsV1Api apps_v1_api: for the daemon sets, which the apps/v1beta1 api doesn't serve
         """
         self._api_client = api_client
         self.apps_api = apps_api
         self.core_api = core_api
+        self.apps_v1_api = apps_v1_api
+
+    @property
+    def cluster_key(self):
+        """
+        Identifies the cluster and the credentials of the clients, reads of commands with the same key can be shared
+        :rtype: tuple
+        """
+        configuration = self.core_api.api_client.configuration
+        return (configuration.host, configuration.username, configuration.cert_file,
+                tuple(sorted((configuration.api_key or {}).items())))
@@ -1,25 +1,105 @@
 import json
+import threading
+from collections import OrderedDict
 
 from cloudshell.shell.core.driver_context import ResourceContextDetails
 
 from domain.common.additional_data_keys import DeployedAppAdditionalDataKeys
-from domain.common.utils import get_custom_params_value
+from domain.common.utils import create_custom_params_index
+
+_NOT_SET = object()
+
+
+class _ReadOnlyDict(dict):
+    """
+    A parsed json object shared by the commands of the driver process, a command that changes it would change it for
+    the concurrent commands of the same deployed app
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('The deployed app json is shared by the commands and is read only')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+
+
+def _to_read_only(value):
+    """
+    :return: the parsed json with read only dicts and tuples instead of lists
+    """
+    if isinstance(value, dict):
+        return _ReadOnlyDict((key, _to_read_only(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_to_read_only(item) for item in value)
+    return value
+
+
+class _DeployedAppJsonCache(object):
+    def __init__(self, max_size=1024):
+        """
+        Keeps the parsed deployed app json of the latest apps, the driver process serves many commands for the same
+        deployed apps and their json doesn't change. The cached values are read only, they are shared by the threads
+        of the concurrent commands.
+        :param int max_size:
+        """
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, deployed_app_json):
+        """
+        :param str deployed_app_json:
+        :return: read only, the lists of the json are tuples
+        :rtype: dict
+        """
+        with self._lock:
+            deployed_app_dict = self._items.pop(deployed_app_json, None)
+            if deployed_app_dict is not None:
+                self._items[deployed_app_json] = deployed_app_dict
+                return deployed_app_dict
+
+        deployed_app_dict = _to_read_only(json.loads(deployed_app_json))
+
+        with self._lock:
+            self._items[deployed_app_json] = deployed_app_dict
+            if len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return deployed_app_dict
+
+
+_deployed_app_json_cache = _DeployedAppJsonCache()
 
 
 class DeployedAppResource(object):
+    __slots__ = ('deployed_app_dict', 'vm_details', 'vm_custom_params', '_custom_params', '_namespace', '_replicas',
+                 '_wait_for_replicas_to_be_ready', '_wait_for_ip')
+
     def __init__(self, resource_context=None, deployed_app_dict=None):
         """
         :param ResourceContextDetails resource_context:
         """
         if resource_context:
             # self.app_request_dict = json.loads(resource_context.app_context.app_request_json)
-            self.deployed_app_dict = json.loads(resource_context.app_context.deployed_app_json)
+            self.deployed_app_dict = _deployed_app_json_cache.get(resource_context.app_context.deployed_app_json)
 
         elif deployed_app_dict:
             self.deployed_app_dict = deployed_app_dict
 
         self.vm_details = self.deployed_app_dict['vmdetails']
         self.vm_custom_params = self.vm_details['vmCustomParams']
+        self._custom_params = None
+        self._namespace = _NOT_SET
+        self._replicas = _NOT_SET
+        self._wait_for_replicas_to_be_ready = _NOT_SET
+        self._wait_for_ip = _NOT_SET
+
+    def get_custom_param(self, key):
+        """
+        :param str key:
+        :rtype: str
+        """
+        if self._custom_params is None:
+            self._custom_params = create_custom_params_index(self.vm_custom_params)
+        return self._custom_params.get(key)
 
     @property
     def cloudshell_resource_name(self):
@@ -34,12 +114,15 @@ class DeployedAppResource(object):
         """
         :rtype: str
         """
-        namespace = get_custom_params_value(self.vm_custom_params,
-                                            DeployedAppAdditionalDataKeys.NAMESPACE)
+        if self._namespace is not _NOT_SET:
+            return self._namespace
+
+        namespace = self.get_custom_param(DeployedAppAdditionalDataKeys.NAMESPACE)
         if not namespace:
             raise ValueError("Something went wrong. Couldn't get namespace from custom params for deployed app '{}'"
                              .format(self.cloudshell_resource_name))
 
+        self._namespace = namespace
         return namespace
 
     @property
@@ -47,28 +130,43 @@ class DeployedAppResource(object):
         """
         :rtype: int
         """
-        replicas_str = get_custom_params_value(self.vm_custom_params,
-                                               DeployedAppAdditionalDataKeys.REPLICAS)
+        if self._replicas is not _NOT_SET:
+            return self._replicas
+
+        replicas_str = self.get_custom_param(DeployedAppAdditionalDataKeys.REPLICAS)
         if not replicas_str:
             raise ValueError("Something went wrong. Couldn't get replicas from custom params for deployed app '{}'"
                              .format(self.cloudshell_resource_name))
 
         try:
-            return int(replicas_str)
+            self._replicas = int(replicas_str)
         except:
             raise ValueError("Something went wrong. Couldn't parse replicas value {replicas} from custom params data "
                              "for deployed app '{deployed_app}' "
                              .format(deployed_app=self.cloudshell_resource_name, replicas=replicas_str))
+        return self._replicas
 
     @property
     def wait_for_replicas_to_be_ready(self):
         """
         :rtype: int
         """
-        wait_for_replicas = get_custom_params_value(self.vm_custom_params,
-                                                    DeployedAppAdditionalDataKeys.WAIT_FOR_REPLICAS_TO_BE_READY)
-        if not wait_for_replicas:
-            return 0
+        if self._wait_for_replicas_to_be_ready is not _NOT_SET:
+            return self._wait_for_replicas_to_be_ready
+
+        wait_for_replicas = self.get_custom_param(DeployedAppAdditionalDataKeys.WAIT_FOR_REPLICAS_TO_BE_READY)
+        self._wait_for_replicas_to_be_ready = int(wait_for_replicas) if wait_for_replicas else 0
+        return self._wait_for_replicas_to_be_ready
 
-        return int(wait_for_replicas)
+    @property
+    def wait_for_ip(self):
+        """
+        :rtype: bool
+        """
+        if self._wait_for_ip is not _NOT_SET:
+            return self._wait_for_ip
 
+        # apps deployed before the attribute was stored wait like the attribute default
+        wait_for_ip = self.get_custom_param(DeployedAppAdditionalDataKeys.WAIT_FOR_IP)
+        self._wait_for_ip = str(wait_for_ip).lower() == 'true' if wait_for_ip is not None else True
+        return self._wait_for_ip
@@ -1,17 +1,23 @@
 from typing import List, Dict
 
 
-class ApplicationImage:
-    def __init__(self, name, tag):
+class ApplicationImage(object):
+    __slots__ = ('tag', 'name', 'digest')
+
+    def __init__(self, name, tag, digest=None):
         """
         :param str name:
         :param str tag:
+        :param str digest: the digest the tag resolved to, e.g. 'sha256:...', pins the container image
         """
         self.tag = tag
         self.name = name
+        self.digest = digest
+
 
+class AppComputeSpecKubernetesResources(object):
+    __slots__ = ('cpu', 'ram')
 
-class AppComputeSpecKubernetesResources:
     def __init__(self, cpu, ram):
         """
         :param str cpu:
@@ -21,7 +27,9 @@ class AppComputeSpecKubernetesResources:
         self.ram = ram
 
 
-class AppComputeSpecKubernetes:
+class AppComputeSpecKubernetes(object):
+    __slots__ = ('limits', 'requests')
+
     def __init__(self, requests, limits):
         """
         :param AppComputeSpecKubernetesResources requests:
@@ -31,9 +39,12 @@ class AppComputeSpecKubernetes:
         self.requests = requests
 
 
-class AppDeploymentRequest:
+class AppDeploymentRequest(object):
+    __slots__ = ('environment_variables', 'start_command', 'compute_spec', 'replicas', 'internal_ports',
+                 'external_ports', 'image', 'name', 'wait_for_replicas', 'depends_on', 'preferred_node')
+
     def __init__(self, name, image, start_command, environment_variables, compute_spec, internal_ports, external_ports,
-                 replicas=1):
+                 replicas=1, wait_for_replicas=0, depends_on=None, preferred_node=None):
         """
         :param str start_command:
         :param Dict[str, str] environment_variables:
@@ -43,11 +54,18 @@ class AppDeploymentRequest:
         :param List[int] internal_ports:
         :param List[int] external_ports:
         :param int replicas:
+        :param int wait_for_replicas: seconds to wait for the replicas when the app is powered on
+        :param List[str] depends_on: names of the apps of the sandbox that must be ready before this app
+        :param str preferred_node: the hostname label of the node the pods should run on, e.g. a node that already
+        has the image
         """
         self.environment_variables = environment_variables
         self.start_command = start_command
         self.compute_spec = compute_spec
         self.replicas = replicas
+        self.wait_for_replicas = wait_for_replicas
+        self.depends_on = depends_on or []
+        self.preferred_node = preferred_node
         self.internal_ports = internal_ports
         self.external_ports = external_ports
         self.image = image
@@ -0,0 +1,24 @@
+class AppPowerResult(object):
+    __slots__ = ('name', 'wave', 'replicas', 'seconds', 'failure')
+
+    def __init__(self, name, wave, replicas=None, seconds=None, failure=None):
+        """
+        :param str name: the kubernetes name of the app
+        :param int wave: the apps of a wave are powered on together, after the apps of the previous waves are ready
+        :param int replicas: the replicas the app was scaled to
+        :param float seconds: the time it took the replicas to be ready, None when they weren't waited for
+        :param str failure: why the app wasn't powered on
+        """
+        self.name = name
+        self.wave = wave
+        self.replicas = replicas
+        self.seconds = seconds
+        self.failure = failure
+
+    def __str__(self):
+        if self.failure:
+            return 'wave {}: {} failed, {}'.format(self.wave, self.name, self.failure)
+        if self.seconds is None:
+            return 'wave {}: {} scaled to {} replicas'.format(self.wave, self.name, self.replicas)
+        return 'wave {}: {} scaled to {} replicas, ready in {:.1f} seconds'.format(self.wave, self.name,
+                                                                                 self.replicas, self.seconds)
@@ -0,0 +1,891 @@
+"""
+In-process stand-in for the Kubernetes apiserver.
+
+Speaks the REST paths used by the driver (namespaces, nodes, services, pods, events and apps deployments)
+including list+watch and deletecollection, and simulates the controllers the driver waits on: deployments get
+pods which become ready after a configurable delay, LoadBalancer services get an ingress address and deleted
+namespaces go through the Terminating phase. Latency and errors can be injected per request.
+
+Usage:
+    with FakeKubernetesApiServer(readiness_delay=0.5) as server:
+        config_file_path = server.write_kubeconfig(os.path.join(tmp_dir, 'config'))
+        clients = ApiClientsProvider().get_api_clients(Mock(config_file_path=config_file_path))
+"""
+import copy
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+CLUSTER_SCOPED_RESOURCES = {'namespaces', 'nodes'}
+
+KINDS = {
+    'namespaces': 'Namespace',
+    'nodes': 'Node',
+    'services': 'Service',
+    'pods': 'Pod',
+    'events': 'Event',
+    'deployments': 'Deployment',
+    'daemonsets': 'DaemonSet',
+    'configmaps': 'ConfigMap',
+}
+
+DEPLOYMENTS = ('apps/v1beta1', 'deployments')
+PODS = ('v1', 'pods')
+SERVICES = ('v1', 'services')
+NAMESPACES = ('v1', 'namespaces')
+NODES = ('v1', 'nodes')
+EVENTS = ('v1', 'events')
+DAEMON_SETS = ('apps/v1', 'daemonsets')
+CONFIG_MAPS = ('v1', 'configmaps')
+
+
+class ApiError(Exception):
+    def __init__(self, status, reason, message=''):
+        super(ApiError, self).__init__(message or reason)
+        self.status = status
+        self.reason = reason
+        self.message = message or reason
+
+    def to_status(self):
+        return {'kind': 'Status', 'apiVersion': 'v1', 'metadata': {}, 'status': 'Failure',
+                'message': self.message, 'reason': self.reason, 'code': self.status}
+
+
+def _now():
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _parse_label_selector(selector):
+    """
+    Supports the equality based selector syntax: 'k=v', 'k==v', 'k!=v', 'k' and '!k'
+    :rtype: list
+    """
+    requirements = []
+    for term in (selector or '').split(','):
+        term = term.strip()
+        if not term:
+            continue
+        if '!=' in term:
+            key, value = term.split('!=', 1)
+            requirements.append(('!=', key.strip(), value.strip()))
+        elif '==' in term:
+            key, value = term.split('==', 1)
+            requirements.append(('=', key.strip(), value.strip()))
+        elif '=' in term:
+            key, value = term.split('=', 1)
+            requirements.append(('=', key.strip(), value.strip()))
+        elif term.startswith('!'):
+            requirements.append(('!', term[1:].strip(), None))
+        else:
+            requirements.append(('exists', term, None))
+    return requirements
+
+
+def _matches_labels(labels, requirements):
+    labels = labels or {}
+    for operator, key, value in requirements:
+        if operator == '=' and labels.get(key) != value:
+            return False
+        if operator == '!=' and labels.get(key) == value:
+            return False
+        if operator == 'exists' and key not in labels:
+            return False
+        if operator == '!' and key in labels:
+            return False
+    return True
+
+
+def _matches_fields(obj, field_selector):
+    for term in (field_selector or '').split(','):
+        term = term.strip()
+        if not term:
+            continue
+        negate = '!=' in term
+        path, value = re.split('!=|==|=', term, 1)
+        current = obj
+        for part in path.strip().split('.'):
+            current = current.get(part) if isinstance(current, dict) else None
+        if (current == value.strip()) == negate:
+            return False
+    return True
+
+
+def _merge_patch(target, patch):
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge_patch(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+def _json_patch(target, operations):
+    for operation in operations:
+        parts = [p.replace('~1', '/').replace('~0', '~') for p in operation['path'].lstrip('/').split('/')]
+        parent = target
+        for part in parts[:-1]:
+            parent = parent[int(part)] if isinstance(parent, list) else parent.setdefault(part, {})
+        last = parts[-1]
+        if operation['op'] in ('add', 'replace'):
+            if isinstance(parent, list):
+                if last == '-':
+                    parent.append(operation['value'])
+                else:
+                    parent[int(last)] = operation['value']
+            else:
+                parent[last] = operation['value']
+        elif operation['op'] == 'remove':
+            if isinstance(parent, list):
+                del parent[int(last)]
+            else:
+                parent.pop(last, None)
+        else:
+            raise ApiError(422, 'Invalid', "Unsupported patch operation '{}'".format(operation['op']))
+
+
+class _ErrorRule(object):
+    def __init__(self, method, path_pattern, status, reason, count):
+        self.method = method
+        self.path_pattern = re.compile(path_pattern)
+        self.status = status
+        self.reason = reason
+        self.remaining = count
+
+    def matches(self, method, path):
+        if self.remaining == 0:
+            return False
+        if self.method and self.method != method:
+            return False
+        return bool(self.path_pattern.search(path))
+
+
+def write_kubeconfig(server_url, path):
+    """
+    Writes a kubeconfig file pointing at the server url and returns its path
+    :param str server_url:
+    :param str path:
+    :rtype: str
+    """
+    kubeconfig = ("apiVersion: v1\n"
+                  "kind: Config\n"
+                  "clusters:\n"
+                  "- cluster:\n"
+                  "    server: {server}\n"
+                  "  name: fake-cluster\n"
+                  "contexts:\n"
+                  "- context:\n"
+                  "    cluster: fake-cluster\n"
+                  "    user: fake-user\n"
+                  "  name: fake-context\n"
+                  "current-context: fake-context\n"
+                  "preferences: {{}}\n"
+                  "users:\n"
+                  "- name: fake-user\n"
+                  "  user:\n"
+                  "    token: fake-token\n").format(server=server_url)
+    with open(path, 'w') as f:
+        f.write(kubeconfig)
+    return path
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        thread = threading.Thread(target=self.process_request_thread, args=(request, client_address))
+        thread.daemon = True
+        with self._connections_lock:
+            self._connections[thread] = request
+        thread.start()
+
+    def process_request_thread(self, request, client_address):
+        try:
+            ThreadingMixIn.process_request_thread(self, request, client_address)
+        finally:
+            with self._connections_lock:
+                self._connections.pop(threading.current_thread(), None)
+
+    def handle_error(self, request, client_address):
+        # clients dropping keep-alive connections is expected, don't spam stderr
+        pass
+
+    def close_connections(self, timeout=5):
+        """
+        Closes the open keep-alive and watch connections and waits for their handler threads
+        """
+        with self._connections_lock:
+            connections = list(self._connections.items())
+        for thread, request in connections:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except (IOError, OSError):
+                pass
+        for thread, _ in connections:
+            thread.join(timeout)
+
+
+class FakeKubernetesApiServer(object):
+
+    def __init__(self, latency=0, readiness_delay=0, load_balancer_delay=0, namespace_termination_delay=0,
+                 watch_timeout=30, host='127.0.0.1', port=0):
+        """
+        :param float latency: seconds added to every request
+        :param float readiness_delay: seconds from pod creation until it becomes ready
+        :param float load_balancer_delay: seconds until LoadBalancer services get an ingress ip. None means never
+        :param float namespace_termination_delay: seconds a deleted namespace stays in Terminating phase
+        :param int watch_timeout: default timeout for watch requests that don't specify timeoutSeconds
+        """
+        self.latency = latency
+        self.readiness_delay = readiness_delay
+        self.load_balancer_delay = load_balancer_delay
+        self.namespace_termination_delay = namespace_termination_delay
+        self.watch_timeout = watch_timeout
+
+        self.requests = []
+        self.image_failures = {}
+
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._store = {}
+        self._timestamps = {}
+        self._events = []
+        self._resource_version = 0
+        self._error_rules = []
+        self._next_ip = 1
+        self._next_node_port = 30000
+        self._stopped = threading.Event()
+
+        self._httpd = _ThreadingHTTPServer((host, port), self._make_handler())
+        self._server_thread = None
+        self._controller_thread = None
+
+        self.add_node('fake-node-1')
+
+    # <editor-fold desc="Lifecycle">
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._server_thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), name='fake-apiserver')
+        self._server_thread.daemon = True
+        self._server_thread.start()
+        self._controller_thread = threading.Thread(target=self._run_controllers, name='fake-apiserver-controllers')
+        self._controller_thread.daemon = True
+        self._controller_thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._changed:
+            self._changed.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._httpd.close_connections()
+        self._controller_thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    def write_kubeconfig(self, path):
+        """
+        Writes a kubeconfig file pointing at this server and returns its path
+        :param str path:
+        :rtype: str
+        """
+        return write_kubeconfig(self.url, path)
+
+    # </editor-fold>
+
+    # <editor-fold desc="Test helpers">
+
+    def inject_error(self, method=None, path_pattern='.*', status=500, reason='InternalError', count=1):
+        """
+        Makes the next 'count' requests matching method and path_pattern fail. count=-1 fails them forever.
+        """
+        with self._lock:
+            self._error_rules.append(_ErrorRule(method, path_pattern, status, reason, count))
+
+    def clear_errors(self):
+        with self._lock:
+            self._error_rules = []
+
+    def fail_image(self, image, reason='ImagePullBackOff', message='Back-off pulling image'):
+        """
+        Pods using the image never start and report 'reason' as the waiting reason of the container
+        """
+        with self._lock:
+            self.image_failures[image] = (reason, message)
+
+    def add_node(self, name, cpu='4', memory='8Gi', pods='110'):
+        with self._lock:
+            resources = {'cpu': cpu, 'memory': memory, 'pods': pods}
+            self._put(NODES, None, {
+                'metadata': {'name': name, 'labels': {'kubernetes.io/hostname': name}},
+                'spec': {},
+                'status': {'capacity': dict(resources), 'allocatable': dict(resources),
+                           'conditions': [{'type': 'Ready', 'status': 'True'}]}})
+
+    def reset_requests(self):
+        with self._lock:
+            self.requests = []
+
+    @property
+    def request_count(self):
+        return len(self.requests)
+
+    def get_object(self, resource, namespace, name):
+        """
+        :param tuple resource: (group version, plural), for example ('apps/v1beta1', 'deployments')
+        :rtype: dict
+        """
+        with self._lock:
+            obj = self._store.get(resource, {}).get((namespace, name))
+            return copy.deepcopy(obj)
+
+    def list_objects(self, resource, namespace=None):
+        with self._lock:
+            return [copy.deepcopy(obj) for (ns, _), obj in self._store.get(resource, {}).items()
+                    if namespace is None or ns == namespace]
+
+    # </editor-fold>
+
+    # <editor-fold desc="Store">
+
+    def _bump(self):
+        self._resource_version += 1
+        return str(self._resource_version)
+
+    def _notify(self, event_type, resource, obj):
+        self._events.append((self._resource_version, resource, event_type, copy.deepcopy(obj)))
+        if len(self._events) > 10000:
+            self._events = self._events[-5000:]
+        self._changed.notify_all()
+
+    def _put(self, resource, namespace, obj, event_type=None):
+        metadata = obj.setdefault('metadata', {})
+        if namespace is not None:
+            metadata['namespace'] = namespace
+        key = (namespace, metadata['name'])
+        objects = self._store.setdefault(resource, {})
+        if event_type is None:
+            event_type = 'MODIFIED' if key in objects else 'ADDED'
+        metadata.setdefault('uid', str(uuid.uuid4()))
+        metadata.setdefault('creationTimestamp', _now())
+        metadata['resourceVersion'] = self._bump()
+        obj['kind'] = KINDS.get(resource[1], obj.get('kind'))
+        obj['apiVersion'] = resource[0]
+        objects[key] = obj
+        self._notify(event_type, resource, obj)
+        return obj
+
+    def _remove(self, resource, namespace, name):
+        obj = self._store.get(resource, {}).pop((namespace, name), None)
+        if obj is not None:
+            self._timestamps.pop(obj['metadata']['uid'], None)
+            obj['metadata']['resourceVersion'] = self._bump()
+            self._notify('DELETED', resource, obj)
+        return obj
+
+    def _get(self, resource, namespace, name):
+        obj = self._store.get(resource, {}).get((namespace, name))
+        if obj is None:
+            raise ApiError(404, 'NotFound', '{} "{}" not found'.format(resource[1], name))
+        return obj
+
+    def _list(self, resource, namespace, label_selector, field_selector):
+        requirements = _parse_label_selector(label_selector)
+        return [obj for (ns, _), obj in sorted(self._store.get(resource, {}).items())
+                if (namespace is None or ns == namespace)
+                and _matches_labels(obj['metadata'].get('labels'), requirements)
+                and _matches_fields(obj, field_selector)]
+
+    # </editor-fold>
+
+    # <editor-fold desc="REST">
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                # headers and body are written separately, without this every response waits for a delayed ack
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, 'GET')
+
+            def do_POST(self):
+                server._handle(self, 'POST')
+
+            def do_PUT(self):
+                server._handle(self, 'PUT')
+
+            def do_PATCH(self):
+                server._handle(self, 'PATCH')
+
+            def do_DELETE(self):
+                server._handle(self, 'DELETE')
+
+        return Handler
+
+    def _handle(self, handler, method):
+        parsed = urlparse(handler.path)
+        query = dict((k, v[-1]) for k, v in parse_qs(parsed.query).items())
+        length = int(handler.headers.get('Content-Length') or 0)
+        raw_body = handler.rfile.read(length) if length else None
+
+        with self._lock:
+            self.requests.append((method, parsed.path, query))
+            error_rule = next((rule for rule in self._error_rules if rule.matches(method, parsed.path)), None)
+            if error_rule:
+                error_rule.remaining -= 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        try:
+            if error_rule:
+                raise ApiError(error_rule.status, error_rule.reason, 'Injected error')
+
+            body = json.loads(raw_body.decode('utf8')) if raw_body else None
+            route = self._route(parsed.path)
+
+            if method == 'GET' and query.get('watch', '').lower() in ('true', '1'):
+                self._watch(handler, route, query)
+                return
+
+            with self._lock:
+                status, response = self._dispatch(method, route, query, body)
+                # serialize while holding the lock, the controllers keep changing the stored objects
+                data = json.dumps(response)
+        except ApiError as e:
+            status, data = e.status, json.dumps(e.to_status())
+        except Exception as e:
+            status, data = 500, json.dumps(ApiError(500, 'InternalError', str(e)).to_status())
+
+        self._send_json(handler, status, data)
+
+    def _send_json(self, handler, status, data):
+        data = data.encode('utf8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _route(self, path):
+        """
+        :return: (resource, namespace, name, subresource)
+        """
+        parts = [p for p in path.split('/') if p]
+        if parts[:2] == ['api', 'v1']:
+            group_version, parts = 'v1', parts[2:]
+        elif parts and parts[0] == 'apis' and len(parts) >= 3:
+            group_version, parts = '{}/{}'.format(parts[1], parts[2]), parts[3:]
+        else:
+            raise ApiError(404, 'NotFound', 'Unknown path {}'.format(path))
+
+        namespace = None
+        if len(parts) >= 3 and parts[0] == 'namespaces' and parts[2] in KINDS:
+            namespace, parts = parts[1], parts[2:]
+
+        if not parts or parts[0] not in KINDS:
+            raise ApiError(404, 'NotFound', 'Unknown path {}'.format(path))
+
+        plural = parts[0]
+        name = parts[1] if len(parts) > 1 else None
+        subresource = parts[2] if len(parts) > 2 else None
+        return (group_version, plural), namespace, name, subresource
+
+    def _dispatch(self, method, route, query, body):
+        resource, namespace, name, subresource = route
+        label_selector = query.get('labelSelector')
+        field_selector = query.get('fieldSelector')
+
+        if name is None:
+            if method == 'GET':
+                items = self._list(resource, namespace, label_selector, field_selector)
+                return 200, {'kind': KINDS[resource[1]] + 'List', 'apiVersion': resource[0],
+                             'metadata': {'resourceVersion': str(self._resource_version)},
+                             'items': items}
+            if method == 'POST':
+                return 201, self._create(resource, namespace, body)
+            if method == 'DELETE':
+                for obj in self._list(resource, namespace, label_selector, field_selector):
+                    self._delete(resource, namespace, obj['metadata']['name'])
+                return 200, self._success_status(resource, None)
+        else:
+            if method == 'GET':
+                return 200, self._get(resource, namespace, name)
+            if method == 'PATCH':
+                return 200, self._patch(resource, namespace, name, body, subresource)
+            if method == 'PUT':
+                return 200, self._replace(resource, namespace, name, body, subresource)
+            if method == 'DELETE':
+                self._delete(resource, namespace, name)
+                return 200, self._success_status(resource, name)
+
+        raise ApiError(405, 'MethodNotAllowed', '{} is not supported on this path'.format(method))
+
+    def _success_status(self, resource, name):
+        return {'kind': 'Status', 'apiVersion': 'v1', 'metadata': {}, 'status': 'Success',
+                'details': {'name': name, 'kind': resource[1]}}
+
+    def _create(self, resource, namespace, body):
+        if resource[1] not in CLUSTER_SCOPED_RESOURCES and namespace is None:
+            raise ApiError(405, 'MethodNotAllowed', 'Namespace is required')
+        if namespace is not None and resource != NAMESPACES:
+            owner = self._store.get(NAMESPACES, {}).get((None, namespace))
+            if owner is None:
+                raise ApiError(404, 'NotFound', 'namespaces "{}" not found'.format(namespace))
+            if owner['status'].get('phase') == 'Terminating':
+                raise ApiError(403, 'Forbidden', 'namespace {} is being terminated'.format(namespace))
+
+        obj = copy.deepcopy(body)
+        metadata = obj.setdefault('metadata', {})
+        if not metadata.get('name') and metadata.get('generateName'):
+            metadata['name'] = metadata['generateName'] + uuid.uuid4().hex[:5]
+        if (namespace, metadata.get('name')) in self._store.get(resource, {}):
+            raise ApiError(409, 'AlreadyExists', '{} "{}" already exists'.format(resource[1], metadata.get('name')))
+
+        for key in ('uid', 'resourceVersion', 'creationTimestamp', 'deletionTimestamp'):
+            metadata.pop(key, None)
+        obj['status'] = {}
+        self._on_create(resource, obj)
+        return self._put(resource, namespace, obj, 'ADDED')
+
+    def _patch(self, resource, namespace, name, body, subresource):
+        current = self._get(resource, namespace, name)
+        updated = copy.deepcopy(current)
+        if isinstance(body, list):
+            _json_patch(updated, body)
+        else:
+            body = copy.deepcopy(body)
+            expected_version = (body.get('metadata') or {}).pop('resourceVersion', None)
+            if expected_version and expected_version != current['metadata']['resourceVersion']:
+                raise ApiError(409, 'Conflict', 'the object has been modified; please apply your changes to the '
+                                                'latest version and try again')
+            if subresource != 'status':
+                body.pop('status', None)
+            for key in ('uid', 'creationTimestamp', 'generation'):
+                (body.get('metadata') or {}).pop(key, None)
+            _merge_patch(updated, body)
+        return self._update(resource, current, updated)
+
+    def _replace(self, resource, namespace, name, body, subresource):
+        current = self._get(resource, namespace, name)
+        expected_version = (body.get('metadata') or {}).get('resourceVersion')
+        if expected_version and expected_version != current['metadata']['resourceVersion']:
+            raise ApiError(409, 'Conflict', 'the object has been modified')
+        updated = copy.deepcopy(body)
+        updated['metadata'] = dict(current['metadata'], **{k: v for k, v in updated.get('metadata', {}).items()
+                                                            if k in ('labels', 'annotations')})
+        if subresource != 'status':
+            updated['status'] = current.get('status', {})
+        return self._update(resource, current, updated)
+
+    def _update(self, resource, current, updated):
+        if updated.get('spec') != current.get('spec') and 'generation' in current['metadata']:
+            updated['metadata']['generation'] = current['metadata']['generation'] + 1
+        namespace = current['metadata'].get('namespace')
+        self._store[resource][(namespace, current['metadata']['name'])] = updated
+        return self._put(resource, namespace, updated, 'MODIFIED')
+
+    def _delete(self, resource, namespace, name):
+        obj = self._get(resource, namespace, name)
+        if resource == NAMESPACES:
+            if obj['status'].get('phase') != 'Terminating':
+                obj['status']['phase'] = 'Terminating'
+                obj['metadata']['deletionTimestamp'] = _now()
+                self._timestamps[obj['metadata']['uid']] = time.time() + self.namespace_termination_delay
+                self._put(resource, None, obj, 'MODIFIED')
+            return
+
+        self._remove(resource, namespace, name)
+        if resource == DEPLOYMENTS:
+            for pod in self._pods_of(obj):
+                self._remove(PODS, namespace, pod['metadata']['name'])
+
+    # </editor-fold>
+
+    # <editor-fold desc="Watch">
+
+    def _watch(self, handler, route, query):
+        resource, namespace, name, _ = route
+        requirements = _parse_label_selector(query.get('labelSelector'))
+        field_selector = query.get('fieldSelector')
+        timeout = float(query.get('timeoutSeconds') or self.watch_timeout)
+        deadline = time.time() + timeout
+
+        def matches(obj):
+            metadata = obj['metadata']
+            return (namespace is None or metadata.get('namespace') == namespace) and \
+                   (name is None or metadata['name'] == name) and \
+                   _matches_labels(metadata.get('labels'), requirements) and \
+                   _matches_fields(obj, field_selector)
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        with self._lock:
+            resource_version = query.get('resourceVersion')
+            if resource_version and resource_version != '0':
+                since = int(resource_version)
+                if self._events and self._events[0][0] > since + 1 and since < self._resource_version:
+                    pending = [{'type': 'ERROR', 'object': ApiError(410, 'Expired', 'too old resource version')
+                                .to_status()}]
+                    deadline = 0
+                else:
+                    pending = []
+            else:
+                since = self._resource_version
+                pending = [{'type': 'ADDED', 'object': copy.deepcopy(obj)}
+                           for obj in self._list(resource, namespace, query.get('labelSelector'), field_selector)
+                           if name is None or obj['metadata']['name'] == name]
+
+        try:
+            while True:
+                for event in pending:
+                    self._write_chunk(handler, json.dumps(event) + '\n')
+                pending = []
+
+                with self._lock:
+                    remaining = deadline - time.time()
+                    if remaining <= 0 or self._stopped.is_set():
+                        break
+                    new_events = [e for e in self._events if e[0] > since]
+                    if not new_events:
+                        self._changed.wait(min(remaining, 1))
+                        new_events = [e for e in self._events if e[0] > since]
+                    for version, event_resource, event_type, obj in new_events:
+                        since = max(since, version)
+                        if event_resource == resource and matches(obj):
+                            pending.append({'type': event_type, 'object': obj})
+            self._write_chunk(handler, '')
+        except (IOError, OSError):
+            # the client closed the watch
+            pass
+
+    def _write_chunk(self, handler, data):
+        data = data.encode('utf8')
+        handler.wfile.write('{:x}\r\n'.format(len(data)).encode('ascii') + data + b'\r\n')
+        handler.wfile.flush()
+
+    # </editor-fold>
+
+    # <editor-fold desc="Controllers">
+
+    def _on_create(self, resource, obj):
+        metadata = obj['metadata']
+        if resource == NAMESPACES:
+            obj['status'] = {'phase': 'Active'}
+        elif resource == DEPLOYMENTS:
+            metadata['generation'] = 1
+            # apps/v1beta1 defaults the deployment labels to the pod template labels
+            if not metadata.get('labels'):
+                metadata['labels'] = dict(obj['spec']['template']['metadata'].get('labels') or {})
+            obj['spec'].setdefault('replicas', 1)
+            obj['spec'].setdefault('strategy', {'type': 'RollingUpdate',
+                                                'rollingUpdate': {'maxSurge': 1, 'maxUnavailable': 1}})
+            obj['spec'].setdefault('selector', {'matchLabels': dict(obj['spec']['template']['metadata']
+                                                                    .get('labels') or {})})
+        elif resource == SERVICES:
+            spec = obj.setdefault('spec', {})
+            spec.setdefault('type', 'ClusterIP')
+            spec['clusterIP'] = '10.96.{}.{}'.format(self._next_ip // 250, self._next_ip % 250 + 1)
+            self._next_ip += 1
+            for port in spec.get('ports') or []:
+                port.setdefault('targetPort', port.get('port'))
+                if spec['type'] in ('NodePort', 'LoadBalancer') and not port.get('nodePort'):
+                    port['nodePort'] = self._next_node_port
+                    self._next_node_port += 1
+            obj['status'] = {'loadBalancer': {}}
+        elif resource == DAEMON_SETS:
+            # the counters are required by the client models, no daemon set pods are run
+            obj['status'] = {'currentNumberScheduled': 0, 'desiredNumberScheduled': 0, 'numberMisscheduled': 0,
+                             'numberReady': 0}
+        elif resource == PODS and not metadata.get('ownerReferences'):
+            # standalone pods are scheduled and started like the pods of the deployments
+            obj['spec'].setdefault('nodeName', 'fake-node-1')
+            obj['status'] = {'phase': 'Pending',
+                             'containerStatuses': [self._container_status(c, False, 'ContainerCreating', '')
+                                                   for c in obj['spec']['containers']]}
+
+    def _created_at(self, obj):
+        return self._timestamps.setdefault(obj['metadata']['uid'], time.time())
+
+    def _run_controllers(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                try:
+                    self._reconcile()
+                except Exception:
+                    # keep the fake controllers running, a broken object should not stop the server
+                    pass
+            self._stopped.wait(0.02)
+
+    def _reconcile(self):
+        now = time.time()
+        for (_, name), namespace in list(self._store.get(NAMESPACES, {}).items()):
+            if namespace['status'].get('phase') == 'Terminating' and \
+                    now >= self._timestamps.get(namespace['metadata']['uid'], 0):
+                for resource in list(self._store.keys()):
+                    for ns, obj_name in [key for key in self._store[resource].keys() if key[0] == name]:
+                        self._remove(resource, ns, obj_name)
+                self._remove(NAMESPACES, None, name)
+
+        for service in list(self._store.get(SERVICES, {}).values()):
+            if service['spec'].get('type') == 'LoadBalancer' and not service['status']['loadBalancer'] and \
+                    self.load_balancer_delay is not None and now - self._created_at(service) >= self.load_balancer_delay:
+                index = int(service['spec']['clusterIP'].split('.')[-1])
+                service['status']['loadBalancer'] = {'ingress': [{'ip': '203.0.113.{}'.format(index)}]}
+                self._put(SERVICES, service['metadata']['namespace'], service, 'MODIFIED')
+
+        for deployment in list(self._store.get(DEPLOYMENTS, {}).values()):
+            self._reconcile_deployment(deployment, now)
+
+        for pod in list(self._store.get(PODS, {}).values()):
+            if not pod['metadata'].get('ownerReferences'):
+                self._reconcile_pod(pod, now)
+
+    def _template_hash(self, deployment):
+        template = json.dumps(deployment['spec']['template'], sort_keys=True).encode('utf8')
+        return hashlib.md5(template).hexdigest()[:10]
+
+    def _pods_of(self, deployment):
+        namespace = deployment['metadata']['namespace']
+        owner = deployment['metadata']['uid']
+        return [pod for (ns, _), pod in sorted(self._store.get(PODS, {}).items())
+                if ns == namespace and owner in [o['uid'] for o in pod['metadata'].get('ownerReferences') or []]]
+
+    def _reconcile_deployment(self, deployment, now):
+        namespace = deployment['metadata']['namespace']
+        template_hash = self._template_hash(deployment)
+        desired = deployment['spec'].get('replicas', 1)
+        pods = self._pods_of(deployment)
+        current = [p for p in pods if p['metadata']['labels'].get('pod-template-hash') == template_hash]
+        old = [p for p in pods if p not in current]
+
+        for pod in current + old:
+            self._reconcile_pod(pod, now)
+
+        # rolling update: only remove old pods once the new ones are ready
+        ready_current = [p for p in current if self._is_ready(p)]
+        surplus_old = len(old) - max(0, desired - len(ready_current))
+        for pod in old[:max(0, surplus_old)]:
+            self._remove(PODS, namespace, pod['metadata']['name'])
+            old.remove(pod)
+
+        for pod in current[desired:]:
+            self._remove(PODS, namespace, pod['metadata']['name'])
+        current = current[:desired]
+        while len(current) < desired:
+            current.append(self._create_pod(deployment, template_hash, now))
+
+        pods = current + old
+        ready = len([p for p in pods if self._is_ready(p)])
+        status = {'observedGeneration': deployment['metadata']['generation']}
+        for key, value in (('replicas', len(pods)),
+                           ('updatedReplicas', len(current)),
+                           ('readyReplicas', ready),
+                           ('availableReplicas', ready),
+                           ('unavailableReplicas', len(pods) - ready)):
+            # the apiserver omits zero values
+            if value:
+                status[key] = value
+
+        if status != deployment.get('status'):
+            deployment['status'] = status
+            self._put(DEPLOYMENTS, namespace, deployment, 'MODIFIED')
+
+    def _create_pod(self, deployment, template_hash, now):
+        template = copy.deepcopy(deployment['spec']['template'])
+        labels = dict(template['metadata'].get('labels') or {})
+        labels['pod-template-hash'] = template_hash
+        name = '{}-{}-{}'.format(deployment['metadata']['name'], template_hash, uuid.uuid4().hex[:5])
+        containers = template['spec']['containers']
+        pod = {'metadata': {'name': name, 'labels': labels,
+                            'annotations': template['metadata'].get('annotations') or {},
+                            'ownerReferences': [{'apiVersion': DEPLOYMENTS[0], 'kind': 'Deployment',
+                                                 'name': deployment['metadata']['name'],
+                                                 'uid': deployment['metadata']['uid'], 'controller': True}]},
+               'spec': dict(template['spec'], nodeName='fake-node-1'),
+               'status': {'phase': 'Pending',
+                          'conditions': [{'type': 'PodScheduled', 'status': 'True'},
+                                         {'type': 'Ready', 'status': 'False'}],
+                          'containerStatuses': [self._container_status(c, False, 'ContainerCreating', '')
+                                                for c in containers]}}
+        self._put(PODS, deployment['metadata']['namespace'], pod, 'ADDED')
+        self._timestamps[pod['metadata']['uid']] = now
+        return pod
+
+    def _container_status(self, container, ready, waiting_reason, waiting_message):
+        state = {'running': {'startedAt': _now()}} if ready else \
+            {'waiting': {'reason': waiting_reason, 'message': waiting_message}}
+        return {'name': container['name'], 'image': container['image'], 'imageID': '',
+                'ready': ready, 'restartCount': 0, 'state': state}
+
+    def _reconcile_pod(self, pod, now):
+        if self._is_ready(pod):
+            return
+        containers = pod['spec']['containers']
+        failure = next((self.image_failures[c['image']] for c in containers if c['image'] in self.image_failures),
+                       None)
+        if failure:
+            reason, message = failure
+            statuses = [self._container_status(c, False, reason, message) for c in containers]
+            if pod['status']['containerStatuses'] != statuses:
+                pod['status']['containerStatuses'] = statuses
+                self._put(PODS, pod['metadata']['namespace'], pod, 'MODIFIED')
+            return
+
+        if now - self._created_at(pod) >= self.readiness_delay:
+            pod['status'] = {'phase': 'Running',
+                             'podIP': '172.17.0.{}'.format(len(pod['metadata']['name']) % 250 + 1),
+                             'conditions': [{'type': 'PodScheduled', 'status': 'True'},
+                                            {'type': 'Ready', 'status': 'True'}],
+                             'containerStatuses': [self._container_status(c, True, None, None)
+                                                   for c in containers]}
+            self._put(PODS, pod['metadata']['namespace'], pod, 'MODIFIED')
+
+    @staticmethod
+    def _is_ready(pod):
+        return pod['status'].get('phase') == 'Running'
+
+    # </editor-fold>
@@ -0,0 +1,90 @@
+import threading
+import time
+import unittest
+
+from mock import Mock
+
+from domain.common.app_operation_queue import AppOperationQueue, POWER_ON, POWER_OFF, POWER_CYCLE, \
+    DELETE_INSTANCE
+
+
+class TestAppOperationQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = Mock()
+        self.app_operation_queue = AppOperationQueue()
+        self.release = threading.Event()
+        self.calls = []
+        self.results = {}
+
+    def _operation(self, name, block=False):
+        def function():
+            self.calls.append(name)
+            if block:
+                self.release.wait(5)
+            return name
+        return function
+
+    def _start(self, key, operation_name, block=False):
+        def run():
+            self.results[operation_name] = self.app_operation_queue.run(self.logger, key, operation_name,
+                                                                         self._operation(operation_name, block))
+        thread = threading.Thread(target=run)
+        thread.start()
+        time.sleep(0.05)
+        return thread
+
+    def test_queued_power_on_is_superseded_by_power_off(self):
+        # arrange
+        threads = [self._start('app', POWER_CYCLE, block=True),
+                   self._start('app', POWER_ON),
+                   self._start('app', POWER_OFF)]
+
+        # act
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        # assert
+        self.assertEquals(self.calls, [POWER_CYCLE, POWER_OFF])
+        self.assertIsNone(self.results[POWER_ON])
+        self.assertEquals(self.results[POWER_OFF], POWER_OFF)
+
+    def test_conflicting_operations_run_in_order(self):
+        # arrange
+        threads = [self._start('app', POWER_OFF, block=True),
+                   self._start('app', POWER_ON),
+                   self._start('app', DELETE_INSTANCE)]
+
+        # act
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        # assert
+        self.assertEquals(self.calls, [POWER_OFF, DELETE_INSTANCE])
+
+    def test_operations_of_other_apps_are_not_queued(self):
+        # arrange
+        thread = self._start('app', POWER_OFF, block=True)
+
+        # act
+        result = self.app_operation_queue.run(self.logger, 'other-app', POWER_ON, self._operation(POWER_ON))
+
+        # assert
+        self.assertEquals(result, POWER_ON)
+        self.release.set()
+        thread.join(5)
+        self.assertEquals(self.app_operation_queue._apps, {})
+
+    def test_operation_is_reentrant_and_releases_the_app_on_error(self):
+        # arrange
+        def power_cycle():
+            self.app_operation_queue.run(self.logger, 'app', POWER_ON, self._operation(POWER_ON))
+            raise ValueError('failed')
+
+        # act & assert
+        with self.assertRaisesRegexp(ValueError, 'failed'):
+            self.app_operation_queue.run(self.logger, 'app', POWER_CYCLE, power_cycle)
+        self.assertEquals(self.calls, [POWER_ON])
+        self.assertEquals(self.app_operation_queue._apps, {})
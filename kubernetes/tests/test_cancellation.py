@@ -0,0 +1,69 @@
+import unittest
+
+from mock import Mock, patch
+
+from domain.common.cancellation import OperationCancelledException, raise_if_cancelled, sleep_with_cancellation
+from domain.services.deployment import KubernetesDeploymentService
+from domain.services.rollout_status import RolloutStatus
+
+
+class TestCancellation(unittest.TestCase):
+
+    def test_raise_if_cancelled_ignores_missing_context(self):
+        # act & assert
+        raise_if_cancelled(None)
+        raise_if_cancelled(Mock(is_cancelled=False))
+        with self.assertRaisesRegexp(OperationCancelledException, 'stopped'):
+            raise_if_cancelled(Mock(is_cancelled=True), 'stopped')
+
+    @patch('domain.common.cancellation.time')
+    def test_sleep_with_cancellation_sleeps_in_steps(self, time_module):
+        # arrange
+        now = [0]
+        time_module.time.side_effect = lambda: now[0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        time_module.sleep.side_effect = sleep
+
+        # act
+        sleep_with_cancellation(2.5, Mock(is_cancelled=False))
+
+        # assert
+        self.assertEquals([args[0][0] for args in time_module.sleep.call_args_list], [1, 1, 0.5])
+
+    @patch('domain.common.cancellation.time')
+    def test_sleep_with_cancellation_stops_when_cancelled(self, time_module):
+        # arrange
+        now = [0]
+        cancellation_context = Mock(is_cancelled=False)
+        time_module.time.side_effect = lambda: now[0]
+
+        def sleep(seconds):
+            now[0] += seconds
+            cancellation_context.is_cancelled = True
+
+        time_module.sleep.side_effect = sleep
+
+        # act & assert
+        with self.assertRaises(OperationCancelledException):
+            sleep_with_cancellation(600, cancellation_context)
+        self.assertEquals(time_module.sleep.call_count, 1)
+
+    @patch('domain.common.cancellation.time')
+    def test_replicas_wait_is_interrupted_by_cancellation(self, time_module):
+        # arrange
+        cancellation_context = Mock(is_cancelled=False)
+        time_module.time.return_value = 0
+        time_module.sleep.side_effect = lambda seconds: setattr(cancellation_context, 'is_cancelled', True)
+        deployment_service = KubernetesDeploymentService(rollout_status_evaluator=Mock())
+        deployment_service.rollout_status_evaluator.evaluate.return_value = RolloutStatus(False, 'not ready')
+        deployment_service._get_polled_deployment = Mock(return_value=Mock())
+        deployment_service._diagnose_pods_safely = Mock(return_value=Mock(failure=None))
+
+        # act & assert
+        with self.assertRaisesRegexp(OperationCancelledException, 'deployed-app'):
+            deployment_service.wait_until_all_replicas_ready(Mock(), Mock(), 'ns', 'app', 'deployed-app',
+                                                             cancellation_context=cancellation_context)
+        self.assertEquals(deployment_service._get_polled_deployment.call_count, 1)
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from decimal import Decimal
+
+from mock import Mock
+
+from domain.services.capacity import ClusterCapacityService, parse_quantity, parse_cpu, parse_memory
+from domain.services.clients import ApiClientsProvider
+from domain.services.deployment import KubernetesDeploymentService
+from domain.services.namespace import KubernetesNamespaceService
+from domain.services.tags import TagsService
+from model.deployment_requests import AppDeploymentRequest, ApplicationImage, AppComputeSpecKubernetes, \
+    AppComputeSpecKubernetesResources
+from tests.fake_apiserver import FakeKubernetesApiServer
+
+
+class TestCapacity(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeKubernetesApiServer(readiness_delay=0.1).start()
+        config_file_path = self.server.write_kubeconfig(os.path.join(self.tmp_dir, 'config'))
+        self.clients = ApiClientsProvider().get_api_clients(Mock(config_file_path=config_file_path))
+
+        self.logger = Mock()
+        self.capacity_service = ClusterCapacityService(watch_step=1)
+        self.deployment_service = KubernetesDeploymentService()
+        self.namespace = KubernetesNamespaceService().create(self.clients, 'cloudshell-sandbox',
+                                                             {TagsService.SANDBOX_ID: 'sandbox'}, None).metadata.name
+
+    def tearDown(self):
+        self.capacity_service.stop()
+        self.server.stop()
+        self.assertFalse([thread for thread in threading.enumerate() if thread.name.startswith('capacity-watch')])
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _compute_spec(cpu, ram):
+        return AppComputeSpecKubernetes(requests=AppComputeSpecKubernetesResources(cpu=cpu, ram=ram),
+                                        limits=AppComputeSpecKubernetesResources(cpu=None, ram=None))
+
+    def _create_app(self, name, replicas, compute_spec):
+        app = AppDeploymentRequest(name=name, image=ApplicationImage('nginx', '1.15'), start_command=None,
+                                   environment_variables=None, compute_spec=compute_spec, internal_ports=[80],
+                                   external_ports=[], replicas=replicas)
+        self.deployment_service.create_app(self.logger, self.clients, self.namespace, name,
+                                           {TagsService.SANDBOX_ID: 'sandbox'}, app)
+
+    def _wait_until(self, condition, timeout=10):
+        end_time = time.time() + timeout
+        while not condition():
+            self.assertLess(time.time(), end_time, 'Timeout waiting for the capacity snapshot')
+            time.sleep(0.05)
+
+    def test_quantities_are_parsed(self):
+        self.assertEquals(parse_quantity('1.5'), Decimal('1.5'))
+        self.assertEquals(parse_quantity('1e3'), Decimal(1000))
+        self.assertEquals(parse_quantity('2k'), Decimal(2000))
+        self.assertEquals(parse_cpu('250m'), 250)
+        self.assertEquals(parse_cpu('0.1'), 100)
+        self.assertEquals(parse_memory('512Mi'), 512 * 1024 * 1024)
+        self.assertEquals(parse_memory('1G'), 10 ** 9)
+        self.assertEquals(parse_memory(None), 0)
+        self.assertRaises(ValueError, parse_quantity, '1 GB')
+
+    def test_snapshot_follows_scheduled_pods_and_new_nodes(self):
+        # arrange
+        snapshot = self.capacity_service.get_snapshot(self.logger, self.clients)
+
+        # act
+        self._create_app('app', 3, self._compute_spec('1', '1Gi'))
+        self._wait_until(lambda: snapshot.get_free_resources()['fake-node-1'][0] == 1000)
+        self.server.add_node('fake-node-2', cpu='2', memory='4Gi')
+        self._wait_until(lambda: 'fake-node-2' in snapshot.get_free_resources())
+
+        # assert
+        self.assertEquals(snapshot.get_free_resources(),
+                          {'fake-node-1': (1000, 5 * 1024 ** 3), 'fake-node-2': (2000, 4 * 1024 ** 3)})
+        self.assertEquals(snapshot.count_fitting_replicas(500, 1024 ** 3), 6)
+
+    def test_check_fails_for_replicas_that_do_not_fit(self):
+        # arrange
+        compute_spec = self._compute_spec('1500m', None)
+
+        # act
+        self.capacity_service.check_fits(self.logger, self.clients, 'app', compute_spec, 2)
+
+        # assert
+        with self.assertRaises(ValueError) as context:
+            self.capacity_service.check_fits(self.logger, self.clients, 'app', compute_spec, 3)
+        self.assertIn('2 of 3 replicas', str(context.exception))
+
+    def test_check_is_skipped_when_the_pods_cannot_be_listed(self):
+        # arrange
+        self.server.inject_error('GET', '/api/v1/pods', status=403, reason='Forbidden')
+
+        # act
+        self.capacity_service.check_fits(self.logger, self.clients, 'app', self._compute_spec('64', None), 1)
+
+        # assert
+        self.logger.warning.assert_called_once()
@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from mock import Mock, patch, call
+
+from domain.services.cassette import CASSETTE_DIR_ENV_VARIABLE, CassetteMismatchError, load_cassette
+from domain.services.clients import ApiClientsProvider, ReplayApiClientsProvider
+from domain.services.namespace import KubernetesNamespaceService
+from domain.services.tags import TagsService
+from tests.fake_apiserver import FakeKubernetesApiServer
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cassette_dir = os.path.join(self.tmp_dir, 'cassettes')
+        self.namespace_service = KubernetesNamespaceService()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _record(self, command):
+        with FakeKubernetesApiServer() as server:
+            config_file_path = server.write_kubeconfig(os.path.join(self.tmp_dir, 'config'))
+            with patch.dict(os.environ, {CASSETTE_DIR_ENV_VARIABLE: self.cassette_dir}):
+                clients = ApiClientsProvider().get_api_clients(Mock(config_file_path=config_file_path))
+            return command(clients)
+
+    def _create_namespace(self, clients):
+        return self.namespace_service.create(clients, 'cloudshell-sandbox', {TagsService.SANDBOX_ID: 'sandbox'}, None)
+
+    def test_recorded_responses_are_replayed_without_cluster(self):
+        # arrange
+        def command(clients):
+            self._create_namespace(clients)
+            return self.namespace_service.get_single_by_id(clients, 'sandbox')
+
+        recorded_namespace = self._record(command)
+        clients = ReplayApiClientsProvider(self.cassette_dir).get_api_clients(Mock())
+
+        # act
+        self._create_namespace(clients)
+        replayed_namespace = self.namespace_service.get_single_by_id(clients, 'sandbox')
+
+        # assert
+        self.assertEquals(replayed_namespace, recorded_namespace)
+        self.assertEquals(len(os.listdir(self.cassette_dir)), 1)
+
+    def test_recorded_errors_are_replayed(self):
+        # arrange
+        def command(clients):
+            with self.assertRaises(ApiException):
+                clients.core_api.read_namespace('missing')
+
+        self._record(command)
+        clients = ReplayApiClientsProvider(self.cassette_dir).get_api_clients(Mock())
+
+        # act & assert
+        with self.assertRaises(ApiException) as context:
+            clients.core_api.read_namespace('missing')
+        self.assertEquals(context.exception.status, 404)
+
+    def test_unrecorded_request_raises_mismatch(self):
+        # arrange
+        self._record(lambda clients: clients.core_api.list_node())
+        clients = ReplayApiClientsProvider(self.cassette_dir).get_api_clients(Mock())
+
+        # act & assert
+        with self.assertRaisesRegexp(CassetteMismatchError, "GET /api/v1/namespaces"):
+            clients.core_api.list_namespace()
+
+    def test_watch_streams_are_replayed(self):
+        # arrange
+        def command(clients):
+            self._create_namespace(clients)
+            return [event['object'].metadata.name for event in
+                    watch.Watch().stream(clients.core_api.list_namespace, timeout_seconds=1)]
+
+        recorded_names = self._record(command)
+        clients = ReplayApiClientsProvider(self.cassette_dir).get_api_clients(Mock())
+        self._create_namespace(clients)
+
+        # act
+        replayed_names = [event['object'].metadata.name for event in
+                          watch.Watch().stream(clients.core_api.list_namespace, timeout_seconds=1)]
+
+        # assert
+        self.assertEquals(replayed_names, ['cloudshell-sandbox'])
+        self.assertEquals(replayed_names, recorded_names)
+
+    @patch('domain.services.cassette.time.sleep')
+    def test_replay_preserves_timing_when_requested(self, sleep):
+        # arrange
+        self._record(lambda clients: clients.core_api.list_node())
+        exchange = load_cassette(self.cassette_dir)[0]
+        clients = ReplayApiClientsProvider(self.cassette_dir, preserve_timing=True).get_api_clients(Mock())
+
+        # act
+        clients.core_api.list_node()
+
+        # assert
+        self.assertIn(call(exchange['duration']), sleep.call_args_list)
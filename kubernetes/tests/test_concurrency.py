@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+
+from mock import Mock
+
+from domain.common.concurrency import run_concurrently, LinkedCancellationContext
+
+
+class TestConcurrency(unittest.TestCase):
+
+    def test_results_are_returned_in_order(self):
+        # arrange
+        functions = [lambda context: time.sleep(0.1) or 'slow', lambda context: 'fast']
+
+        # act
+        results = run_concurrently(functions)
+
+        # assert
+        self.assertEquals(results, ['slow', 'fast'])
+
+    def test_functions_run_concurrently(self):
+        # arrange
+        barrier = threading.Event()
+
+        def wait(context):
+            return barrier.wait(5)
+
+        def release(context):
+            barrier.set()
+            return True
+
+        # act
+        results = run_concurrently([wait, release])
+
+        # assert
+        self.assertEquals(results, [True, True])
+
+    def test_failure_cancels_the_other_functions(self):
+        # arrange
+        cancelled = []
+
+        def wait(context):
+            end_time = time.time() + 5
+            while time.time() < end_time and not context.is_cancelled:
+                time.sleep(0.01)
+            cancelled.append(context.is_cancelled)
+
+        def fail(context):
+            raise ValueError('failed')
+
+        # act & assert
+        with self.assertRaisesRegexp(ValueError, 'failed'):
+            run_concurrently([wait, fail])
+        self.assertEquals(cancelled, [True])
+
+    def test_linked_context_follows_the_command_cancellation(self):
+        # arrange
+        cancellation_context = Mock(is_cancelled=False)
+        linked_context = LinkedCancellationContext(cancellation_context)
+
+        # act
+        cancellation_context.is_cancelled = True
+
+        # assert
+        self.assertTrue(linked_context.is_cancelled)
+        self.assertFalse(LinkedCancellationContext().is_cancelled)
@@ -0,0 +1,99 @@
+import unittest
+
+from mock import Mock
+
+from data_model import Kubernetes, KubernetesService, LegacyUtils
+
+
+class TestDataModel(unittest.TestCase):
+
+    def setUp(self):
+        self.context = Mock()
+        self.context.resource.name = 'kubernetes'
+        self.context.resource.attributes = {'Kubernetes.Config File Path': '/kube/config',
+                                            'Kubernetes.External Service Type': 'LoadBalancer',
+                                            'Kubernetes.Custom': 'value'}
+
+    def test_create_from_context_fills_attribute_fields(self):
+        # act
+        resource = Kubernetes.create_from_context(self.context)
+
+        # assert
+        self.assertEquals(resource.name, 'kubernetes')
+        self.assertEquals(resource.config_file_path, '/kube/config')
+        self.assertEquals(resource.external_service_type, 'LoadBalancer')
+        self.assertIsNone(resource.region)
+        self.assertDictEqual(resource.attributes, self.context.resource.attributes)
+
+    def test_create_from_context_returns_independent_models(self):
+        # arrange
+        first = Kubernetes.create_from_context(self.context)
+
+        # act
+        first.region = 'eu-west'
+        second = Kubernetes.create_from_context(self.context)
+
+        # assert
+        self.assertIsNot(first, second)
+        self.assertIsNone(second.region)
+        self.assertNotIn('Kubernetes.Region', second.attributes)
+        self.assertEquals(first.attributes['Kubernetes.Region'], 'eu-west')
+
+    def test_create_from_context_reflects_changed_attributes(self):
+        # arrange
+        Kubernetes.create_from_context(self.context)
+        self.context.resource.attributes = {'Kubernetes.Config File Path': '/other/config'}
+
+        # act
+        resource = Kubernetes.create_from_context(self.context)
+
+        # assert
+        self.assertEquals(resource.config_file_path, '/other/config')
+        self.assertIsNone(resource.external_service_type)
+
+    def test_replacing_attributes_refreshes_fields(self):
+        # arrange
+        service = KubernetesService('app')
+
+        # act
+        service.attributes = {'Kubernetes.Kubernetes Service.Replicas': '3'}
+
+        # assert
+        self.assertEquals(service.replicas, '3')
+        self.assertIsNone(service.docker_image_name)
+
+    def test_legacy_utils_attaches_attributes_without_property(self):
+        # arrange
+        autoload_details = Mock(resources=[],
+                                attributes=[Mock(relative_address='', attribute_name='Config File Path',
+                                                 attribute_value='/kube/config'),
+                                            Mock(relative_address='', attribute_name='Kubernetes.Custom',
+                                                 attribute_value='value')])
+        self.context.resource.model = 'Kubernetes'
+
+        # act
+        resource = LegacyUtils().migrate_autoload_details(autoload_details, self.context)
+
+        # assert
+        self.assertEquals(resource.config_file_path, '/kube/config')
+        self.assertEquals(resource.attributes['Kubernetes.Custom'], 'value')
+
+    def test_setters_update_the_fields(self):
+        # arrange
+        resource = Kubernetes('kubernetes')
+        service = KubernetesService('app')
+        resource_values = {'external_service_type': 'NodePort', 'region': 'eu-west', 'networks_in_use': '10.0.0.0/24',
+                           'vlan_type': 'VXLAN', 'profiling': 'True'}
+        service_values = {'replicas': '3', 'wait_for_replicas': '60', 'wait_for_ip': 'False', 'autoload': 'True'}
+
+        # act
+        for name, value in resource_values.items():
+            setattr(resource, name, value)
+        for name, value in service_values.items():
+            setattr(service, name, value)
+
+        # assert
+        self.assertDictEqual({name: getattr(resource, name) for name in resource_values}, resource_values)
+        self.assertDictEqual({name: getattr(service, name) for name in service_values}, service_values)
+        self.assertEquals(resource.attributes['Kubernetes.External Service Type'], 'NodePort')
+        self.assertEquals(service.attributes['Kubernetes.Kubernetes Service.Replicas'], '3')
@@ -3,6 +3,7 @@ import unittest
 from mock import Mock, MagicMock, patch
 
 from domain.common.additional_data_keys import DeployedAppAdditionalDataKeys
+from domain.common.cancellation import OperationCancelledException
 from domain.operations.deploy import DeployOperation
 from domain.services.tags import TagsService
 
@@ -15,7 +16,7 @@ class TestDeployOperation(unittest.TestCase):
         self.cloud_provider_resource = Mock()
         self.deploy_action = Mock()
         self.clients = Mock()
-        self.cancellation_context = Mock()
+        self.cancellation_context = Mock(is_cancelled=False)
 
         self.networking_service = Mock()
         self.namespace_service = Mock()
@@ -56,7 +57,9 @@ class TestDeployOperation(unittest.TestCase):
             'Kubernetes.Kubernetes Service.CPU Limit': '1',
             'Kubernetes.Kubernetes Service.RAM Limit': '256M',
             'Kubernetes.Kubernetes Service.CPU Request': '128M',
-            'Kubernetes.Kubernetes Service.RAM Request': '0.5'
+            'Kubernetes.Kubernetes Service.RAM Request': '0.5',
+            'Kubernetes.Kubernetes Service.Wait for IP': 'False',
+            'Kubernetes.Kubernetes Service.Depends On': 'Data Base, cache'
         }
 
         internal_service_mock = Mock()
@@ -99,7 +102,10 @@ class TestDeployOperation(unittest.TestCase):
             external_ports=[80, 443],
             replicas=3,
             start_command='do stuff',
-            environment_variables={'k1': 'v1'}
+            environment_variables={'k1': 'v1'},
+            wait_for_replicas=120,
+            depends_on=['data-base', 'cache'],
+            preferred_node=None
         )
 
         self.deployment_service.create_app.assert_called_once_with(
@@ -120,9 +126,178 @@ class TestDeployOperation(unittest.TestCase):
         self.assertDictEqual(result.deployedAppAdditionalData,
                              {DeployedAppAdditionalDataKeys.NAMESPACE: namespace,
                               DeployedAppAdditionalDataKeys.REPLICAS: 3,
-                              DeployedAppAdditionalDataKeys.WAIT_FOR_REPLICAS_TO_BE_READY: '120'})
+                              DeployedAppAdditionalDataKeys.WAIT_FOR_REPLICAS_TO_BE_READY: '120',
+                              DeployedAppAdditionalDataKeys.WAIT_FOR_IP: False})
         self.assertEquals(result.vmDetailsData, vm_details_data_mock)
 
+    def test_deploy_waits_for_replicas_and_load_balancer(self):
+        # arrange
+        self.deploy_action.actionParams.appName = 'kube app test'
+        self.deploy_action.actionParams.deployment.deploymentPath = 'Kubernetes.Kubernetes Service'
+        self.deploy_action.actionParams.deployment.attributes = {
+            'Kubernetes.Kubernetes Service.Internal Ports': '22',
+            'Kubernetes.Kubernetes Service.External Ports': '80',
+            'Kubernetes.Kubernetes Service.Replicas': '2',
+            'Kubernetes.Kubernetes Service.Docker Image Name': 'nginx',
+            'Kubernetes.Kubernetes Service.Docker Image Tag': 'latest',
+            'Kubernetes.Kubernetes Service.Wait for Replicas': '120',
+            'Kubernetes.Kubernetes Service.Wait for IP': 'True',
+            'Kubernetes.Kubernetes Service.Wait on Deploy': 'True'
+        }
+        internal_service = Mock()
+        internal_service.spec.selector = {}
+        internal_service.spec.type = 'ClusterIP'
+        external_service = Mock()
+        external_service.spec.selector = {}
+        external_service.spec.type = 'LoadBalancer'
+        self.networking_service.create_internal_external_set.return_value = [internal_service, external_service]
+        self.networking_service.wait_for_external_address.return_value = '203.0.113.1'
+        ready_deployment = Mock()
+        self.deployment_service.watch_until_all_replicas_ready.return_value = ready_deployment
+        self.deployment_operation.wait_for_ip_timeout = 30
+
+        # act
+        result = self.deployment_operation.deploy_app(logger=self.logger,
+                                                      sandbox_id=self.sandbox_id,
+                                                      cloud_provider_resource=self.cloud_provider_resource,
+                                                      deploy_action=self.deploy_action,
+                                                      clients=self.clients,
+                                                      cancellation_context=self.cancellation_context)
+
+        # assert
+        namespace = self.namespace_service.get_single_by_id.return_value.metadata.name
+        wait_call = self.deployment_service.watch_until_all_replicas_ready.call_args
+        self.assertEquals(wait_call[1]['timeout'], 120)
+        self.assertEquals(wait_call[1]['generation'],
+                          self.deployment_service.create_app.return_value.metadata.generation)
+        self.assertFalse(wait_call[1]['cancellation_context'].is_cancelled)
+        address_call = self.networking_service.wait_for_external_address.call_args
+        self.assertEquals(address_call[1]['timeout'], 30)
+        self.assertEquals(address_call[1]['app_name'], 'kube-app-test')
+        self.vm_details_provider.create_vm_details.assert_called_once_with(
+            self.networking_service.get_services_by_app_name.return_value, ready_deployment)
+        self.networking_service.get_services_by_app_name.assert_called_once_with(self.clients, namespace,
+                                                                                  'kube-app-test')
+        self.assertEquals(result.deployedAppAddress, '203.0.113.1')
+
+    def test_deploy_prefers_the_node_of_a_warm_pod(self):
+        # arrange
+        self.deployment_operation.warm_pod_pool = Mock()
+        self.deployment_operation.warm_pod_pool.acquire_node.return_value = 'node-1'
+        self.cloud_provider_resource.warm_pool_images = 'nginx:1.15'
+        self.cloud_provider_resource.warm_pool_size = '2'
+        self.deploy_action.actionParams.appName = 'kube app test'
+        self.deploy_action.actionParams.deployment.deploymentPath = 'Kubernetes.Kubernetes Service'
+        self.deploy_action.actionParams.deployment.attributes = {
+            'Kubernetes.Kubernetes Service.Internal Ports': '22',
+            'Kubernetes.Kubernetes Service.Replicas': '1',
+            'Kubernetes.Kubernetes Service.Docker Image Name': 'nginx',
+            'Kubernetes.Kubernetes Service.Docker Image Tag': '1.15',
+            'Kubernetes.Kubernetes Service.Wait for Replicas': '0'
+        }
+        internal_service = Mock()
+        internal_service.spec.selector = {}
+        self.networking_service.create_internal_external_set.return_value = [internal_service]
+
+        # act
+        self.deployment_operation.deploy_app(logger=self.logger,
+                                             sandbox_id=self.sandbox_id,
+                                             cloud_provider_resource=self.cloud_provider_resource,
+                                             deploy_action=self.deploy_action,
+                                             clients=self.clients,
+                                             cancellation_context=self.cancellation_context)
+
+        # assert
+        acquire_call = self.deployment_operation.warm_pod_pool.acquire_node.call_args[1]
+        self.assertEquals((acquire_call['hot_images'], acquire_call['size'], acquire_call['full_image_name']),
+                          ('nginx:1.15', 2, 'nginx:1.15'))
+        self.assertEquals(self.deployment_service.create_app.call_args[1]['app'].preferred_node, 'node-1')
+
+    def test_deploy_pins_the_image_digest(self):
+        # arrange
+        self.deployment_operation.image_digest_resolver = Mock()
+        self.deployment_operation.image_digest_resolver.resolve.return_value = 'sha256:abc'
+        self.deploy_action.actionParams.appName = 'kube app test'
+        self.deploy_action.actionParams.deployment.deploymentPath = 'Kubernetes.Kubernetes Service'
+        self.deploy_action.actionParams.deployment.attributes = {
+            'Kubernetes.Kubernetes Service.Internal Ports': '22',
+            'Kubernetes.Kubernetes Service.Replicas': '1',
+            'Kubernetes.Kubernetes Service.Docker Image Name': 'nginx',
+            'Kubernetes.Kubernetes Service.Docker Image Tag': '1.15',
+            'Kubernetes.Kubernetes Service.Wait for Replicas': '0',
+            'Kubernetes.Kubernetes Service.Pin Image Digest': 'True'
+        }
+        internal_service = Mock()
+        internal_service.spec.selector = {}
+        self.networking_service.create_internal_external_set.return_value = [internal_service]
+
+        # act
+        self.deployment_operation.deploy_app(logger=self.logger,
+                                             sandbox_id=self.sandbox_id,
+                                             cloud_provider_resource=self.cloud_provider_resource,
+                                             deploy_action=self.deploy_action,
+                                             clients=self.clients,
+                                             cancellation_context=self.cancellation_context)
+
+        # assert
+        self.deployment_operation.image_digest_resolver.resolve.assert_called_once_with(self.logger, 'nginx:1.15')
+        self.assertEquals(self.deployment_service.create_app.call_args[1]['app'].image.digest, 'sha256:abc')
+
+    def test_deploy_fails_before_creating_anything_when_the_app_does_not_fit(self):
+        # arrange
+        self.deployment_operation.capacity_service = Mock()
+        self.deployment_operation.capacity_service.check_fits.side_effect = ValueError('Not enough free resources')
+        self.cloud_provider_resource.check_capacity_on_deploy = 'True'
+        self.deploy_action.actionParams.appName = 'kube app test'
+        self.deploy_action.actionParams.deployment.deploymentPath = 'Kubernetes.Kubernetes Service'
+        self.deploy_action.actionParams.deployment.attributes = {
+            'Kubernetes.Kubernetes Service.Internal Ports': '22',
+            'Kubernetes.Kubernetes Service.Replicas': '3',
+            'Kubernetes.Kubernetes Service.Docker Image Name': 'nginx',
+            'Kubernetes.Kubernetes Service.CPU Request': '2'
+        }
+
+        # act & assert
+        self.assertRaises(ValueError, self.deployment_operation.deploy_app,
+                          logger=self.logger,
+                          sandbox_id=self.sandbox_id,
+                          cloud_provider_resource=self.cloud_provider_resource,
+                          deploy_action=self.deploy_action,
+                          clients=self.clients,
+                          cancellation_context=self.cancellation_context)
+        check_call = self.deployment_operation.capacity_service.check_fits.call_args[0]
+        self.assertEquals((check_call[2], check_call[3].requests.cpu, check_call[4]), ('kube-app-test', '2', 3))
+        self.networking_service.create_internal_external_set.assert_not_called()
+        self.deployment_service.create_app.assert_not_called()
+
+    def test_deploy_does_not_wait_without_wait_on_deploy(self):
+        # arrange
+        self.deploy_action.actionParams.appName = 'kube app test'
+        self.deploy_action.actionParams.deployment.deploymentPath = 'Kubernetes.Kubernetes Service'
+        self.deploy_action.actionParams.deployment.attributes = {
+            'Kubernetes.Kubernetes Service.Internal Ports': '22',
+            'Kubernetes.Kubernetes Service.Replicas': '1',
+            'Kubernetes.Kubernetes Service.Docker Image Name': 'nginx',
+            'Kubernetes.Kubernetes Service.Wait for Replicas': '120',
+            'Kubernetes.Kubernetes Service.Wait on Deploy': 'False'
+        }
+        internal_service = Mock()
+        internal_service.spec.selector = {}
+        self.networking_service.create_internal_external_set.return_value = [internal_service]
+
+        # act
+        result = self.deployment_operation.deploy_app(logger=self.logger,
+                                                      sandbox_id=self.sandbox_id,
+                                                      cloud_provider_resource=self.cloud_provider_resource,
+                                                      deploy_action=self.deploy_action,
+                                                      clients=self.clients,
+                                                      cancellation_context=self.cancellation_context)
+
+        # assert
+        self.deployment_service.watch_until_all_replicas_ready.assert_not_called()
+        self.networking_service.wait_for_external_address.assert_not_called()
+        self.assertEquals(result.deployedAppAddress, 'kube-app-test')
+
     def _get_expected_deployed_app_name(self, expected_kubernetes_app_name):
         return "{}-{}".format(expected_kubernetes_app_name, 'some-short-guide')
 
@@ -223,6 +398,35 @@ class TestDeployOperation(unittest.TestCase):
             cs_app_name=self.deploy_action.actionParams.appName,
             kubernetes_app_name=kubernetes_name_mock)
 
+    @patch('domain.operations.deploy.convert_to_int_list')
+    @patch('domain.operations.deploy.convert_app_name_to_valid_kubernetes_name')
+    @patch('domain.operations.deploy.create_deployment_model_from_action')
+    def test_deploy_rolls_back_when_cancelled_after_creating_services(self,
+                                                                      create_deployment_model_from_action_method,
+                                                                      convert_app_name_to_valid_kubernetes_name_method,
+                                                                      convert_to_int_list_method):
+        # arrange
+        def create_internal_external_set(**kwargs):
+            self.cancellation_context.is_cancelled = True
+            return MagicMock()
+
+        self.networking_service.create_internal_external_set = Mock(side_effect=create_internal_external_set)
+        self.deployment_operation._do_rollback_safely = Mock()
+        self.namespace_service.get_single_by_id = Mock(return_value=Mock())
+
+        # act
+        with self.assertRaises(OperationCancelledException):
+            self.deployment_operation.deploy_app(logger=self.logger,
+                                                 sandbox_id=self.sandbox_id,
+                                                 cloud_provider_resource=self.cloud_provider_resource,
+                                                 deploy_action=self.deploy_action,
+                                                 clients=self.clients,
+                                                 cancellation_context=self.cancellation_context)
+
+        # assert
+        self.deployment_service.create_app.assert_not_called()
+        self.deployment_operation._do_rollback_safely.assert_called_once()
+
     def test_do_rollback_simple(self):
         # act
         self.deployment_operation._do_rollback_safely(logger=self.logger,
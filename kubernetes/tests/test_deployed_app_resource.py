@@ -1,3 +1,4 @@
+import json
 import unittest
 
 from mock import Mock, patch
@@ -119,3 +120,69 @@ class TestDeployedAppResource(unittest.TestCase):
 
         # assert
         self.assertEquals(deployed_app.wait_for_replicas_to_be_ready, 180)
+
+    def test_wait_for_ip_init_from_dict(self):
+        # arrange
+        self.deployed_app_dict['vmdetails']['vmCustomParams'].append({'name': 'wait_for_ip', 'value': 'False'})
+
+        # act
+        deployed_app = DeployedAppResource(deployed_app_dict=self.deployed_app_dict)
+
+        # assert
+        self.assertFalse(deployed_app.wait_for_ip)
+
+    def test_wait_for_ip_defaults_to_true(self):
+        # act
+        deployed_app = DeployedAppResource(deployed_app_dict=self.deployed_app_dict)
+
+        # assert
+        self.assertTrue(deployed_app.wait_for_ip)
+
+    @patch('model.deployed_app.json')
+    def test_same_deployed_app_json_is_parsed_once(self, json_class):
+        # arrange
+        json_class.loads = Mock(return_value=self.deployed_app_dict)
+        context = Mock()
+
+        # act
+        DeployedAppResource(resource_context=context)
+        deployed_app = DeployedAppResource(resource_context=context)
+
+        # assert
+        json_class.loads.assert_called_once_with(context.app_context.deployed_app_json)
+        self.assertEquals(deployed_app.namespace, 'my-sandbox-namespace')
+
+    def test_cached_deployed_app_json_is_read_only(self):
+        # arrange
+        context = Mock()
+        context.app_context.deployed_app_json = json.dumps(dict(self.deployed_app_dict, name='read_only_app'))
+        deployed_app = DeployedAppResource(resource_context=context)
+
+        # act & assert
+        with self.assertRaises(TypeError):
+            deployed_app.vm_details['uid'] = 'other_uid'
+        with self.assertRaises(TypeError):
+            deployed_app.vm_custom_params[1]['value'] = 'other-namespace'
+        self.assertEquals(DeployedAppResource(resource_context=context).namespace, 'my-sandbox-namespace')
+        self.assertEquals(deployed_app.kubernetes_name, 'vm_uid')
+
+    def test_derived_values_are_memoized(self):
+        # arrange
+        deployed_app = DeployedAppResource(deployed_app_dict=self.deployed_app_dict)
+        self.assertEquals(deployed_app.replicas, 3)
+
+        # act
+        self.deployed_app_dict['vmdetails']['vmCustomParams'][2]['value'] = '5'
+
+        # assert
+        self.assertEquals(deployed_app.replicas, 3)
+
+    def test_missing_namespace_raises(self):
+        # arrange
+        self.deployed_app_dict['vmdetails']['vmCustomParams'] = []
+        deployed_app = DeployedAppResource(deployed_app_dict=self.deployed_app_dict)
+
+        # act & assert
+        with self.assertRaisesRegexp(ValueError, "Couldn't get namespace"):
+            deployed_app.namespace
+        self.assertEquals(deployed_app.wait_for_replicas_to_be_ready, 0)
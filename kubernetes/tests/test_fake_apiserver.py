@@ -0,0 +1,334 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from multiprocessing import TimeoutError
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from mock import Mock
+
+from domain.operations.sandbox_power import SandboxPowerOperation
+from domain.services.clients import ApiClientsProvider
+from domain.services.deployment import KubernetesDeploymentService
+from domain.services.namespace import KubernetesNamespaceService
+from domain.services.networking import KubernetesNetworkingService
+from domain.services.tags import TagsService
+from model.deployment_requests import AppDeploymentRequest, ApplicationImage
+from tests.fake_apiserver import FakeKubernetesApiServer, DEPLOYMENTS
+
+
+class TestFakeKubernetesApiServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeKubernetesApiServer(readiness_delay=0.1, load_balancer_delay=0.1).start()
+        config_file_path = self.server.write_kubeconfig(os.path.join(self.tmp_dir, 'config'))
+        self.clients = ApiClientsProvider().get_api_clients(Mock(config_file_path=config_file_path))
+
+        self.logger = Mock()
+        self.namespace_service = KubernetesNamespaceService()
+        self.networking_service = KubernetesNetworkingService()
+        self.deployment_service = KubernetesDeploymentService()
+
+        self.namespace = self.namespace_service.create(self.clients, 'cloudshell-sandbox',
+                                                       {TagsService.SANDBOX_ID: 'sandbox'}, None).metadata.name
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _create_app(self, name='app', replicas=2, image='nginx', depends_on=None):
+        app = AppDeploymentRequest(name=name, image=ApplicationImage(image, '1.15'), start_command=None,
+                                   environment_variables=None, compute_spec=None, internal_ports=[80],
+                                   external_ports=[], replicas=replicas, wait_for_replicas=5, depends_on=depends_on)
+        return self.deployment_service.create_app(self.logger, self.clients, self.namespace, name,
+                                                  {TagsService.SANDBOX_ID: 'sandbox'}, app)
+
+    def test_namespaces_are_found_by_sandbox_label(self):
+        # act
+        namespace = self.namespace_service.get_single_by_id(self.clients, 'sandbox')
+
+        # assert
+        self.assertEquals(namespace.metadata.name, 'cloudshell-sandbox')
+        self.assertEquals(namespace.status.phase, 'Active')
+        self.assertIsNone(self.namespace_service.get_single_by_id(self.clients, 'other-sandbox'))
+
+    def test_deployment_replicas_become_ready(self):
+        # arrange
+        self._create_app(replicas=2)
+
+        # act
+        self.deployment_service.wait_until_all_replicas_ready(self.logger, self.clients, self.namespace, 'app',
+                                                              'app-deployed', delay=0.05, timeout=5)
+
+        # assert
+        deployment = self.deployment_service.get_deployment_by_name(self.clients, self.namespace, 'app')
+        self.assertEquals(deployment.status.ready_replicas, 2)
+        self.assertEquals(deployment.status.observed_generation, 1)
+        pods = self.clients.core_api.list_namespaced_pod(self.namespace).items
+        self.assertEquals(len(pods), 2)
+
+    def test_replicas_wait_fails_fast_for_image_pull_errors(self):
+        # arrange
+        self.server.fail_image('nginx:1.15', 'ImagePullBackOff', 'Back-off pulling image "nginx:1.15"')
+        self._create_app(replicas=1)
+        start_time = time.time()
+
+        # act & assert
+        with self.assertRaisesRegexp(ValueError, 'ImagePullBackOff'):
+            self.deployment_service.wait_until_all_replicas_ready(self.logger, self.clients, self.namespace, 'app',
+                                                                  'app-deployed', delay=0.05, timeout=60)
+        self.assertLess(time.time() - start_time, 5)
+
+    def test_watch_returns_when_replicas_become_ready(self):
+        # arrange
+        created_deployment = self._create_app(replicas=2)
+
+        # act
+        deployment = self.deployment_service.watch_until_all_replicas_ready(
+            self.logger, self.clients, self.namespace, 'app', 'app-deployed', timeout=5,
+            generation=created_deployment.metadata.generation)
+
+        # assert
+        self.assertEquals(deployment.status.available_replicas, 2)
+        self.assertEquals(deployment.status.observed_generation, 1)
+
+    def test_watch_fails_for_image_pull_errors(self):
+        # arrange
+        self.server.fail_image('nginx:1.15', 'ImagePullBackOff', 'Back-off pulling image "nginx:1.15"')
+        self._create_app(replicas=1)
+        start_time = time.time()
+
+        # act & assert
+        with self.assertRaisesRegexp(ValueError, 'ImagePullBackOff'):
+            self.deployment_service.watch_until_all_replicas_ready(self.logger, self.clients, self.namespace, 'app',
+                                                                   'app-deployed', timeout=60)
+        self.assertLess(time.time() - start_time, 15)
+
+    def test_sandbox_power_on_waits_for_dependencies(self):
+        # arrange
+        self._create_app('db', replicas=1)
+        self._create_app('web', replicas=2, depends_on=['db'])
+        sandbox_power_operation = SandboxPowerOperation(self.namespace_service, self.deployment_service)
+        sandbox_power_operation.power_off(self.logger, self.clients, 'sandbox')
+        time.sleep(0.1)
+        self.assertEquals(self.server.list_objects(('v1', 'pods'), self.namespace), [])
+
+        # act
+        results = sandbox_power_operation.power_on(self.logger, self.clients, 'sandbox')
+
+        # assert
+        self.assertEquals([(result.name, result.wave, result.replicas) for result in results],
+                          [('db', 1, 1), ('web', 2, 2)])
+        self.assertTrue(all(result.seconds < 5 for result in results))
+        self.assertEquals(len(self.clients.core_api.list_namespaced_pod(self.namespace).items), 3)
+
+    def _wait_for_pool(self, size):
+        end_time = time.time() + 5
+        while time.time() < end_time:
+            pool = self.clients.core_api.list_namespace(label_selector=TagsService.NAMESPACE_POOL).items
+            if len(pool) >= size and not self.namespace_service._pool_top_ups:
+                return pool
+            time.sleep(0.05)
+        self.fail('The namespace pool was not topped up')
+
+    def test_pooled_namespace_is_claimed_and_pool_is_topped_up(self):
+        # arrange
+        self.namespace_service.top_up_pool(self.logger, self.clients, 2)
+        pool = self._wait_for_pool(2)
+
+        # act
+        claimed_namespace = self.namespace_service.claim_pooled_namespace(self.logger, self.clients, 'other-sandbox')
+        self.namespace_service.top_up_pool(self.logger, self.clients, 2)
+
+        # assert
+        self.assertIn(claimed_namespace.metadata.name, [namespace.metadata.name for namespace in pool])
+        self.assertNotIn(TagsService.NAMESPACE_POOL, claimed_namespace.metadata.labels)
+        self.assertEquals(self.namespace_service.get_single_by_id(self.clients, 'other-sandbox').metadata.name,
+                          claimed_namespace.metadata.name)
+        self.assertEquals(len(self._wait_for_pool(2)), 2)
+
+    def test_pool_is_trimmed_when_its_size_is_lowered(self):
+        # arrange
+        self.namespace_service.top_up_pool(self.logger, self.clients, 3)
+        pool = self._wait_for_pool(3)
+        claimed_namespace = self.namespace_service.claim_pooled_namespace(self.logger, self.clients, 'other-sandbox')
+
+        # act
+        self.namespace_service.top_up_pool(self.logger, self.clients, 1)
+        trimmed_pool = self._wait_for_pool(1)
+
+        # assert
+        self.assertEquals(len(trimmed_pool), 1)
+        self.assertIn(trimmed_pool[0].metadata.name, [namespace.metadata.name for namespace in pool])
+        self.assertEquals(self.namespace_service.get_single_by_id(self.clients, 'other-sandbox').metadata.name,
+                          claimed_namespace.metadata.name)
+
+    def test_claim_skips_namespace_claimed_concurrently(self):
+        # arrange
+        self.namespace_service.top_up_pool(self.logger, self.clients, 2)
+        self._wait_for_pool(2)
+        other_namespace_service = KubernetesNamespaceService()
+        list_namespace = self.clients.core_api.list_namespace
+
+        def list_then_claim(**kwargs):
+            # another driver claims the first namespace between the list and the patch
+            namespaces = list_namespace(**kwargs)
+            self.clients.core_api.list_namespace = list_namespace
+            other_namespace_service.claim_pooled_namespace(self.logger, self.clients, 'sandbox-1')
+            return namespaces
+
+        self.clients.core_api.list_namespace = list_then_claim
+
+        # act
+        claimed_namespace = self.namespace_service.claim_pooled_namespace(self.logger, self.clients, 'sandbox-2')
+
+        # assert
+        self.assertNotEquals(claimed_namespace.metadata.name,
+                             self.namespace_service.get_single_by_id(self.clients, 'sandbox-1').metadata.name)
+        self.assertIsNone(self.namespace_service.claim_pooled_namespace(self.logger, self.clients, 'sandbox-3'))
+
+    def test_patching_replicas_scales_pods(self):
+        # arrange
+        self._create_app(replicas=2)
+        self.deployment_service.wait_until_all_replicas_ready(self.logger, self.clients, self.namespace, 'app',
+                                                              'app-deployed', delay=0.05, timeout=5)
+        deployment = self.deployment_service.get_deployment_by_name(self.clients, self.namespace, 'app')
+        deployment.spec.replicas = 0
+
+        # act
+        self.deployment_service.update_deployment(self.logger, self.clients, self.namespace, 'app', deployment)
+        time.sleep(0.1)
+
+        # assert
+        self.assertEquals(self.server.list_objects(('v1', 'pods'), self.namespace), [])
+        self.assertEquals(self.server.get_object(DEPLOYMENTS, self.namespace, 'app')['metadata']['generation'], 2)
+
+    def test_restart_replaces_pods_with_rolling_update(self):
+        # arrange
+        self._create_app(replicas=2)
+        self.deployment_service.wait_until_all_replicas_ready(self.logger, self.clients, self.namespace, 'app',
+                                                              'app-deployed', delay=0.05, timeout=5)
+        old_pods = set(pod.metadata.name for pod in self.clients.core_api.list_namespaced_pod(self.namespace).items)
+
+        # act
+        deployment = self.deployment_service.restart_app(self.logger, self.clients, self.namespace, 'app')
+        self.deployment_service.wait_until_all_replicas_ready(self.logger, self.clients, self.namespace, 'app',
+                                                              'app-deployed', delay=0.05, timeout=5,
+                                                              generation=deployment.metadata.generation)
+
+        # assert
+        self.assertEquals(deployment.metadata.generation, 2)
+        pods = self.clients.core_api.list_namespaced_pod(self.namespace).items
+        self.assertEquals(len(pods), 2)
+        self.assertFalse(old_pods & set(pod.metadata.name for pod in pods))
+        self.assertTrue(all(pod.status.phase == 'Running' for pod in pods))
+
+    def test_load_balancer_gets_ingress_ip(self):
+        # arrange
+        self.networking_service.create_internal_external_set(self.logger, self.clients, self.namespace, 'app',
+                                                             {}, [], [8080], 'LoadBalancer')
+        time.sleep(0.2)
+
+        # act
+        services = self.networking_service.get_services_by_app_name(self.clients, self.namespace, 'app')
+
+        # assert
+        self.assertEquals(len(services), 1)
+        self.assertTrue(services[0].status.load_balancer.ingress[0].ip)
+        self.assertTrue(services[0].spec.ports[0].node_port)
+
+    def test_wait_for_external_address_returns_when_ingress_is_set(self):
+        # arrange
+        self.server.load_balancer_delay = 0.5
+        self.networking_service.create_internal_external_set(self.logger, self.clients, self.namespace, 'app',
+                                                             {}, [], [8080], 'LoadBalancer')
+        start_time = time.time()
+
+        # act
+        address = self.networking_service.wait_for_external_address(self.logger, self.clients, self.namespace,
+                                                                     'app', timeout=10)
+
+        # assert
+        self.assertTrue(address.startswith('203.0.113.'))
+        self.assertLess(time.time() - start_time, 3)
+
+    def test_wait_for_external_address_times_out(self):
+        # arrange
+        self.server.load_balancer_delay = None
+        self.networking_service.create_internal_external_set(self.logger, self.clients, self.namespace, 'app',
+                                                             {}, [], [8080], 'LoadBalancer')
+
+        # act & assert
+        with self.assertRaisesRegexp(TimeoutError, 'did not get an address'):
+            self.networking_service.wait_for_external_address(self.logger, self.clients, self.namespace, 'app',
+                                                              timeout=1)
+
+    def test_watch_streams_deployment_events(self):
+        # arrange
+        self._create_app(replicas=1)
+
+        # act
+        events = []
+        for event in watch.Watch().stream(self.clients.apps_api.list_namespaced_deployment, self.namespace,
+                                          timeout_seconds=2):
+            events.append(event)
+            if event['object'].status.ready_replicas == 1:
+                break
+
+        # assert
+        self.assertEquals(events[0]['type'], 'ADDED')
+        self.assertEquals(events[-1]['object'].status.ready_replicas, 1)
+
+    def test_injected_errors_are_returned(self):
+        # arrange
+        self.server.inject_error(method='GET', path_pattern='/deployments$', status=503, count=1)
+
+        # act & assert
+        with self.assertRaises(ApiException) as context:
+            self.clients.apps_api.list_namespaced_deployment(self.namespace)
+        self.assertEquals(context.exception.status, 503)
+        self.clients.apps_api.list_namespaced_deployment(self.namespace)
+
+    def test_stale_patch_conflicts(self):
+        # arrange
+        self._create_app(replicas=1)
+        self.deployment_service.wait_until_all_replicas_ready(self.logger, self.clients, self.namespace, 'app',
+                                                              'app-deployed', delay=0.05, timeout=5)
+        stale = self.deployment_service.get_deployment_by_name(self.clients, self.namespace, 'app')
+        fresh = self.deployment_service.get_deployment_by_name(self.clients, self.namespace, 'app')
+        fresh.spec.replicas = 3
+        self.deployment_service.update_deployment(self.logger, self.clients, self.namespace, 'app', fresh)
+
+        # act & assert
+        with self.assertRaises(ApiException) as context:
+            self.deployment_service.update_deployment(self.logger, self.clients, self.namespace, 'app', stale)
+        self.assertEquals(context.exception.status, 409)
+
+    def test_deletecollection_removes_matching_services(self):
+        # arrange
+        self.networking_service.create_internal_external_set(self.logger, self.clients, self.namespace, 'app',
+                                                             {}, [80], [8080], 'NodePort')
+
+        # act
+        self.clients.core_api.api_client.call_api(
+            '/api/v1/namespaces/{namespace}/services', 'DELETE', path_params={'namespace': self.namespace},
+            query_params=[('labelSelector', TagsService.SERVICE_APP_NAME + '=app')], response_type='V1Status',
+            auth_settings=['BearerToken'])
+
+        # assert
+        self.assertEquals(self.networking_service.get_services_by_app_name(self.clients, self.namespace, 'app'), [])
+
+    def test_terminated_namespace_is_deleted_with_its_objects(self):
+        # arrange
+        self._create_app(replicas=1)
+
+        # act
+        self.namespace_service.terminate(self.clients, 'sandbox')
+        time.sleep(0.1)
+
+        # assert
+        self.assertIsNone(self.namespace_service.get_single_by_id(self.clients, 'sandbox'))
+        self.assertEquals(self.server.list_objects(DEPLOYMENTS), [])
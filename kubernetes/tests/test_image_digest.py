@@ -0,0 +1,98 @@
+import unittest
+
+import certifi
+from mock import Mock, patch
+
+from domain.services.deployment import KubernetesDeploymentService
+from domain.services.image_digest import ImageDigestResolver, parse_image_reference
+from model.deployment_requests import ApplicationImage
+
+DIGEST = 'sha256:2d194184b067db3598771b4cf326cfe6ad5051937ba1132b8b7d4b0184e0d0a6'
+
+
+class TestImageDigest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = Mock()
+        self.http = Mock()
+        self.resolver = ImageDigestResolver(ttl=300, http=self.http)
+
+    @staticmethod
+    def _response(status, headers=None, data=b''):
+        return Mock(status=status, headers=headers or {}, data=data)
+
+    def test_default_pool_manager_verifies_certificates(self):
+        # act
+        resolver = ImageDigestResolver()
+
+        # assert
+        self.assertEquals(resolver.http.connection_pool_kw['cert_reqs'], 'CERT_REQUIRED')
+        self.assertEquals(resolver.http.connection_pool_kw['ca_certs'], certifi.where())
+
+    def test_image_references_are_parsed(self):
+        self.assertEquals(parse_image_reference('nginx'), ('registry-1.docker.io', 'library/nginx', 'latest'))
+        self.assertEquals(parse_image_reference('bitnami/redis:5.0'), ('registry-1.docker.io', 'bitnami/redis', '5.0'))
+        self.assertEquals(parse_image_reference('registry.example.com:5000/team/app:1.2'),
+                          ('registry.example.com:5000', 'team/app', '1.2'))
+        self.assertEquals(parse_image_reference('localhost:5000/app'), ('localhost:5000', 'app', 'latest'))
+
+    def test_digest_is_resolved_with_an_anonymous_token(self):
+        # arrange
+        challenge = 'Bearer realm="https://auth.docker.io/token",service="registry.docker.io",' \
+                    'scope="repository:library/nginx:pull"'
+        self.http.request.side_effect = [self._response(401, {'WWW-Authenticate': challenge}),
+                                         self._response(200, data=b'{"token": "abc"}'),
+                                         self._response(200, {'Docker-Content-Digest': DIGEST})]
+
+        # act
+        digest = self.resolver.resolve(self.logger, 'nginx:1.15')
+
+        # assert
+        self.assertEquals(digest, DIGEST)
+        manifest_call = self.http.request.call_args_list[2]
+        self.assertEquals(manifest_call[0], ('HEAD', 'https://registry-1.docker.io/v2/library/nginx/manifests/1.15'))
+        self.assertEquals(manifest_call[1]['headers']['Authorization'], 'Bearer abc')
+        self.assertEquals(self.http.request.call_args_list[1][0][1],
+                          'https://auth.docker.io/token?scope=repository%3Alibrary%2Fnginx%3Apull'
+                          '&service=registry.docker.io')
+
+    def test_digest_is_cached_until_the_ttl_expires(self):
+        # arrange
+        self.http.request.return_value = self._response(200, {'Docker-Content-Digest': DIGEST})
+
+        # act
+        with patch('domain.services.image_digest.time') as time_mock:
+            time_mock.time.return_value = 1000
+            self.resolver.resolve(self.logger, 'localhost:5000/app:1.0')
+            time_mock.time.return_value = 1299
+            self.resolver.resolve(self.logger, 'localhost:5000/app:1.0')
+            requests_within_ttl = self.http.request.call_count
+            time_mock.time.return_value = 1301
+            self.resolver.resolve(self.logger, 'localhost:5000/app:1.0')
+
+        # assert
+        self.assertEquals(requests_within_ttl, 1)
+        self.assertEquals(self.http.request.call_count, 2)
+        self.assertEquals(self.http.request.call_args[0][1], 'http://localhost:5000/v2/app/manifests/1.0')
+
+    def test_unreachable_registry_resolves_to_none(self):
+        # arrange
+        self.http.request.side_effect = IOError('connection refused')
+
+        # act
+        digest = self.resolver.resolve(self.logger, 'nginx:1.15')
+
+        # assert
+        self.assertIsNone(digest)
+        self.logger.warning.assert_called_once()
+
+    def test_pinned_container_pulls_only_missing_images(self):
+        # act
+        pinned = KubernetesDeploymentService._prepare_app_container('app', ApplicationImage('nginx', '1.15', DIGEST),
+                                                                    None, None, None, [], [])
+        unpinned = KubernetesDeploymentService._prepare_app_container('app', ApplicationImage('nginx', 'latest'),
+                                                                      None, None, None, [], [])
+
+        # assert
+        self.assertEquals((pinned.image, pinned.image_pull_policy), ('nginx:1.15@' + DIGEST, 'IfNotPresent'))
+        self.assertEquals((unpinned.image, unpinned.image_pull_policy), ('nginx', None))
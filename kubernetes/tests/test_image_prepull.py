@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from mock import Mock
+
+from domain.services.clients import ApiClientsProvider
+from domain.services.image_prepull import ImageFrequencyIndex, ImagePrePullService, PREPULL_DAEMON_SET
+from domain.services.tags import TagsService
+from tests.fake_apiserver import FakeKubernetesApiServer, DAEMON_SETS
+
+
+class TestImagePrePull(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeKubernetesApiServer().start()
+        config_file_path = self.server.write_kubeconfig(os.path.join(self.tmp_dir, 'config'))
+        self.clients = ApiClientsProvider().get_api_clients(Mock(config_file_path=config_file_path))
+
+        self.logger = Mock()
+        self.frequency_index = ImageFrequencyIndex()
+        self.image_prepull_service = ImagePrePullService(self.frequency_index)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _record(self, *images):
+        for image in images:
+            self.frequency_index.record(self.clients, image)
+
+    def _read_daemon_set(self):
+        return self.clients.apps_v1_api.read_namespaced_daemon_set(PREPULL_DAEMON_SET,
+                                                                   self.image_prepull_service.namespace)
+
+    def _wait_for_daemon_set(self):
+        for _ in range(50):
+            if self.server.list_objects(DAEMON_SETS, self.image_prepull_service.namespace):
+                return self._read_daemon_set()
+            time.sleep(0.1)
+        self.fail('The daemon set was not created')
+
+    def test_index_counts_are_shared_by_the_drivers_of_the_cluster(self):
+        # arrange
+        self._record('redis', 'nginx:1.15', 'redis', 'ubuntu')
+        ImageFrequencyIndex().record(self.clients, 'nginx:1.15')
+
+        # act
+        self._record('redis')
+        top = ImageFrequencyIndex().top(self.clients, 2)
+
+        # assert
+        self.assertEquals(top, ['redis', 'nginx:1.15'])
+
+    def test_concurrent_records_are_not_lost(self):
+        # arrange
+        threads = [threading.Thread(target=self._record, args=('redis',)) for _ in range(4)]
+
+        # act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # assert
+        self._record('ubuntu', 'ubuntu', 'ubuntu')
+        self.assertEquals(self.frequency_index.top(self.clients, 2), ['redis', 'ubuntu'])
+
+    def test_every_image_is_a_container_of_the_daemon_set(self):
+        # arrange
+        self._record('redis', 'redis', 'nginx:1.15', 'ubuntu', 'ubuntu')
+
+        # act
+        self.image_prepull_service.refresh(self.logger, self.clients, 2)
+
+        # assert
+        daemon_set = self._read_daemon_set()
+        pod_spec = daemon_set.spec.template.spec
+        self.assertEquals([container.image for container in pod_spec.containers], ['redis', 'ubuntu'])
+        self.assertEquals([container.image for container in pod_spec.init_containers], ['busybox:1.31'])
+        self.assertEquals(pod_spec.containers[0].command, ['/cloudshell-prepull/busybox', 'sleep', '2147483647'])
+        self.assertEquals(daemon_set.metadata.annotations[TagsService.PREPULL_IMAGES], 'redis,ubuntu')
+
+    def test_daemon_set_is_updated_only_when_the_top_images_change(self):
+        # arrange
+        self._record('redis', 'redis', 'ubuntu')
+        self.image_prepull_service.refresh(self.logger, self.clients, 1)
+        resource_version = self._read_daemon_set().metadata.resource_version
+
+        # act
+        self._record('ubuntu')
+        self.image_prepull_service.refresh(self.logger, self.clients, 1)
+        unchanged_resource_version = self._read_daemon_set().metadata.resource_version
+        self._record('ubuntu')
+        self.image_prepull_service.refresh(self.logger, self.clients, 1)
+
+        # assert
+        self.assertEquals(unchanged_resource_version, resource_version)
+        self.assertEquals(self._read_daemon_set().metadata.annotations[TagsService.PREPULL_IMAGES], 'ubuntu')
+
+    def test_recorded_deploy_refreshes_the_daemon_set(self):
+        # act
+        self.image_prepull_service.record_deploy(self.logger, self.clients, 'redis', 1)
+
+        # assert
+        daemon_set = self._wait_for_daemon_set()
+        self.assertEquals(daemon_set.metadata.annotations[TagsService.PREPULL_IMAGES], 'redis')
+        self.assertEquals(self.frequency_index.top(self.clients, 1), ['redis'])
+
+    def test_daemon_set_is_deleted_when_prepull_is_disabled(self):
+        # arrange
+        self._record('redis')
+        self.image_prepull_service.refresh(self.logger, self.clients, 1)
+
+        # act
+        self.image_prepull_service.refresh(self.logger, self.clients, 0)
+
+        # assert
+        self.assertEquals(self.server.list_objects(DAEMON_SETS), [])
+
+    def test_disabled_prepull_sends_no_requests(self):
+        # arrange
+        self._record('redis')
+        self.server.reset_requests()
+
+        # act
+        self.image_prepull_service.refresh(self.logger, self.clients, 0)
+        self.image_prepull_service.record_deploy(self.logger, self.clients, 'redis', 0)
+
+        # assert
+        self.assertEquals(self.server.request_count, 0)
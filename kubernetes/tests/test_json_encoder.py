@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+from cloudshell.cp.core.models import VmDetailsData, VmDetailsProperty, VmDetailsNetworkInterface, DeployAppResult, \
+    DriverResponse, PrepareCloudInfraResult
+
+from domain.common.json_encoder import ResponseJsonEncoder, encode_vm_details, encode_driver_response, \
+    iter_encode_vm_details
+
+
+class TestJsonEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.vm_details = [
+            VmDetailsData(vmInstanceData=[VmDetailsProperty('Image', u'nginx:1.15 é'),
+                                          VmDetailsProperty('Replicas', 3, hidden=True)],
+                          vmNetworkData=[VmDetailsNetworkInterface(interfaceId='svc', networkId='ns', isPrimary=True,
+                                                                   networkData=[VmDetailsProperty('Port', 80)],
+                                                                   privateIpAddress='10.0.0.1',
+                                                                   publicIpAddress=None)],
+                          appName='app "one"'),
+            VmDetailsData(appName='app-two', errorMessage='failed\n<details>'),
+            {'deployedAppJson': {'name': 'app', 'ratio': 0.1}, 'list': [1.5, None, False]}]
+
+    def _dumps(self, obj, **kwargs):
+        return json.dumps(obj, default=lambda o: o.__dict__, **kwargs)
+
+    def test_vm_details_output_matches_sorted_json_dumps(self):
+        # act
+        result = encode_vm_details(self.vm_details)
+
+        # assert
+        self.assertEquals(result, self._dumps(self.vm_details, sort_keys=True, separators=(',', ':')))
+
+    def test_stdlib_backend_output_matches_json_dumps(self):
+        # arrange
+        encoder = ResponseJsonEncoder(sort_keys=True, separators=(',', ':'), use_simplejson=False)
+
+        # act
+        result = encoder.encode(self.vm_details)
+
+        # assert
+        self.assertEquals(result, self._dumps(self.vm_details, sort_keys=True, separators=(',', ':')))
+
+    def test_driver_response_output_matches_to_driver_response_json(self):
+        # arrange
+        results = [DeployAppResult('action-id', vmUuid='app', vmName='app-1', vmDetailsData=self.vm_details[0],
+                                   deployedAppAdditionalData={'namespace': 'ns', 'replicas': 2},
+                                   deployedAppAddress='app'),
+                   PrepareCloudInfraResult('prepare-id', success=False, errorMessage=u'café')]
+
+        # act
+        result = encode_driver_response(DriverResponse(results))
+
+        # assert
+        self.assertEquals(result, DriverResponse(results).to_driver_response_json())
+
+    def test_instances_with_different_attributes_keep_their_own_fields(self):
+        # arrange
+        extended = VmDetailsData(appName='extended')
+        extended.extra = {1: 'one', 2.5: True, None: 'none'}
+        details = [VmDetailsData(appName='first'), extended, VmDetailsData(appName='last')]
+
+        # act
+        result = encode_vm_details(details)
+
+        # assert
+        self.assertEquals(result, self._dumps(details, sort_keys=True, separators=(',', ':')))
+
+    def test_incremental_vm_details_output_matches_encoded_list(self):
+        # act
+        chunks = list(iter_encode_vm_details(iter(self.vm_details)))
+
+        # assert
+        self.assertEquals(len(chunks), len(self.vm_details) + 1)
+        self.assertEquals(''.join(chunks), encode_vm_details(self.vm_details))
+        self.assertEquals(''.join(iter_encode_vm_details(iter([]))), encode_vm_details([]))
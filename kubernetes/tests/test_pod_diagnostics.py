@@ -0,0 +1,152 @@
+import unittest
+from datetime import datetime
+
+from kubernetes.client import AppsV1beta1DeploymentStatus, V1Pod, V1ObjectMeta, V1PodStatus, V1ContainerStatus, V1ContainerState, \
+    V1ContainerStateWaiting, V1PodCondition, V1Event, V1ObjectReference
+from mock import Mock, patch
+
+from domain.services.deployment import KubernetesDeploymentService
+from domain.services.pod_diagnostics import PodDiagnosticsService, PodsDiagnosis
+
+
+class TestPodDiagnosticsService(unittest.TestCase):
+
+    def setUp(self):
+        self.clients = Mock()
+        self.clients.core_api.list_namespaced_event.return_value.items = []
+        self.service = PodDiagnosticsService()
+
+    def _create_pod(self, name, waiting_reason=None, waiting_message=None, unschedulable_message=None,
+                    restart_count=0):
+        container_statuses = None
+        if waiting_reason:
+            waiting = V1ContainerStateWaiting(reason=waiting_reason, message=waiting_message)
+            container_statuses = [V1ContainerStatus(name='app', image='nginx:bad', image_id='', ready=False,
+                                                    restart_count=restart_count,
+                                                    state=V1ContainerState(waiting=waiting))]
+        conditions = None
+        if unschedulable_message:
+            conditions = [V1PodCondition(type='PodScheduled', status='False', reason='Unschedulable',
+                                         message=unschedulable_message)]
+        return V1Pod(metadata=V1ObjectMeta(name=name),
+                     status=V1PodStatus(phase='Pending', container_statuses=container_statuses, conditions=conditions))
+
+    def _create_event(self, pod_name, reason, message, minute):
+        return V1Event(metadata=V1ObjectMeta(name='event'), involved_object=V1ObjectReference(kind='Pod', name=pod_name),
+                       reason=reason, message=message, last_timestamp=datetime(2019, 1, 1, 0, minute))
+
+    def test_image_pull_back_off_is_a_failure(self):
+        # arrange
+        self.clients.core_api.list_namespaced_pod.return_value.items = [
+            self._create_pod('app-1', 'ContainerCreating'),
+            self._create_pod('app-2', 'ImagePullBackOff', 'Back-off pulling image "nginx:bad"')]
+
+        # act
+        diagnosis = self.service.diagnose(self.clients, 'ns', 'app==app')
+
+        # assert
+        self.assertEquals(diagnosis.failure, 'container app of pod app-2: ImagePullBackOff: '
+                                             'Back-off pulling image "nginx:bad"')
+        self.clients.core_api.list_namespaced_event.assert_not_called()
+
+    def test_transient_waiting_reasons_are_not_failures(self):
+        # arrange
+        self.clients.core_api.list_namespaced_pod.return_value.items = [
+            self._create_pod('app-1', 'ContainerCreating'),
+            self._create_pod('app-2', 'ErrImagePull', 'timeout')]
+
+        # act
+        diagnosis = self.service.diagnose(self.clients, 'ns', 'app==app')
+
+        # assert
+        self.assertIsNone(diagnosis.failure)
+        self.assertFalse(diagnosis.scaling_up)
+        self.assertEquals(diagnosis.summary, 'container app of pod app-2: ErrImagePull: timeout')
+
+    def test_crash_loop_is_a_failure_after_the_restart_threshold(self):
+        # arrange
+        self.clients.core_api.list_namespaced_pod.return_value.items = [
+            self._create_pod('app-1', 'CrashLoopBackOff', 'back-off 5m0s', restart_count=5)]
+
+        # act
+        diagnosis = self.service.diagnose(self.clients, 'ns', 'app==app')
+
+        # assert
+        self.assertEquals(diagnosis.failure, 'container app of pod app-1: CrashLoopBackOff: back-off 5m0s '
+                                             '(restarted 5 times)')
+
+    def test_pod_that_recovers_from_a_crash_loop_is_not_a_failure(self):
+        # arrange
+        self.clients.core_api.list_namespaced_pod.return_value.items = [
+            self._create_pod('app-1', 'CrashLoopBackOff', 'back-off 20s', restart_count=2)]
+        crash_loop_diagnosis = self.service.diagnose(self.clients, 'ns', 'app==app')
+        self.clients.core_api.list_namespaced_pod.return_value.items = [self._create_pod('app-1')]
+
+        # act
+        diagnosis = self.service.diagnose(self.clients, 'ns', 'app==app')
+
+        # assert
+        self.assertIsNone(crash_loop_diagnosis.failure)
+        self.assertEquals(crash_loop_diagnosis.summary, 'container app of pod app-1: CrashLoopBackOff: back-off 20s '
+                                                        '(restarted 2 times)')
+        self.assertIsNone(diagnosis.failure)
+        self.assertEquals(diagnosis.reasons, [])
+
+    def test_unschedulable_pod_with_triggered_scale_up_is_scaling_up(self):
+        # arrange
+        self.clients.core_api.list_namespaced_pod.return_value.items = [
+            self._create_pod('app-1', unschedulable_message='0/3 nodes are available: 3 Insufficient cpu.')]
+        self.clients.core_api.list_namespaced_event.return_value.items = [
+            self._create_event('app-1', 'NotTriggerScaleUp', 'max node group size reached', 1),
+            self._create_event('app-1', 'TriggeredScaleUp', 'pod triggered scale-up', 2),
+            self._create_event('other', 'NotTriggerScaleUp', 'max node group size reached', 3)]
+
+        # act
+        diagnosis = self.service.diagnose(self.clients, 'ns', 'app==app')
+
+        # assert
+        self.assertIsNone(diagnosis.failure)
+        self.assertTrue(diagnosis.scaling_up)
+        self.assertEquals(diagnosis.summary, 'pod app-1 is unschedulable: 0/3 nodes are available: 3 Insufficient cpu.')
+
+    def test_unschedulable_pod_without_scale_up_is_a_failure(self):
+        # arrange
+        self.clients.core_api.list_namespaced_pod.return_value.items = [
+            self._create_pod('app-1', unschedulable_message='0/3 nodes are available')]
+        self.clients.core_api.list_namespaced_event.return_value.items = [
+            self._create_event('app-1', 'NotTriggerScaleUp', 'max node group size reached', 1)]
+
+        # act
+        diagnosis = self.service.diagnose(self.clients, 'ns', 'app==app')
+
+        # assert
+        self.assertIn("pod app-1 is unschedulable (0/3 nodes are available)", diagnosis.failure)
+        self.assertIn("max node group size reached", diagnosis.failure)
+
+    def test_summary_is_capped(self):
+        # arrange
+        diagnosis = PodsDiagnosis(reasons=['r1', 'r2', 'r3', 'r4', 'r5'])
+
+        # act & assert
+        self.assertEquals(diagnosis.summary, 'r1; r2; r3; 2 more')
+
+    @patch('domain.services.deployment.sleep_with_cancellation')
+    @patch('domain.services.deployment.time')
+    def test_replicas_wait_is_extended_while_scaling_up(self, time_module, sleep):
+        # arrange
+        time_module.time.side_effect = [0, 0, 130, 130, 200, 200, 800]
+        pod_diagnostics_service = Mock()
+        pod_diagnostics_service.diagnose.return_value = PodsDiagnosis(scaling_up=True, reasons=['pending'])
+        deployment_service = KubernetesDeploymentService(pod_diagnostics_service)
+        deployment_service._list_polled_objects = Mock(return_value=[])
+        deployment_service._get_polled_deployment = Mock(return_value=Mock())
+        deployment = deployment_service._get_polled_deployment.return_value
+        deployment.metadata.generation = 1
+        deployment.spec.replicas = 1
+        deployment.status = AppsV1beta1DeploymentStatus(observed_generation=1, replicas=1, updated_replicas=1)
+
+        # act & assert
+        with self.assertRaisesRegexp(Exception, r'Timeout waiting .* \(0 ready\): pending'):
+            deployment_service.wait_until_all_replicas_ready(Mock(), Mock(), 'ns', 'app', 'deployed-app',
+                                                             timeout=120, scale_up_timeout=600)
+        self.assertEquals(sleep.call_count, 2)
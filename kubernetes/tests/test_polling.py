@@ -0,0 +1,85 @@
+import random
+import threading
+import time
+import unittest
+
+from mock import Mock
+
+from domain.common.polling import PollingScheduler, CoalescedLister
+
+
+class TestPollingScheduler(unittest.TestCase):
+
+    def test_backoff_grows_exponentially_with_jitter(self):
+        # arrange
+        scheduler = PollingScheduler(initial_delay=0.5, max_delay=10, jitter=0.3, random_generator=random.Random(1))
+        backoff = scheduler.create_backoff()
+
+        # act
+        delays = [backoff.next_delay() for _ in range(8)]
+
+        # assert
+        for delay, expected in zip(delays, [0.5, 1, 2, 4, 8, 10, 10, 10]):
+            self.assertTrue(expected * 0.7 <= delay <= expected * 1.3)
+        self.assertNotEqual(delays[-1], delays[-2])
+
+    def test_backoff_adapts_to_apiserver_latency(self):
+        # arrange
+        scheduler = PollingScheduler(initial_delay=0.5, max_delay=10, jitter=0, latency_factor=5)
+        scheduler.record_latency(0.4)
+
+        # act
+        delays = [scheduler.create_backoff().next_delay(), scheduler.create_backoff(max_delay=1).next_delay()]
+
+        # assert
+        self.assertEquals(delays, [2, 1])
+
+
+class TestCoalescedLister(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        # arrange
+        lister = CoalescedLister()
+        release = threading.Event()
+        fetch = Mock(side_effect=lambda: release.wait(5) and ['deployment'])
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(lister.list('ns', fetch))) for _ in range(5)]
+
+        # act
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        # assert
+        self.assertEquals(fetch.call_count, 1)
+        self.assertEquals(results, [['deployment']] * 5)
+
+    def test_calls_started_before_not_before_are_not_shared(self):
+        # arrange
+        lister = CoalescedLister(max_age=60)
+        fetch = Mock(side_effect=[['old'], ['new']])
+        lister.list('ns', fetch)
+
+        # act
+        shared = lister.list('ns', fetch, not_before=0)
+        fresh = lister.list('ns', fetch, not_before=time.time() + 1)
+
+        # assert
+        self.assertEquals(shared, ['old'])
+        self.assertEquals(fresh, ['new'])
+
+    def test_failed_calls_are_not_shared_with_later_callers(self):
+        # arrange
+        lister = CoalescedLister(max_age=60)
+        fetch = Mock(side_effect=[ValueError('failed'), ['deployment']])
+
+        # act
+        with self.assertRaises(ValueError):
+            lister.list('ns', fetch)
+        result = lister.list('ns', fetch)
+
+        # assert
+        self.assertEquals(result, ['deployment'])
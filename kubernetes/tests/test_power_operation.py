@@ -1,6 +1,6 @@
 import unittest
 
-from mock import Mock
+from mock import Mock, patch
 
 from domain.operations.power import PowerOperation
 
@@ -90,3 +90,51 @@ class TestPowerOperation(unittest.TestCase):
             updated_deployment=deployment_mock)
 
         deployment_service.wait_until_all_replicas_ready.assert_called_once()
+
+    def test_power_cycle_waits_for_rollout_of_restart(self):
+        # arrange
+        logger = Mock()
+        clients = Mock()
+        deployed_app_mock = Mock()
+        deployed_app_mock.wait_for_replicas_to_be_ready = 100
+
+        deployment_service = Mock()
+        deployment_service.restart_app.return_value.spec.replicas = 2
+        deployment_service.restart_app.return_value.metadata.generation = 7
+
+        power_operation = PowerOperation(deployment_service)
+
+        # act
+        power_operation.power_cycle(logger=logger,
+                                    clients=clients,
+                                    deployed_app=deployed_app_mock)
+
+        # assert
+        deployment_service.restart_app.assert_called_once_with(logger=logger,
+                                                               clients=clients,
+                                                               namespace=deployed_app_mock.namespace,
+                                                               app_name=deployed_app_mock.kubernetes_name)
+        deployment_service.update_deployment.assert_not_called()
+        self.assertEquals(deployment_service.wait_until_all_replicas_ready.call_args[1]['generation'], 7)
+
+    @patch('domain.operations.power.sleep_with_cancellation')
+    def test_power_cycle_pauses_for_delay(self, sleep_with_cancellation):
+        # arrange
+        deployed_app_mock = Mock()
+        deployed_app_mock.wait_for_replicas_to_be_ready = 0
+        deployment_service = Mock()
+        cancellation_context = Mock()
+
+        power_operation = PowerOperation(deployment_service)
+
+        # act
+        power_operation.power_cycle(logger=Mock(),
+                                    clients=Mock(),
+                                    deployed_app=deployed_app_mock,
+                                    delay=5,
+                                    cancellation_context=cancellation_context)
+
+        # assert
+        self.assertEquals(sleep_with_cancellation.call_args[0][:2], (5, cancellation_context))
+        deployment_service.restart_app.assert_called_once()
+        deployment_service.wait_until_all_replicas_ready.assert_not_called()
@@ -88,6 +88,44 @@ class TestPrepareOperation(unittest.TestCase):
         create_keys_result = self._single(results, lambda x: isinstance(x, CreateKeysActionResult))
         self.assertEquals(create_keys_result.actionId, create_keys_action.actionId)
 
+    def test_prepare_claims_pooled_namespace(self):
+        # arrange
+        actions = [Mock(spec=PrepareCloudInfra, actionId=Mock()), Mock(spec=PrepareSubnet, actionId=Mock()),
+                   Mock(spec=CreateKeys, actionId=Mock())]
+        logger = Mock()
+        clients = Mock()
+        self.namespace_service.get_single_by_id = Mock(return_value=None)
+
+        # act
+        self.prepare_operation.prepare(logger=logger,
+                                       sandbox_id='sandbox',
+                                       clients=clients,
+                                       actions=actions,
+                                       namespace_pool_size=3)
+
+        # assert
+        self.namespace_service.claim_pooled_namespace.assert_called_once_with(logger, clients, 'sandbox')
+        self.namespace_service.create.assert_not_called()
+        self.namespace_service.top_up_pool.assert_called_once_with(logger, clients, 3)
+
+    def test_prepare_creates_namespace_when_pool_is_empty(self):
+        # arrange
+        actions = [Mock(spec=PrepareCloudInfra, actionId=Mock()), Mock(spec=PrepareSubnet, actionId=Mock()),
+                   Mock(spec=CreateKeys, actionId=Mock())]
+        self.namespace_service.get_single_by_id = Mock(return_value=None)
+        self.namespace_service.claim_pooled_namespace = Mock(return_value=None)
+
+        # act
+        self.prepare_operation.prepare(logger=Mock(),
+                                       sandbox_id='sandbox',
+                                       clients=Mock(),
+                                       actions=actions,
+                                       namespace_pool_size=3)
+
+        # assert
+        self.namespace_service.create.assert_called_once()
+        self.namespace_service.top_up_pool.assert_called_once()
+
     @staticmethod
     def _single(lst, predicate):
         return filter(predicate, lst)[0]
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+
+from domain.common.profiling import CommandProfiler, ProfilingMode, get_reservation_id, PROFILING_ENV_VARIABLE
+
+
+class TestCommandProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.profiles_dir = tempfile.mkdtemp()
+        self.profiler = CommandProfiler(profiles_dir=self.profiles_dir, max_profiles=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.profiles_dir, ignore_errors=True)
+
+    def test_get_mode_from_resource_attribute(self):
+        # arrange
+        context = Mock()
+        context.resource.attributes = {'Kubernetes.Profiling': 'CPU'}
+
+        # act
+        with patch.dict(os.environ, {}, clear=True):
+            mode = self.profiler.get_mode(context)
+
+        # assert
+        self.assertEquals(mode, ProfilingMode.CPU)
+
+    def test_get_mode_environment_variable_overrides_attribute(self):
+        # arrange
+        context = Mock()
+        context.resource.attributes = {'Kubernetes.Profiling': 'Off'}
+
+        # act
+        with patch.dict(os.environ, {PROFILING_ENV_VARIABLE: 'CPU and Memory'}):
+            mode = self.profiler.get_mode(context)
+
+        # assert
+        self.assertEquals(mode, ProfilingMode.CPU_AND_MEMORY)
+
+    def test_get_mode_off_when_not_configured(self):
+        # arrange
+        context = Mock()
+        context.resource.attributes = {}
+
+        # act
+        with patch.dict(os.environ, {}, clear=True):
+            mode = self.profiler.get_mode(context)
+
+        # assert
+        self.assertEquals(mode, ProfilingMode.OFF)
+
+    def test_profile_off_does_not_write_dumps(self):
+        # act
+        with self.profiler.profile('Deploy', 'reservation-id', ProfilingMode.OFF):
+            pass
+
+        # assert
+        self.assertListEqual(os.listdir(self.profiles_dir), [])
+
+    def test_profile_writes_dump_with_reservation_id(self):
+        # act
+        with self.profiler.profile('Deploy', 'reservation-id', ProfilingMode.CPU):
+            sum(range(100))
+
+        # assert
+        dumps = os.listdir(self.profiles_dir)
+        self.assertEquals(len(dumps), 1)
+        self.assertTrue(dumps[0].endswith('_Deploy_reservation-id.prof'))
+
+    def test_profile_rotates_old_dumps(self):
+        # act
+        for _ in range(4):
+            with self.profiler.profile('PowerOn', 'reservation-id', ProfilingMode.CPU):
+                pass
+
+        # assert
+        self.assertEquals(len(os.listdir(self.profiles_dir)), 2)
+
+    def test_profile_does_not_swallow_command_errors(self):
+        # act & assert
+        with self.assertRaisesRegexp(ValueError, 'command failed'):
+            with self.profiler.profile('Deploy', 'reservation-id', ProfilingMode.CPU):
+                raise ValueError('command failed')
+
+        self.assertEquals(len(os.listdir(self.profiles_dir)), 1)
+
+    def test_get_reservation_id_for_remote_context(self):
+        # arrange
+        context = Mock(spec=['remote_reservation'])
+        context.remote_reservation.reservation_id = 'remote-reservation-id'
+
+        # act
+        reservation_id = get_reservation_id(context)
+
+        # assert
+        self.assertEquals(reservation_id, 'remote-reservation-id')
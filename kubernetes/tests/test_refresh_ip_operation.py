@@ -0,0 +1,81 @@
+import unittest
+
+from mock import Mock
+
+from domain.operations.refresh_ip import RefreshIpOperation
+from domain.services.tags import TagsService
+
+
+class TestRefreshIpOperation(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = Mock()
+        self.clients = Mock()
+        self.networking_service = Mock()
+        self.networking_service.get_external_address.return_value = None
+        self.deployed_app = Mock(namespace='ns', kubernetes_name='app', wait_for_ip=True)
+        self.refresh_ip_operation = RefreshIpOperation(self.networking_service, wait_for_ip_timeout=30)
+
+    def _create_service(self, label, spec_type, cluster_ip='10.0.0.1'):
+        service = Mock()
+        service.metadata.labels = {label: 'true'}
+        service.spec.type = spec_type
+        service.spec.cluster_ip = cluster_ip
+        return service
+
+    def test_load_balancer_address_is_returned_without_waiting(self):
+        # arrange
+        self.networking_service.get_services_by_app_name.return_value = [
+            self._create_service(TagsService.EXTERNAL_SERVICE, 'LoadBalancer')]
+        self.networking_service.get_external_address.return_value = '203.0.113.1'
+
+        # act
+        address = self.refresh_ip_operation.refresh_ip(self.logger, self.clients, self.deployed_app)
+
+        # assert
+        self.assertEquals(address, '203.0.113.1')
+        self.networking_service.wait_for_external_address.assert_not_called()
+
+    def test_waits_for_load_balancer_address(self):
+        # arrange
+        cancellation_context = Mock()
+        self.networking_service.get_services_by_app_name.return_value = [
+            self._create_service(TagsService.INTERNAL_SERVICE, 'ClusterIP'),
+            self._create_service(TagsService.EXTERNAL_SERVICE, 'LoadBalancer')]
+        self.networking_service.wait_for_external_address.return_value = 'lb.example.com'
+
+        # act
+        address = self.refresh_ip_operation.refresh_ip(self.logger, self.clients, self.deployed_app,
+                                                       cancellation_context)
+
+        # assert
+        self.assertEquals(address, 'lb.example.com')
+        self.networking_service.wait_for_external_address.assert_called_once_with(
+            logger=self.logger, clients=self.clients, namespace='ns', app_name='app', timeout=30,
+            cancellation_context=cancellation_context)
+
+    def test_does_not_wait_without_wait_for_ip(self):
+        # arrange
+        self.deployed_app.wait_for_ip = False
+        self.networking_service.get_services_by_app_name.return_value = [
+            self._create_service(TagsService.EXTERNAL_SERVICE, 'LoadBalancer')]
+
+        # act
+        address = self.refresh_ip_operation.refresh_ip(self.logger, self.clients, self.deployed_app)
+
+        # assert
+        self.assertIsNone(address)
+        self.networking_service.wait_for_external_address.assert_not_called()
+
+    def test_address_is_unchanged_without_load_balancer(self):
+        # arrange
+        self.networking_service.get_services_by_app_name.return_value = [
+            self._create_service(TagsService.INTERNAL_SERVICE, 'ClusterIP', cluster_ip='10.0.0.7'),
+            self._create_service(TagsService.EXTERNAL_SERVICE, 'NodePort')]
+
+        # act
+        address = self.refresh_ip_operation.refresh_ip(self.logger, self.clients, self.deployed_app)
+
+        # assert
+        self.assertIsNone(address)
+        self.networking_service.wait_for_external_address.assert_not_called()
@@ -0,0 +1,97 @@
+import unittest
+
+from kubernetes.client import AppsV1beta1Deployment, AppsV1beta1DeploymentSpec, AppsV1beta1DeploymentStatus, \
+    AppsV1beta1DeploymentCondition, V1ObjectMeta, V1PodTemplateSpec
+
+from domain.services.rollout_status import RolloutStatusEvaluator
+
+
+class TestRolloutStatusEvaluator(unittest.TestCase):
+
+    def setUp(self):
+        self.evaluator = RolloutStatusEvaluator()
+
+    def _create_deployment(self, generation=2, spec_replicas=3, **status):
+        return AppsV1beta1Deployment(metadata=V1ObjectMeta(name='app', generation=generation),
+                                     spec=AppsV1beta1DeploymentSpec(replicas=spec_replicas, template=V1PodTemplateSpec()),
+                                     status=AppsV1beta1DeploymentStatus(**status))
+
+    def test_done_when_all_replicas_are_updated_and_available(self):
+        # arrange
+        deployment = self._create_deployment(observed_generation=2, replicas=3, updated_replicas=3,
+                                             ready_replicas=3, available_replicas=3)
+
+        # act
+        rollout_status = self.evaluator.evaluate(deployment)
+
+        # assert
+        self.assertTrue(rollout_status.done)
+
+    def test_ready_replicas_of_unobserved_spec_are_not_done(self):
+        # arrange
+        deployment = self._create_deployment(observed_generation=1, replicas=3, updated_replicas=3,
+                                             ready_replicas=3, available_replicas=3)
+
+        # act
+        rollout_status = self.evaluator.evaluate(deployment)
+
+        # assert
+        self.assertFalse(rollout_status.done)
+        self.assertIn('to be observed', rollout_status.message)
+
+    def test_waits_for_generation_of_restart(self):
+        # arrange
+        deployment = self._create_deployment(generation=2, observed_generation=2, replicas=3, updated_replicas=3,
+                                             available_replicas=3)
+
+        # act
+        rollout_status = self.evaluator.evaluate(deployment, generation=3)
+
+        # assert
+        self.assertFalse(rollout_status.done)
+
+    def test_waits_for_old_replicas_to_terminate(self):
+        # arrange
+        deployment = self._create_deployment(observed_generation=2, replicas=4, updated_replicas=3,
+                                             ready_replicas=4, available_replicas=4)
+
+        # act
+        rollout_status = self.evaluator.evaluate(deployment)
+
+        # assert
+        self.assertFalse(rollout_status.done)
+        self.assertEquals(rollout_status.message, '1 old replicas are pending termination')
+
+    def test_waits_for_updated_replicas_to_be_available(self):
+        # arrange
+        deployment = self._create_deployment(observed_generation=2, replicas=3, updated_replicas=3,
+                                             available_replicas=2)
+
+        # act
+        rollout_status = self.evaluator.evaluate(deployment)
+
+        # assert
+        self.assertFalse(rollout_status.done)
+        self.assertEquals(rollout_status.message, '2 of 3 updated replicas are available')
+
+    def test_scaled_to_zero_is_done(self):
+        # arrange
+        deployment = self._create_deployment(spec_replicas=0, observed_generation=2)
+
+        # act & assert
+        self.assertTrue(self.evaluator.evaluate(deployment).done)
+
+    def test_progress_deadline_exceeded_is_a_failure(self):
+        # arrange
+        condition = AppsV1beta1DeploymentCondition(type='Progressing', status='False',
+                                                   reason='ProgressDeadlineExceeded',
+                                                   message='ReplicaSet "app-1" has timed out progressing.')
+        deployment = self._create_deployment(observed_generation=2, replicas=3, updated_replicas=1,
+                                             conditions=[condition])
+
+        # act
+        rollout_status = self.evaluator.evaluate(deployment)
+
+        # assert
+        self.assertFalse(rollout_status.done)
+        self.assertIn('has timed out progressing', rollout_status.failure)
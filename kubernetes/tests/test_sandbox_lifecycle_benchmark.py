@@ -0,0 +1,39 @@
+import unittest
+
+from benchmarks.sandbox_lifecycle import BenchmarkOptions, COMMANDS, find_regressions, percentile, run_benchmark
+
+
+class TestSandboxLifecycleBenchmark(unittest.TestCase):
+
+    def test_percentile_interpolates_between_ranks(self):
+        # act & assert
+        self.assertEquals(percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertEquals(percentile([1, 2, 3, 4, 5], 100), 5)
+        self.assertEquals(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_find_regressions_reports_metrics_over_tolerance(self):
+        # arrange
+        baseline = {'peak_rss_kb': 1000, 'commands': {'Deploy': {'p50_ms': 100.0, 'api_calls_per_command': 4.0}}}
+        results = {'peak_rss_kb': 1100, 'commands': {'Deploy': {'p50_ms': 130.0, 'api_calls_per_command': 4.0}}}
+
+        # act
+        regressions = find_regressions(results, baseline, tolerance=0.2)
+
+        # assert
+        self.assertEquals(regressions, ['Deploy p50_ms: 100.00 -> 130.00'])
+
+    def test_run_benchmark_runs_full_lifecycle(self):
+        # arrange
+        options = BenchmarkOptions(sandboxes=2, apps=1, concurrency=2, wait_for_replicas=0, readiness_delay=0,
+                                   load_balancer_delay=0)
+
+        # act
+        results = run_benchmark(options)
+
+        # assert
+        self.assertEquals(results['sandboxes_failed'], 0, results['errors'])
+        self.assertTrue(results['peak_rss_kb'] > 0)
+        for command_name in COMMANDS:
+            self.assertEquals(results['commands'][command_name]['count'], 2)
+            self.assertTrue(results['commands'][command_name]['api_calls'] > 0)
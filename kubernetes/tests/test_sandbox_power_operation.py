@@ -0,0 +1,100 @@
+import unittest
+
+from mock import Mock
+
+from domain.operations.sandbox_power import SandboxPowerOperation
+from domain.services.tags import TagsService
+
+
+class TestSandboxPowerOperation(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = Mock()
+        self.clients = Mock()
+        self.namespace_service = Mock()
+        self.namespace_service.get_single_by_id.return_value.metadata.name = 'ns'
+        self.deployment_service = Mock()
+        self.deployment_service.scale_app.side_effect = self._scale_app
+        self.deployment_service.watch_until_apps_ready.side_effect = \
+            lambda apps, **kwargs: {name: 1.5 for name in apps}
+        self.sandbox_power_operation = SandboxPowerOperation(self.namespace_service, self.deployment_service)
+        self.deployments = {}
+
+    def _add_deployment(self, name, replicas='1', wait_for_replicas='60', depends_on=None):
+        deployment = Mock()
+        deployment.metadata.name = name
+        deployment.metadata.annotations = {TagsService.WAIT_FOR_REPLICAS: wait_for_replicas}
+        if replicas is not None:
+            deployment.metadata.annotations[TagsService.REPLICAS] = replicas
+        if depends_on:
+            deployment.metadata.annotations[TagsService.DEPENDS_ON] = depends_on
+        self.deployments[name] = deployment
+        self.clients.apps_api.list_namespaced_deployment.return_value.items = self.deployments.values()
+
+    def _scale_app(self, logger, clients, namespace, name, replicas):
+        deployment = self.deployments[name]
+        deployment.metadata.generation = 2
+        return deployment
+
+    def test_apps_are_powered_on_after_their_dependencies(self):
+        # arrange
+        self._add_deployment('web', replicas='2', depends_on='api')
+        self._add_deployment('api', depends_on='db, cache')
+        self._add_deployment('db')
+        self._add_deployment('cache')
+
+        # act
+        results = self.sandbox_power_operation.power_on(self.logger, self.clients, 'sandbox')
+
+        # assert
+        self.assertEquals([(result.name, result.wave, result.replicas) for result in results],
+                          [('cache', 1, 1), ('db', 1, 1), ('api', 2, 1), ('web', 3, 2)])
+        self.assertTrue(all(result.seconds == 1.5 for result in results))
+        waits = self.deployment_service.watch_until_apps_ready.call_args_list
+        self.assertEquals([call[1]['apps'] for call in waits],
+                          [{'cache': (2, 60), 'db': (2, 60)}, {'api': (2, 60)}, {'web': (2, 60)}])
+        self.assertEquals(waits[0][1]['label_selector'], '{}=sandbox'.format(TagsService.SANDBOX_ID))
+
+    def test_dependency_cycle_raises(self):
+        # arrange
+        self._add_deployment('a', depends_on='b')
+        self._add_deployment('b', depends_on='a')
+        self._add_deployment('c')
+
+        # act & assert
+        with self.assertRaisesRegexp(ValueError, 'apps a, b form a cycle'):
+            self.sandbox_power_operation.power_on(self.logger, self.clients, 'sandbox')
+        self.deployment_service.scale_app.assert_not_called()
+
+    def test_apps_without_replicas_annotation_are_reported_as_failures(self):
+        # arrange
+        self._add_deployment('old', replicas=None)
+        self._add_deployment('new', wait_for_replicas='0', depends_on='missing')
+
+        # act & assert
+        with self.assertRaisesRegexp(ValueError, 'Apps old of sandbox sandbox were not powered on:\n'
+                                                 'wave 1: new scaled to 1 replicas\n'
+                                                 'wave 1: old failed, its replicas are unknown'):
+            self.sandbox_power_operation.power_on(self.logger, self.clients, 'sandbox')
+        self.deployment_service.scale_app.assert_called_once_with(self.logger, self.clients, 'ns', 'new', 1)
+        self.deployment_service.watch_until_apps_ready.assert_not_called()
+
+    def test_power_off_scales_all_apps_to_zero(self):
+        # arrange
+        self._add_deployment('web', depends_on='db')
+        self._add_deployment('db')
+
+        # act
+        results = self.sandbox_power_operation.power_off(self.logger, self.clients, 'sandbox')
+
+        # assert
+        self.assertEquals([(result.name, result.replicas) for result in results], [('db', 0), ('web', 0)])
+        self.assertEquals(self.deployment_service.scale_app.call_count, 2)
+
+    def test_raises_when_no_namespace(self):
+        # arrange
+        self.namespace_service.get_single_by_id.return_value = None
+
+        # act & assert
+        with self.assertRaisesRegexp(ValueError, "Namespace for sandbox 'sandbox' not found"):
+            self.sandbox_power_operation.power_on(self.logger, self.clients, 'sandbox')
@@ -0,0 +1,71 @@
+import threading
+import time
+import unittest
+
+from mock import Mock
+
+from domain.common.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        self.release = threading.Event()
+
+    def _run_concurrently(self, function, count=4):
+        results = []
+        errors = []
+
+        def run():
+            try:
+                results.append(self.single_flight.do('key', function))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results, errors
+
+    def test_concurrent_calls_share_one_call_with_independent_results(self):
+        # arrange
+        function = Mock(side_effect=lambda: self.release.wait(5) and {'replicas': 1})
+
+        # act
+        results, errors = self._run_concurrently(function)
+        results[0]['replicas'] = 0
+
+        # assert
+        self.assertEquals(function.call_count, 1)
+        self.assertEquals(errors, [])
+        self.assertEquals(len(results), 4)
+        self.assertEquals([result['replicas'] for result in results[1:]], [1, 1, 1])
+        self.assertEquals(len(set(id(result) for result in results)), 4)
+
+    def test_errors_are_raised_to_all_concurrent_callers(self):
+        # arrange
+        def function():
+            self.release.wait(5)
+            raise ValueError('list failed')
+
+        # act
+        results, errors = self._run_concurrently(function)
+
+        # assert
+        self.assertEquals(results, [])
+        self.assertEquals([str(error) for error in errors], ['list failed'] * 4)
+
+    def test_sequential_calls_are_not_shared(self):
+        # arrange
+        function = Mock(side_effect=[1, 2])
+
+        # act
+        results = [self.single_flight.do('key', function), self.single_flight.do('key', function)]
+
+        # assert
+        self.assertEquals(results, [1, 2])
@@ -1,6 +1,7 @@
 import unittest
 
-from domain.common.utils import convert_to_int_list, convert_app_name_to_valid_kubernetes_name
+from domain.common.utils import convert_to_int_list, convert_app_name_to_valid_kubernetes_name, \
+    create_custom_params_index, truncate_for_log
 
 
 class TestUtils(unittest.TestCase):
@@ -23,4 +24,25 @@ class TestUtils(unittest.TestCase):
         result = convert_app_name_to_valid_kubernetes_name(app_name)
 
         # assert
-        self.assertEqual(result, 'kube-test')
\ No newline at end of file
+        self.assertEqual(result, 'kube-test')
+
+    def test_create_custom_params_index_keeps_first_param(self):
+        # arrange
+        custom_params = [{'name': 'namespace', 'value': 'first'},
+                         {'name': 'replicas', 'value': '2'},
+                         {'name': 'namespace', 'value': 'second'}]
+
+        # act
+        result = create_custom_params_index(custom_params)
+
+        # assert
+        self.assertDictEqual(result, {'namespace': 'first', 'replicas': '2'})
+
+    def test_truncate_for_log(self):
+        # act
+        short_text = truncate_for_log('short', max_length=10)
+        long_text = truncate_for_log('a' * 15, max_length=10)
+
+        # assert
+        self.assertEquals(short_text, 'short')
+        self.assertEquals(long_text, 'aaaaaaaaaa... (5 more characters)')
@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import Mock, patch
+
+from domain.operations.vm_details import VmDetialsOperation
+from domain.services.clients import ApiClientsProvider
+from domain.services.deployment import KubernetesDeploymentService
+from domain.services.namespace import KubernetesNamespaceService
+from domain.services.networking import KubernetesNetworkingService
+from domain.services.tags import TagsService
+from domain.services.vm_details import VmDetailsProvider
+from domain.services.vm_details_cache import VmDetailsCache
+from model.deployed_app import DeployedAppResource
+from model.deployment_requests import AppDeploymentRequest, ApplicationImage
+from tests.fake_apiserver import FakeKubernetesApiServer
+
+
+class TestVmDetailsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeKubernetesApiServer().start()
+        config_file_path = self.server.write_kubeconfig(os.path.join(self.tmp_dir, 'config'))
+        self.clients = ApiClientsProvider().get_api_clients(Mock(config_file_path=config_file_path))
+
+        self.logger = Mock()
+        self.networking_service = KubernetesNetworkingService()
+        self.deployment_service = KubernetesDeploymentService()
+        self.cache = VmDetailsCache(idle_timeout=2, watch_timeout=1, retry_delay=0.1)
+        self.vm_details_operation = VmDetialsOperation(self.networking_service, self.deployment_service,
+                                                       VmDetailsProvider(), self.cache, poll_interval=0.01)
+
+        self.namespace = KubernetesNamespaceService().create(self.clients, 'cloudshell-sandbox',
+                                                             {TagsService.SANDBOX_ID: 'sandbox'}, None).metadata.name
+        self._create_app('app')
+
+    def tearDown(self):
+        self.cache.close(timeout=5)
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _create_app(self, name):
+        app = AppDeploymentRequest(name=name, image=ApplicationImage('nginx', '1.15'), start_command=None,
+                                   environment_variables=None, compute_spec=None, internal_ports=[80],
+                                   external_ports=[], replicas=1)
+        labels = {TagsService.SANDBOX_ID: 'sandbox'}
+        self.networking_service.create_internal_external_set(self.logger, self.clients, self.namespace, name, labels,
+                                                             [80], [], 'LoadBalancer')
+        self.deployment_service.create_app(self.logger, self.clients, self.namespace, name, labels, app)
+        self.deployment_service.wait_until_all_replicas_ready(self.logger, self.clients, self.namespace, name,
+                                                              name, delay=0.05, timeout=5)
+
+    def _get_vm_details(self, name='app'):
+        items = {'items': [{'deployedAppJson': {
+            'name': name,
+            'vmdetails': {'uid': name,
+                          'vmCustomParams': [{'name': 'namespace', 'value': self.namespace},
+                                             {'name': 'replicas', 'value': '1'}]}}}]}
+        return self.vm_details_operation.create_vm_details_bulk(self.logger, self.clients, items)[0]
+
+    def _wait_for_watch(self, name='app'):
+        watcher = self.cache._get_watcher(self.clients, self.namespace)
+        deadline = time.time() + 5
+        while watcher.get_versions(name) is None and time.time() < deadline:
+            time.sleep(0.01)
+
+    def _get_read_requests(self):
+        # the watches of the cache are renewed in the background every watch_timeout
+        return [request for request in self.server.requests if str(request[2].get('watch')).lower() != 'true']
+
+    def _get_property(self, vm_details, key):
+        return next(p.value for p in vm_details.vmInstanceData if p.key == key)
+
+    def test_refreshes_of_idle_app_send_no_requests(self):
+        # arrange
+        self._get_vm_details()
+        self._wait_for_watch()
+        self.server.reset_requests()
+
+        # act
+        vm_details = self._get_vm_details()
+
+        # assert
+        self.assertEquals(self._get_property(vm_details, 'Image'), 'nginx:1.15')
+        self.assertEquals(self._get_read_requests(), [])
+
+    def test_changed_deployment_invalidates_the_cached_vm_details(self):
+        # arrange
+        self._get_vm_details()
+        self._wait_for_watch()
+        deployment = self.deployment_service.get_deployment_by_name(self.clients, self.namespace, 'app')
+        deployment.spec.template.spec.containers[0].image = 'nginx:1.16'
+        self.clients.apps_api.replace_namespaced_deployment(deployment.metadata.name, self.namespace, deployment)
+
+        # act
+        deadline = time.time() + 5
+        vm_details = self._get_vm_details()
+        while self._get_property(vm_details, 'Image') != 'nginx:1.16' and time.time() < deadline:
+            time.sleep(0.01)
+            vm_details = self._get_vm_details()
+
+        # assert
+        self.assertEquals(self._get_property(vm_details, 'Image'), 'nginx:1.16')
+
+    def test_cached_vm_details_of_other_apps_stay_valid(self):
+        # arrange
+        self._create_app('other')
+        self._get_vm_details('app')
+        self._get_vm_details('other')
+        self._wait_for_watch()
+        self.clients.apps_api.patch_namespaced_deployment_scale('other', self.namespace,
+                                                                {'spec': {'replicas': 2}})
+        time.sleep(0.2)
+        self.server.reset_requests()
+
+        # act
+        self._get_vm_details('app')
+
+        # assert
+        self.assertEquals(self._get_read_requests(), [])
+
+    def test_without_watch_entries_expire_after_ttl(self):
+        # arrange
+        cache = VmDetailsCache(use_watch=False, ttl=30)
+        clients = Mock()
+        deployed_app = DeployedAppResource(deployed_app_dict={
+            'name': 'app', 'vmdetails': {'uid': 'app', 'vmCustomParams': [{'name': 'namespace', 'value': 'ns'},
+                                                                          {'name': 'replicas', 'value': '1'}]}})
+        vm_details = Mock(errorMessage=None)
+
+        with patch('domain.services.vm_details_cache.time.time', return_value=100):
+            cache.put(clients, deployed_app, vm_details, None, [])
+
+        # act
+        with patch('domain.services.vm_details_cache.time.time', return_value=129):
+            fresh = cache.get(clients, deployed_app)
+        with patch('domain.services.vm_details_cache.time.time', return_value=131):
+            expired = cache.get(clients, deployed_app)
+
+        # assert
+        self.assertIs(fresh, vm_details)
+        self.assertIsNone(expired)
+
+    def test_vm_details_with_errors_are_not_cached(self):
+        # arrange
+        cache = VmDetailsCache(use_watch=False)
+        clients = Mock()
+        deployed_app = Mock(namespace='ns', kubernetes_name='app', cloudshell_resource_name='app', replicas=1)
+
+        # act
+        cache.put(clients, deployed_app, Mock(errorMessage='failed'), None, [])
+
+        # assert
+        self.assertIsNone(cache.get(clients, deployed_app))
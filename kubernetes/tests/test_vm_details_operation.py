@@ -1,3 +1,4 @@
+import threading
 import unittest
 
 from mock import Mock, MagicMock, patch
@@ -7,6 +8,25 @@ from domain.operations.vm_details import VmDetialsOperation
 
 class TestVmDetailsOperation(unittest.TestCase):
 
+    def setUp(self):
+        self.vm_details_service = Mock()
+        self.vm_details_service.create_vm_details.side_effect = \
+            lambda services, deployment, deployed_app, deploy_app_name: deploy_app_name
+        self.deployment_service = Mock()
+        self.networking_service = Mock()
+        self.vm_details_operation = VmDetialsOperation(vm_details_service=self.vm_details_service,
+                                                       deployment_service=self.deployment_service,
+                                                       networking_service=self.networking_service,
+                                                       item_timeout=0.5,
+                                                       poll_interval=0.01)
+
+    def _create_items(self, *apps):
+        return {'items': [{'deployedAppJson': {'name': name,
+                                               'vmdetails': {'uid': name,
+                                                             'vmCustomParams': [{'name': 'namespace',
+                                                                                 'value': namespace}]}}}
+                          for name, namespace in apps]}
+
     @patch('domain.operations.vm_details.DeployedAppResource')
     def test_create_vm_details_bulk(self, deployed_app_resource_class):
         # arrange
@@ -27,3 +47,73 @@ class TestVmDetailsOperation(unittest.TestCase):
         # assert
         self.assertEquals(len(results), 2)
         self.assertEquals(vm_details_service.create_vm_details.call_count, 2)
+
+    def test_iter_vm_details_keeps_request_order_across_namespaces(self):
+        # arrange
+        items = self._create_items(('a1', 'ns-a'), ('b1', 'ns-b'), ('a2', 'ns-a'), ('c1', 'ns-c'))
+
+        # act
+        results = list(self.vm_details_operation.iter_vm_details(Mock(), Mock(), items))
+
+        # assert
+        self.assertEquals(results, ['a1', 'b1', 'a2', 'c1'])
+
+    def test_slow_namespace_does_not_block_other_namespaces(self):
+        # arrange
+        release = threading.Event()
+        resolved = []
+
+        def get_deployment_by_name(clients, namespace, app_name):
+            if namespace == 'ns-slow':
+                release.wait(5)
+            resolved.append(app_name)
+
+        self.deployment_service.get_deployment_by_name.side_effect = get_deployment_by_name
+        items = self._create_items(('slow', 'ns-slow'), ('fast1', 'ns-fast'), ('fast2', 'ns-fast'))
+        vm_details = self.vm_details_operation.iter_vm_details(Mock(), Mock(), items)
+
+        # act
+        first = next(vm_details)
+        release.set()
+        rest = list(vm_details)
+
+        # assert
+        self.assertEquals(first.appName, 'slow')
+        self.assertIn('Timed out', first.errorMessage)
+        self.assertEquals(resolved[:2], ['fast1', 'fast2'])
+        self.assertEquals(rest, ['fast1', 'fast2'])
+
+    def test_failed_item_gets_error_result(self):
+        # arrange
+        self.networking_service.get_services_by_app_name.side_effect = \
+            lambda clients, namespace, app_name: self._raise_for(app_name, 'broken')
+        items = self._create_items(('ok', 'ns'), ('broken', 'ns'), ('no-namespace', None))
+        items['items'][2] = {'deployedAppJson': {'name': 'no-namespace',
+                                                 'vmdetails': {'uid': 'x', 'vmCustomParams': []}}}
+
+        # act
+        results = list(self.vm_details_operation.iter_vm_details(Mock(), Mock(), items))
+
+        # assert
+        self.assertEquals(results[0], 'ok')
+        self.assertEquals(results[1].appName, 'broken')
+        self.assertEquals(results[1].errorMessage, 'failed broken')
+        self.assertEquals(results[2].appName, 'no-namespace')
+        self.assertIn("Couldn't get namespace", results[2].errorMessage)
+
+    def test_cancelled_items_get_error_results(self):
+        # arrange
+        cancellation_context = Mock(is_cancelled=True)
+        items = self._create_items(('a1', 'ns-a'), ('b1', 'ns-b'))
+
+        # act
+        results = list(self.vm_details_operation.iter_vm_details(Mock(), Mock(), items, cancellation_context))
+
+        # assert
+        self.assertEquals([result.appName for result in results], ['a1', 'b1'])
+        self.assertTrue(all('Cancelled' in result.errorMessage for result in results))
+        self.deployment_service.get_deployment_by_name.assert_not_called()
+
+    def _raise_for(self, app_name, failing_app_name):
+        if app_name == failing_app_name:
+            raise ValueError('failed {}'.format(app_name))
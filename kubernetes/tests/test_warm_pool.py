@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import Mock
+
+from domain.services.clients import ApiClientsProvider
+from domain.services.deployment import KubernetesDeploymentService
+from domain.services.tags import TagsService
+from domain.services.warm_pool import WarmPodPool
+from model.deployment_requests import AppComputeSpecKubernetes, AppComputeSpecKubernetesResources, \
+    AppDeploymentRequest, ApplicationImage
+from tests.fake_apiserver import FakeKubernetesApiServer, PODS
+
+
+class TestWarmPodPool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeKubernetesApiServer(readiness_delay=0.05).start()
+        config_file_path = self.server.write_kubeconfig(os.path.join(self.tmp_dir, 'config'))
+        self.clients = ApiClientsProvider().get_api_clients(Mock(config_file_path=config_file_path))
+
+        self.logger = Mock()
+        self.warm_pod_pool = WarmPodPool()
+        self.compute_spec = AppComputeSpecKubernetes(requests=AppComputeSpecKubernetesResources('0.5', '256M'),
+                                                     limits=AppComputeSpecKubernetesResources(None, None))
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _acquire_node(self, full_image_name='nginx:1.15', compute_spec=None):
+        return self.warm_pod_pool.acquire_node(self.logger, self.clients, 'redis, nginx:1.15', 2, full_image_name,
+                                               compute_spec or self.compute_spec)
+
+    def _wait_for_warm_pods(self, count):
+        end_time = time.time() + 5
+        while time.time() < end_time:
+            pods = self.server.list_objects(PODS, self.warm_pod_pool.namespace)
+            running = [pod for pod in pods if pod['status'].get('phase') == 'Running']
+            if len(running) >= count and not self.warm_pod_pool._top_ups:
+                return pods
+            time.sleep(0.05)
+        self.fail('The warm pool was not topped up')
+
+    def test_first_deploy_misses_and_tops_up_the_pool(self):
+        # act
+        node_name = self._acquire_node()
+
+        # assert
+        self.assertIsNone(node_name)
+        pods = self._wait_for_warm_pods(2)
+        self.assertEquals(len(pods), 2)
+        self.assertEquals(pods[0]['spec']['initContainers'][0]['image'], 'nginx:1.15')
+        self.assertEquals(pods[0]['spec']['containers'][0]['resources'], {'requests': {'cpu': '0.5',
+                                                                                       'memory': '256M'}})
+        self.assertEquals((self.warm_pod_pool.metrics.hits, self.warm_pod_pool.metrics.misses), (0, 1))
+
+    def test_deploy_claims_warm_pod_of_same_image_and_compute_spec(self):
+        # arrange
+        self._acquire_node()
+        self._wait_for_warm_pods(2)
+        other_compute_spec = AppComputeSpecKubernetes(requests=AppComputeSpecKubernetesResources('1', '256M'),
+                                                      limits=AppComputeSpecKubernetesResources(None, None))
+
+        # act
+        node_name = self._acquire_node()
+        other_spec_node_name = self._acquire_node(compute_spec=other_compute_spec)
+        cold_image_node_name = self._acquire_node('ubuntu:16.04')
+
+        # assert
+        self.assertEquals(node_name, 'fake-node-1')
+        self.assertIsNone(other_spec_node_name)
+        self.assertIsNone(cold_image_node_name)
+        self.assertEquals((self.warm_pod_pool.metrics.hits, self.warm_pod_pool.metrics.misses), (1, 2))
+        self.assertEquals(self.warm_pod_pool.metrics.hit_rate, 1.0 / 3)
+        pool_key = WarmPodPool.get_pool_key('nginx:1.15', self.compute_spec)
+        self._wait_for_warm_pods(4)
+        warm_pods = [pod for pod in self.server.list_objects(PODS, self.warm_pod_pool.namespace)
+                     if pod['metadata']['labels'].get(TagsService.WARM_POOL_KEY) == pool_key]
+        self.assertEquals(len(warm_pods), 2)
+
+    def test_app_prefers_the_hostname_of_the_warm_pod_node(self):
+        # arrange
+        self.clients.core_api.patch_node(
+            name='fake-node-1', body={'metadata': {'labels': {TagsService.HOSTNAME_LABEL: 'ip-10-0-0-1.internal'}}})
+        self._acquire_node()
+        self._wait_for_warm_pods(2)
+        deployment_service = KubernetesDeploymentService()
+        self.clients.core_api.create_namespace(body={'metadata': {'name': 'sandbox'}})
+
+        # act
+        preferred_node = self._acquire_node()
+        app = AppDeploymentRequest(name='app', image=ApplicationImage('nginx', '1.15'), start_command=None,
+                                   environment_variables=None, compute_spec=None, internal_ports=[],
+                                   external_ports=[], preferred_node=preferred_node)
+        deployment = deployment_service.create_app(self.logger, self.clients, 'sandbox', 'app', {}, app)
+
+        # assert
+        term = deployment.spec.template.spec.affinity.node_affinity \
+            .preferred_during_scheduling_ignored_during_execution[0]
+        requirement = term.preference.match_expressions[0]
+        self.assertEquals((requirement.key, requirement.operator, requirement.values),
+                          (TagsService.HOSTNAME_LABEL, 'In', ['ip-10-0-0-1.internal']))
+
+    def test_warm_up_tops_up_the_hot_images_and_the_existing_pools(self):
+        # arrange
+        self._acquire_node()
+        self._wait_for_warm_pods(2)
+        spec_pool_key = WarmPodPool.get_pool_key('nginx:1.15', self.compute_spec)
+        warm_pod = self.server.list_objects(PODS, self.warm_pod_pool.namespace)[0]
+        self.clients.core_api.delete_namespaced_pod(name=warm_pod['metadata']['name'],
+                                                    namespace=self.warm_pod_pool.namespace, body={})
+
+        # act
+        self.warm_pod_pool.warm_up(self.logger, self.clients, 'redis, nginx:1.15', 2)
+
+        # assert
+        pods = self._wait_for_warm_pods(6)
+        pool_keys = [pod['metadata']['labels'][TagsService.WARM_POOL_KEY] for pod in pods]
+        self.assertEquals(sorted(pool_keys.count(key) for key in set(pool_keys)), [2, 2, 2])
+        self.assertEquals(pool_keys.count(spec_pool_key), 2)
+        self.assertEquals(pool_keys.count(WarmPodPool.get_pool_key('redis', None)), 2)
+
+    def test_hot_images_are_normalized(self):
+        # act
+        hot_images = WarmPodPool.parse_hot_images(' nginx:1.15, redis:latest,, ')
+
+        # assert
+        self.assertEquals(hot_images, {'nginx:1.15', 'redis'})